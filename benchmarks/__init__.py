@@ -0,0 +1,4 @@
+"""Benchmarks for the core hot paths, run on synthetic device logs.
+
+    python -m benchmarks --employees 500 --days 30 --out bench.json
+"""
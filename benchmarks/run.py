@@ -0,0 +1,181 @@
+"""Timed scenarios for the core hot paths, reported as JSON.
+
+    python -m benchmarks --employees 500 --days 30 --repeat 3 --out bench.json
+
+Every repetition starts from a fresh database in a temporary directory, so
+runs (and releases) can be compared on the same synthetic log.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import tracemalloc
+from time import perf_counter
+from benchmarks.synthetic import write_log
+from core.ingest import read_log
+from core.processor import LogProcessor
+from core.punchstore import read_store
+from core.reports import ReportGenerator
+
+SCENARIOS = (
+    "load_file",
+    "build_sessions",
+    "save_sessions",
+    "fill_missing_days",
+    "find_late_early",
+    "export_csv",
+)
+
+
+def run_once(log_path: str, work_dir: str):
+    """Run every scenario once; returns ({name: (seconds, rows)}, connections opened)."""
+    timings = {}
+
+    # --- load_file: parse, pair and store the whole log in an empty DB ---
+    processor = LogProcessor(db_path=os.path.join(work_dir, "load.db"))
+    start = perf_counter()
+    result = processor.load_file(log_path)
+    timings["load_file"] = (perf_counter() - start, result.sessions)
+
+    # --- _build_sessions on the already parsed punch store ---
+    _, store = read_store(log_path)
+    builder = LogProcessor(db_path=os.path.join(work_dir, "save.db"))
+    builder.records = store
+    start = perf_counter()
+    builder._build_sessions()
+    timings["build_sessions"] = (perf_counter() - start, len(builder.sessions))
+
+    # --- _save_sessions_to_db into an empty DB ---
+    start = perf_counter()
+    builder._save_sessions_to_db()
+    timings["save_sessions"] = (perf_counter() - start, len(builder.sessions))
+    builder.close()
+
+    # --- Missing-day Leave fill, then late/early check, for every ID ---
+    reporter = ReportGenerator(processor)
+    pids = sorted(processor.sessions.pids())
+    start = perf_counter()
+    filled = reporter.fill_missing_days()
+    timings["fill_missing_days"] = (perf_counter() - start, filled)
+
+    start = perf_counter()
+    found = sum(len(processor.find_late_early(pid)) for pid in pids)
+    timings["find_late_early"] = (perf_counter() - start, found)
+
+    # --- export_csv of the whole sessions table ---
+    start = perf_counter()
+    reporter.export_csv(os.path.join(work_dir, "export.csv"))
+    with open(os.path.join(work_dir, "export.csv"), encoding="utf-8") as f:
+        exported = sum(1 for _ in f) - 1
+    timings["export_csv"] = (perf_counter() - start, exported)
+
+    opened = processor.connections.stats()["opened"]
+    processor.close()
+    return timings, opened
+
+
+def _retained_bytes(build):
+    """Bytes still allocated after build() returns, while its result is alive."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def measure_memory(log_path: str):
+    """Memory held by the parsed punches: nested dict of lists vs the columnar PunchStore."""
+    dict_bytes, (_, records) = _retained_bytes(lambda: read_log(log_path))
+    store_bytes, (_, store) = _retained_bytes(lambda: read_store(log_path))
+    punches = len(store)
+    del records
+    return {
+        "punches": punches,
+        "records_dict_bytes": dict_bytes,
+        "punch_store_bytes": store_bytes,
+        "dict_bytes_per_punch": round(dict_bytes / max(punches, 1), 1),
+        "store_bytes_per_punch": round(store_bytes / max(punches, 1), 1),
+    }
+
+
+def run_benchmarks(repeat=3, label=None, **log_options):
+    """Generate a synthetic log, run the scenarios repeat times and return the report dict."""
+    runs = {name: [] for name in SCENARIOS}
+    rows = {}
+    connections = []
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "synthetic.TXT")
+        lines = write_log(log_path, **log_options)
+        for i in range(repeat):
+            work_dir = os.path.join(tmp, f"run{i}")
+            os.mkdir(work_dir)
+            timings, opened = run_once(log_path, work_dir)
+            connections.append(opened)
+            for name, (seconds, count) in timings.items():
+                runs[name].append(round(seconds, 6))
+                rows[name] = count
+        memory = measure_memory(log_path)
+
+    return {
+        "label": label,
+        "params": {"repeat": repeat, **log_options},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "log_lines": lines,
+        "connections_opened": max(connections),
+        "memory": memory,
+        "scenarios": {
+            name: {
+                "rows": rows[name],
+                "min_s": min(runs[name]),
+                "median_s": statistics.median(runs[name]),
+                "runs_s": runs[name],
+            }
+            for name in SCENARIOS
+        },
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30, choices=range(1, 32), metavar="1-31")
+    parser.add_argument("--punches-per-day", type=int, default=2)
+    parser.add_argument("--odd-rate", type=float, default=0.05, help="share of days missing a punch")
+    parser.add_argument("--duplicate-rate", type=float, default=0.01, help="share of punches written twice")
+    parser.add_argument("--month", default="140402", help="YYYYMM of the generated log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--label", help="free text stored in the report, e.g. a release tag")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = run_benchmarks(
+        repeat=args.repeat,
+        label=args.label,
+        employees=args.employees,
+        days=args.days,
+        punches_per_day=args.punches_per_day,
+        odd_rate=args.odd_rate,
+        duplicate_rate=args.duplicate_rate,
+        year_month=args.month,
+        seed=args.seed,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
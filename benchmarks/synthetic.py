@@ -0,0 +1,64 @@
+"""Synthetic entry-exit logs in the device format (ID DATE TIME CODE).
+
+Lines look like sample_data/ordibehesht.TXT: 8-digit ID, Jalali YYYYMMDD date,
+H:MM/HH:MM time and code 04 (entry) / 05 (exit), in punch-time order.
+"""
+import random
+
+ENTRY_CODE = "04"
+EXIT_CODE = "05"
+
+
+def _clock(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def day_punches(rng, punches_per_day: int):
+    """Return sorted, distinct punch minutes for one employee-day.
+
+    The first punch falls around 07:30 and the last around 16:30; any punches
+    in between form short leave periods.
+    """
+    entry = rng.randint(6 * 60 + 50, 8 * 60 + 30)
+    exit_ = rng.randint(15 * 60 + 30, 17 * 60 + 30)
+    inner = rng.sample(range(entry + 1, exit_), max(punches_per_day - 2, 0))
+    return sorted([entry, *inner, exit_])[:punches_per_day]
+
+
+def generate_lines(employees=100, days=30, punches_per_day=2, odd_rate=0.05,
+                   duplicate_rate=0.01, year_month="140402", seed=0):
+    """Yield log lines for a month, sorted by date and time.
+
+    odd_rate is the share of employee-days missing one punch (fallback sessions);
+    duplicate_rate the share of punches the device wrote twice.
+    """
+    rng = random.Random(seed)
+    for day in range(1, days + 1):
+        date = f"{year_month}{day:02d}"
+        punches = []
+        for person in range(1, employees + 1):
+            pid = f"{person:08d}"
+            minutes = day_punches(rng, punches_per_day)
+            if len(minutes) > 1 and rng.random() < odd_rate:
+                minutes.pop(rng.randrange(len(minutes)))
+            for i, minute in enumerate(minutes):
+                code = ENTRY_CODE if i % 2 == 0 else EXIT_CODE
+                punches.append((minute, pid, code))
+                if rng.random() < duplicate_rate:
+                    punches.append((minute, pid, code))
+        punches.sort()
+        for minute, pid, code in punches:
+            yield f"{pid} {date} {_clock(minute)} {code}\n"
+
+
+def write_log(path: str, **options) -> int:
+    """Write a synthetic log to path and return the number of lines.
+
+    options are passed to generate_lines.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(**options):
+            f.write(line)
+            count += 1
+    return count
@@ -0,0 +1,168 @@
+"""Organisation-wide late/early evaluation on NumPy arrays.
+
+evaluate_month() applies the same rules as LogProcessor.find_late_early (schedule
+→ ID exception → defaults, floating hours, the optional LATE_GRACE_MINUTES grace) to every
+session of a month at once, and returns the per-ID result lists that
+find_late_early would produce.
+"""
+import sqlite3
+import numpy as np
+from core.resolver import LATE_GRACE_MINUTES
+from core.sessions import STRAY_MODE
+from core.timeutil import TIME_TO_MINUTES, to_minutes
+from resources.config import DEFAULT_ENTRY, DEFAULT_EXIT, DEFAULT_FLOATING, DEFAULT_LATE_ALLOWED
+
+# Same defaults find_late_early resolves with (LogProcessor.schedule_defaults)
+SCHEDULE_DEFAULTS = {
+    "entry": DEFAULT_ENTRY,
+    "exit": DEFAULT_EXIT,
+    "floating": DEFAULT_FLOATING,
+    "late_allowed": DEFAULT_LATE_ALLOWED,
+}
+
+# Slots in the per-day lookup tables; day numbers are the two digits of YYYYMMDD
+DAY_SLOTS = 100
+
+# First occurrence of each (id, date, entry, exit) — the same rows find_late_early keeps
+SQL_MONTH_SESSIONS = """
+    SELECT id, date, entry, exit, status, duration, mode
+    FROM sessions
+    WHERE session_id IN (
+        SELECT MIN(session_id)
+        FROM sessions
+        WHERE year_month = ?
+        GROUP BY id, date, entry, exit
+    )
+    ORDER BY id, date, session_id
+"""
+SQL_MONTH_EXCEPTIONS = """
+    SELECT id, date, entry, exit
+    FROM exceptions
+    WHERE date BETWEEN ? AND ?
+"""
+
+
+def _minutes_array(values):
+    """Parse 'HH:MM' strings into an int array; unparsable values become -1."""
+    return np.fromiter((TIME_TO_MINUTES.get(v, -1) for v in values), dtype=np.int64, count=len(values))
+
+
+def _read_month(conn, year_month: str):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_MONTH_SESSIONS, (year_month,))
+        rows = cursor.fetchall()
+        cursor.execute(SQL_MONTH_EXCEPTIONS, (f"{year_month}00", f"{year_month}99"))
+        return rows, cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def evaluate_month(db_path: str, year_month: str, work_schedules=None, defaults=None, conn=None):
+    """Return {pid: [(pid, date, entry, exit, status, minutes, mode), ...]} for one month.
+
+    work_schedules is the in-memory {date: schedule} dict the app keeps; defaults
+    overrides SCHEDULE_DEFAULTS. Sessions with unparsable times are skipped, as in
+    the per-ID path. An open conn is used instead of connecting to db_path.
+    """
+    work_schedules = work_schedules or {}
+    defaults = {**SCHEDULE_DEFAULTS, **(defaults or {})}
+
+    # --- Step 1: Load the month's sessions and exceptions ---
+    if conn is not None:
+        rows, exception_rows = _read_month(conn, year_month)
+    else:
+        conn = sqlite3.connect(db_path)
+        try:
+            rows, exception_rows = _read_month(conn, year_month)
+        finally:
+            conn.close()
+
+    results = {}
+    if not rows:
+        return results
+
+    pids, dates, entries, exits, statuses, durations, modes = zip(*rows)
+    n = len(rows)
+
+    # --- Step 2: Columnar arrays (IDs factorised to integer codes, days 1–31) ---
+    pid_codes = {}
+    pid_code = np.fromiter((pid_codes.setdefault(p, len(pid_codes)) for p in pids), dtype=np.int64, count=n)
+    day = np.fromiter((int(d[6:8]) for d in dates), dtype=np.int64, count=n)
+    entry = _minutes_array(entries)
+    exit_ = _minutes_array(exits)
+    is_leave = np.fromiter((m == "Leave" for m in modes), dtype=bool, count=n)
+    is_stray = np.fromiter((m == STRAY_MODE for m in modes), dtype=bool, count=n)
+
+    # --- Step 3: Per-day schedule table (index = day of month) ---
+    has_schedule = np.zeros(DAY_SLOTS, dtype=bool)
+    sched_entry = np.zeros(DAY_SLOTS, dtype=np.int64)
+    sched_exit = np.zeros(DAY_SLOTS, dtype=np.int64)
+    sched_float = np.zeros(DAY_SLOTS, dtype=np.int64)
+    sched_late = np.zeros(DAY_SLOTS, dtype=bool)
+    for d in range(1, DAY_SLOTS):
+        schedule = work_schedules.get(f"{year_month}{d:02d}")
+        if not schedule:
+            continue
+        has_schedule[d] = True
+        sched_entry[d] = to_minutes(schedule.get("entry", defaults["entry"]))
+        sched_exit[d] = to_minutes(schedule.get("exit", defaults["exit"]))
+        sched_float[d] = int(float(schedule.get("floating", defaults["floating"])) * 60)
+        sched_late[d] = bool(schedule.get("late_allowed", defaults["late_allowed"]))
+
+    # --- Step 4: Join ID exceptions on (pid code, day) ---
+    exc_keys, exc_entry, exc_exit = [], [], []
+    for pid, date, ex_entry, ex_exit in exception_rows:
+        code = pid_codes.get(pid)
+        if code is not None and date[:6] == year_month:
+            exc_keys.append(code * DAY_SLOTS + int(date[6:8]))
+            exc_entry.append(to_minutes(ex_entry))
+            exc_exit.append(to_minutes(ex_exit))
+    order = np.argsort(np.asarray(exc_keys, dtype=np.int64), kind="stable")
+    # A trailing sentinel key keeps every searchsorted position in range
+    exc_keys = np.append(np.asarray(exc_keys, dtype=np.int64)[order], np.iinfo(np.int64).max)
+    exc_entry = np.append(np.asarray(exc_entry, dtype=np.int64)[order], 0)
+    exc_exit = np.append(np.asarray(exc_exit, dtype=np.int64)[order], 0)
+
+    session_keys = pid_code * DAY_SLOTS + day
+    pos = np.searchsorted(exc_keys, session_keys)
+    has_exception = exc_keys[pos] == session_keys
+
+    # --- Step 5: Effective schedule per session: schedule → exception → defaults ---
+    use_schedule = has_schedule[day]
+    default_entry = to_minutes(defaults["entry"])
+    default_exit = to_minutes(defaults["exit"])
+    scheduled_entry = np.where(use_schedule, sched_entry[day], np.where(has_exception, exc_entry[pos], default_entry))
+    scheduled_exit = np.where(use_schedule, sched_exit[day], np.where(has_exception, exc_exit[pos], default_exit))
+    float_minutes = np.where(use_schedule, sched_float[day], int(float(defaults["floating"]) * 60))
+    late_allowed = np.where(use_schedule, sched_late[day], bool(defaults["late_allowed"]))
+
+    # --- Step 6: Late entry / early exit rules ---
+    evaluated = ~is_leave & ~is_stray & (entry >= 0) & (exit_ >= 0)
+    latest_allowed_entry = scheduled_entry + float_minutes + np.where(late_allowed, LATE_GRACE_MINUTES, 0)
+    late = evaluated & (entry > latest_allowed_entry)
+    # Allowed entry → allowed exit is extended by difference between actual and scheduled entry
+    allowed_exit = np.where(
+        late,
+        scheduled_exit + float_minutes,
+        scheduled_exit + (np.maximum(entry, scheduled_entry) - scheduled_entry),
+    )
+    early = evaluated & (exit_ < allowed_exit)
+    minutes_late = entry - latest_allowed_entry
+    minutes_early = allowed_exit - exit_
+
+    # --- Step 7: Emit rows in session order (Leave / Late Entry before Early Exit) ---
+    first = is_leave | late
+    emit_idx = np.concatenate([np.flatnonzero(first), np.flatnonzero(early)])
+    emit_kind = np.concatenate([np.zeros(np.count_nonzero(first), dtype=np.int8),
+                                np.ones(np.count_nonzero(early), dtype=np.int8)])
+    order = np.lexsort((emit_kind, emit_idx))
+    for i, kind in zip(emit_idx[order].tolist(), emit_kind[order].tolist()):
+        if kind:
+            minutes, mode = int(minutes_early[i]), "Early Exit"
+        elif is_leave[i]:
+            minutes, mode = durations[i], modes[i]
+        else:
+            minutes, mode = int(minutes_late[i]), "Late Entry"
+        results.setdefault(pids[i], []).append((pids[i], dates[i], entries[i], exits[i], statuses[i], minutes, mode))
+    return results
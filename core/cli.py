@@ -0,0 +1,215 @@
+"""Command-line interface to the core engine (no Tkinter needed).
+
+    python -m core ingest sample_data/ordibehesht.TXT
+    python -m core ingest gate1.txt gate2.txt --workers 2
+    python -m core archive logs/ --memory-mb 256
+    python -m core schedules 140402
+    python -m core late-early 140402 --id 00000022
+    python -m core late-early 140402 --out late_early.csv
+    python -m core reports 140402 reports/ --workers 4
+    python -m core export all_sessions.csv
+    python -m core --metrics metrics.jsonl --profile profiles/ ingest sample_data/ordibehesht.TXT
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from core.errors import NoDataError, PunctualityError
+from core.jalali import month_length
+from core.metrics import Metrics
+from core.pairing import PAIRING_MODES
+from core.parallel import generate_reports
+from core.processor import LogProcessor
+from core.reports import LATE_EARLY_HEADER, ReportGenerator
+from core.scheduler import ScheduleManager
+
+
+def _require_month(processor, month: str):
+    """Load an imported month into the processor or raise NoDataError."""
+    warnings = []
+    processor.load_month(month, warnings)
+    for warning in warnings:
+        print(f"warning: {warning}", file=sys.stderr)
+    if not processor.sessions:
+        raise NoDataError(f"No sessions in the database for month {month}; run 'ingest' first.")
+
+
+def _report_quarantine(result):
+    for warning in result.warnings:
+        print(f"warning: {warning}", file=sys.stderr)
+    if result.rejected_lines:
+        print(f"warning: {result.rejected_lines} malformed lines set aside in "
+              f"{', '.join(result.quarantine_files)}", file=sys.stderr)
+
+
+def _quarantine_options(processor, args):
+    """Apply --strict / --max-error-rate; returns the quarantine flag for load_*."""
+    if args.max_error_rate is not None:
+        processor.max_error_rate = args.max_error_rate
+    return not args.strict
+
+
+def cmd_ingest(processor, args):
+    quarantine = _quarantine_options(processor, args)
+    if len(args.files) == 1 and not os.path.isdir(args.files[0]):
+        result = processor.load_file(args.files[0], quarantine=quarantine)
+    else:
+        result = processor.load_files(args.files, workers=args.workers, quarantine=quarantine)
+    _report_quarantine(result)
+    if not result.loaded_from_db:
+        source = "imported"
+    elif result.new_punches:
+        source = f"after merging {result.new_punches} new punches into {result.affected_days} days"
+    else:
+        source = "already in the database"
+    if result.files > 1:
+        source += f" from {result.files} files ({result.duplicate_punches} duplicate punches dropped)"
+    print(f"Month {result.month}: {result.sessions} sessions {source}.")
+
+
+def cmd_archive(processor, args):
+    result = processor.load_archive(args.paths, memory_limit_mb=args.memory_mb, tmp_dir=args.tmp_dir,
+                                    quarantine=_quarantine_options(processor, args))
+    _report_quarantine(result)
+    print(f"{result.files} files: {result.new_punches} new punches, {result.affected_days} days rebuilt; "
+          f"month {result.month} has {result.sessions} sessions.")
+
+
+def cmd_schedules(processor, args):
+    manager = ScheduleManager(processor)
+    year, month = int(args.month[:4]), int(args.month[4:6])
+    manager.ensure_default_schedules(year, month, month_length(args.month))
+    schedules = processor._load_schedules_from_db(args.month)
+    processor.load_exceptions_from_config(args.month)
+    holidays = processor.calendar.holiday_dates()
+    print(f"Month {args.month}: {schedules} work schedules, {len(processor.exceptions)} exception rules, "
+          f"holidays: {', '.join(holidays) or 'none'}.")
+
+
+def cmd_late_early(processor, args):
+    _require_month(processor, args.month)
+    if args.fill_missing:
+        ReportGenerator(processor).fill_missing_days(args.id, args.month)
+    if args.id:
+        rows = processor.find_late_early(
+            args.id,
+            on_invalid=lambda pid, date, entry, exit_: print(
+                f"warning: skipping session for {pid} on {date}: {entry}, {exit_}", file=sys.stderr),
+            year_month=args.month,
+        )
+    else:
+        rows = [row for pid_rows in processor.find_late_early_all(args.month).values() for row in pid_rows]
+
+    out = open(args.out, "w", newline='', encoding="utf-8") if args.out else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(LATE_EARLY_HEADER)
+        writer.writerows(rows)
+    finally:
+        if args.out:
+            out.close()
+    if args.out:
+        print(f"{len(rows)} late/early records written to {args.out}.")
+
+
+def cmd_reports(processor, args):
+    _require_month(processor, args.month)
+    summary = generate_reports(
+        processor.db_path, args.out_dir, processor.work_schedules,
+        processor.schedule_defaults(), workers=args.workers, pragmas=processor.pragmas, year_month=args.month,
+    )
+    for pid, date, entry, exit_ in summary["skipped"]:
+        print(f"warning: skipping session for {pid} on {date}: {entry}, {exit_}", file=sys.stderr)
+    print(f"{summary['records']} late/early records for {summary['employees']} IDs "
+          f"({summary['leave_filled']} missing days added as 'Leave') written to {args.out_dir}.")
+
+
+def cmd_export(processor, args):
+    ReportGenerator(processor).export_csv(args.csv)
+    print(f"All sessions exported to {args.csv}.")
+
+
+def _add_quarantine_arguments(p):
+    p.add_argument("--strict", action="store_true", help="stop at the first malformed line instead of quarantining it")
+    p.add_argument("--max-error-rate", type=float, default=None,
+                   help="share of malformed lines tolerated, e.g. 0.01 (default: QUARANTINE_MAX_ERROR_RATE)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m core", description="Punctuality Tracking Software (headless)")
+    parser.add_argument("--db", default="sessions.db", help="SQLite database path (default: sessions.db)")
+    parser.add_argument("--pairing", choices=PAIRING_MODES, default=None,
+                        help="session pairing for ingest: by punch order or by punch code (default: PAIRING_MODE)")
+    parser.add_argument("--metrics", default=None,
+                        help="write per-stage timings to this file: *.prom for Prometheus, else JSON lines "
+                             "(default: METRICS_PATH)")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="run the command under cProfile and dump the stats into DIR (default: PROFILE_DIR)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="add per-stage peak Python memory to the metrics (slower)")
+    parser.add_argument("--trace-sql", action="store_true",
+                        help="add per-stage SQL statement counts to the metrics and print the busiest statements")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("ingest", help="import device TXT logs (files or directories, merged as one import)")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--workers", type=int, default=None, help="parser processes for several files (0 = this process)")
+    _add_quarantine_arguments(p)
+    p.set_defaults(func=cmd_ingest)
+
+    p = commands.add_parser("archive", help="import log archives larger than memory (sorted on disk)")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--memory-mb", type=float, default=None, help="memory ceiling in MB (default: INGEST_MEMORY_LIMIT_MB)")
+    p.add_argument("--tmp-dir", default=None, help="directory for the sorted run files (default: system temp)")
+    _add_quarantine_arguments(p)
+    p.set_defaults(func=cmd_archive)
+
+    p = commands.add_parser("schedules", help="ensure and load work schedules and exceptions for a month")
+    p.add_argument("month", help="YYYYMM, e.g. 140402")
+    p.set_defaults(func=cmd_schedules)
+
+    p = commands.add_parser("late-early", help="evaluate late entries / early exits")
+    p.add_argument("month", help="YYYYMM, e.g. 140402")
+    p.add_argument("--id", help="only this employee ID (per-ID engine)")
+    p.add_argument("--fill-missing", action="store_true", help="add missing days as 'Leave' first")
+    p.add_argument("--out", help="CSV file to write (default: stdout)")
+    p.set_defaults(func=cmd_late_early)
+
+    p = commands.add_parser("reports", help="per-employee and merged late/early reports for all IDs of a month")
+    p.add_argument("month", help="YYYYMM, e.g. 140402")
+    p.add_argument("out_dir")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (0 = run in this process)")
+    p.set_defaults(func=cmd_reports)
+
+    p = commands.add_parser("export", help="export all sessions with per-ID totals to CSV")
+    p.add_argument("csv")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    processor = None
+    try:
+        processor = LogProcessor(db_path=args.db, pairing=args.pairing)
+        if args.metrics or args.profile or args.trace_memory or args.trace_sql:
+            metrics = processor.metrics
+            processor.metrics = Metrics(args.metrics or metrics.path, args.profile or metrics.profile_dir,
+                                        args.trace_memory or metrics.trace_memory,
+                                        processor.connections if args.trace_sql else metrics.connections)
+        # The whole command is one action: its metrics line(s) and profile cover every stage it runs
+        with processor.metrics.action(args.command) as action:
+            args.func(processor, args)
+        if args.trace_sql:
+            print(action.sql.report(), file=sys.stderr)
+    except PunctualityError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    except sqlite3.Error as e:
+        print(f"database error: {e}", file=sys.stderr)
+        return 3
+    finally:
+        if processor is not None:
+            processor.close()
+    return 0
@@ -0,0 +1,234 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from resources.config import SQLITE_PRAGMAS
+
+# Host parameters per statement in execute_values; SQLite builds before 3.32 allow at most 999
+MAX_PARAMS = 999
+# Literals replaced by ? when statements are grouped into shapes (strings, numbers, NULL),
+# and runs of identical (?, ...) groups (execute_values) shortened to one
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\bNULL\b")
+_SQL_VALUE_GROUPS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+
+
+def apply_pragmas(conn, pragmas=None):
+    """Apply the configured PRAGMAs (journal_mode, synchronous, cache_size, temp_store)."""
+    for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name}={value}")
+
+
+def connect(db_path: str, pragmas=None):
+    """Open a SQLite connection with the PRAGMAs applied."""
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def execute_values(cursor, sql, rows, params=()):
+    """Execute sql for many rows in as few statements as the parameter limit allows.
+
+    sql holds a "{values}" marker that becomes one (?, ...) group per row,
+    e.g. "INSERT INTO t (a, b) VALUES {values}" or
+    "DELETE FROM t WHERE id = ? AND (a, b) IN (VALUES {values})"; params fill
+    the placeholders before the marker. Unlike executemany, which runs the
+    statement once per row, a month of rows is usually a single statement.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    group = "(" + ", ".join("?" * len(rows[0])) + ")"
+    per_statement = max(1, (MAX_PARAMS - len(params)) // len(rows[0]))
+    for start in range(0, len(rows), per_statement):
+        chunk = rows[start:start + per_statement]
+        cursor.execute(sql.replace("{values}", ", ".join([group] * len(chunk))),
+                       [*params, *(value for row in chunk for value in row)])
+
+
+def sql_shape(sql: str) -> str:
+    """Return a statement with its literals replaced by ? and whitespace collapsed.
+
+    Repeated value groups are shortened, so an execute_values statement has
+    one shape whatever its row count: "VALUES (?, ?), ...".
+    """
+    shape = " ".join(_SQL_LITERALS.sub("?", sql).split())
+    return _SQL_VALUE_GROUPS.sub(r"\1, ...", shape)
+
+
+class QueryTracer:
+    """SQL statements seen through sqlite3's trace callback (see ConnectionManager.trace).
+
+    count is the number of statements run (executemany runs one per row),
+    shapes counts them per sql_shape() and seconds sums, per shape, the time
+    from each statement to the next one (or to the end of tracing): the
+    statement itself plus the Python work that follows it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self.seconds = Counter()
+        self._last = None  # (shape, start) of the statement being timed
+
+    def __call__(self, sql):
+        now = time.perf_counter()
+        self._close(now)
+        shape = sql_shape(sql)
+        self.count += 1
+        self.shapes[shape] += 1
+        self._last = (shape, now)
+
+    def _close(self, now):
+        if self._last is not None:
+            shape, start = self._last
+            self.seconds[shape] += now - start
+            self._last = None
+
+    def stop(self):
+        self._close(time.perf_counter())
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def repeated(self, threshold=10):
+        """Shapes run at least threshold times: the N+1 suspects, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self, limit=10):
+        """A readable summary of the most frequent shapes."""
+        lines = [f"{self.count} statements, {len(self.shapes)} shapes, {self.total_seconds * 1000:.1f} ms"]
+        for shape, n in self.shapes.most_common(limit):
+            lines.append(f"{n:6d} × {self.seconds[shape] * 1000:8.1f} ms  {shape}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def write_transaction(db_path: str, pragmas=None):
+    """Yield a cursor whose writes run in one explicit transaction.
+
+    Commits when the block finishes, rolls back if it raises, and always
+    closes the connection.
+    """
+    conn = connect(db_path, pragmas)
+    try:
+        conn.execute("BEGIN")
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class ConnectionManager:
+    """Reusable SQLite connections for one database file, one per thread.
+
+    Each thread's connection is opened on first use with the PRAGMAs applied
+    once, and kept until close(). Because connections live on, sqlite3's
+    per-connection statement cache keeps the hot parameterized queries
+    prepared between calls (cached_statements sets its size).
+
+    Connections run in autocommit mode; writes go through transaction().
+    opened and checkouts count connection opens and uses, for benchmarking.
+    """
+
+    def __init__(self, db_path: str, pragmas=None, cached_statements: int = 256):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.opened = 0
+        self.checkouts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._tracers = []
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                isolation_level=None,
+                check_same_thread=False,  # only so close() can run from any thread
+                cached_statements=self.cached_statements,
+            )
+            apply_pragmas(conn, self.pragmas)
+            self._local.conn = conn
+            with self._lock:
+                self.opened += 1
+                self._connections.append(conn)
+                if self._tracers:
+                    conn.set_trace_callback(self._trace)
+        self.checkouts += 1
+        return conn
+
+    @contextmanager
+    def cursor(self):
+        """Yield a cursor on this thread's connection for reads."""
+        cursor = self.connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose writes run in one explicit transaction.
+
+        Commits when the block finishes and rolls back if it raises. Inside an
+        already open transaction the block simply joins it.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn.cursor()
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _trace(self, sql):
+        for tracer in self._tracers:
+            tracer(sql)
+
+    @contextmanager
+    def trace(self):
+        """Yield a QueryTracer recording every statement run on these connections.
+
+        Traces may nest; each sees the statements run while it is open.
+        """
+        tracer = QueryTracer()
+        with self._lock:
+            self._tracers.append(tracer)
+            for conn in self._connections:
+                conn.set_trace_callback(self._trace)
+        try:
+            yield tracer
+        finally:
+            tracer.stop()
+            with self._lock:
+                self._tracers.remove(tracer)
+                if not self._tracers:
+                    for conn in self._connections:
+                        conn.set_trace_callback(None)
+
+    def stats(self):
+        """Connection counters: {"opened", "open", "checkouts"}."""
+        with self._lock:
+            return {"opened": self.opened, "open": len(self._connections), "checkouts": self.checkouts}
+
+    def close(self):
+        """Close every connection opened so far; later calls reopen lazily."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
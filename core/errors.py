@@ -0,0 +1,34 @@
+"""Exceptions raised by the core engine.
+
+The core never shows dialogs; callers (the Tk app, the CLI) catch these and
+decide how to report them.
+"""
+
+
+class PunctualityError(Exception):
+    """Base class for every error the core engine reports to its callers."""
+
+
+class LogFormatError(PunctualityError, ValueError):
+    """Raised when a line of a device TXT file does not match the expected layout."""
+
+    def __init__(self, line_no: int, message: str, reason: str = None):
+        super().__init__(message)
+        self.line_no = line_no
+        self.reason = reason  # short form for quarantine files, e.g. "invalid ID"
+
+    def __reduce__(self):
+        # Rebuilt with every argument when raised in a worker process
+        return type(self), (self.line_no, str(self), self.reason)
+
+
+class TooManyBadLinesError(LogFormatError):
+    """Raised when a quarantined import has more malformed lines than the allowed error rate."""
+
+
+class EmptyLogError(PunctualityError):
+    """Raised when a device TXT file contains no punches at all."""
+
+
+class NoDataError(PunctualityError):
+    """Raised when an action needs processed sessions (or a month) that are not there yet."""
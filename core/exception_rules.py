@@ -0,0 +1,152 @@
+"""ID exceptions stored as date-range rules instead of one row per day.
+
+A rule gives an ID its own entry/exit times from valid_from to valid_to
+(inclusive 'YYYYMMDD' Jalali dates) on the weekdays of its mask (bit w set =
+weekday w, 0 = Saturday ... 6 = Friday, see core.jalali). Where rules of an
+ID overlap, the newest one (highest rule_id) wins.
+
+Rules are resolved when they are read: ExceptionRules looks a date up in one
+ID's rules (sorted by valid_from, bisected), and the exceptions view expands
+rules to (id, date, entry, exit) rows over the calendar table for set-based
+SQL such as the missing-day fill.
+"""
+from bisect import bisect_right
+from core.db import execute_values
+from core.jalali import weekday
+
+ALL_WEEKDAYS = 0b1111111
+# Bounds of a rule that is always valid
+FIRST_DATE = "00000000"
+LAST_DATE = "99999999"
+
+SQL_CREATE_RULES = """
+    CREATE TABLE IF NOT EXISTS exception_rules (
+        rule_id INTEGER PRIMARY KEY,
+        id TEXT NOT NULL,
+        valid_from TEXT NOT NULL,
+        valid_to TEXT NOT NULL,
+        entry TEXT,
+        exit TEXT,
+        weekdays INTEGER NOT NULL DEFAULT 127,   -- bit w = weekday w (0 = Saturday)
+        source TEXT                              -- 'config' or 'migrated'
+    )
+"""
+# Interval index: an ID's rules by start date, with the end date to filter on
+SQL_CREATE_RULES_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_exception_rules_id_range ON exception_rules (id, valid_from, valid_to)
+"""
+SQL_CREATE_EXCEPTIONS_VIEW = """
+    CREATE VIEW IF NOT EXISTS exceptions (id, date, entry, exit) AS
+    SELECT r.id, k.date, r.entry, r.exit
+    FROM exception_rules r
+    JOIN calendar k ON k.date BETWEEN r.valid_from AND r.valid_to AND ((r.weekdays >> k.weekday) & 1)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM exception_rules n
+        WHERE n.id = r.id AND n.valid_from <= k.date AND n.valid_to >= k.date
+          AND n.rule_id > r.rule_id AND ((n.weekdays >> k.weekday) & 1)
+    )
+"""
+SQL_INSERT_RULES = """
+    INSERT INTO exception_rules (id, valid_from, valid_to, entry, exit, weekdays, source)
+    VALUES {values}
+"""
+SQL_RULES_FOR_ID = """
+    SELECT rule_id, valid_from, valid_to, entry, exit, weekdays
+    FROM exception_rules
+    WHERE id = ?
+    ORDER BY valid_from, rule_id
+"""
+SQL_CONFIG_RULES = """
+    SELECT id, valid_from, valid_to, entry, exit, weekdays
+    FROM exception_rules
+    WHERE source = 'config'
+    ORDER BY rule_id
+"""
+
+
+def weekday_mask(weekdays=None) -> int:
+    """Mask of an iterable of weekday numbers (None = every day)."""
+    if weekdays is None:
+        return ALL_WEEKDAYS
+    mask = 0
+    for day in weekdays:
+        if not 0 <= day <= 6:
+            raise ValueError(f"weekday must be 0..6 (0 = Saturday), not {day}")
+        mask |= 1 << day
+    return mask
+
+
+def config_rules(exceptions):
+    """(id, valid_from, valid_to, entry, exit, weekdays) rows of resources.config.EXCEPTIONS entries.
+
+    valid_from, valid_to and weekdays are optional; without them a rule is always valid.
+    """
+    return [
+        (str(e["id"]).zfill(8), e.get("valid_from", FIRST_DATE), e.get("valid_to", LAST_DATE),
+         e["entry"], e["exit"], weekday_mask(e.get("weekdays")))
+        for e in exceptions
+    ]
+
+
+def sync_config_rules(cursor, rows) -> bool:
+    """Make the 'config' rules equal rows; returns whether anything was written."""
+    cursor.execute(SQL_CONFIG_RULES)
+    if cursor.fetchall() == rows:
+        return False
+    cursor.execute("DELETE FROM exception_rules WHERE source = 'config'")
+    execute_values(cursor, SQL_INSERT_RULES, [(*row, "config") for row in rows])
+    return True
+
+
+class ExceptionRules:
+    """One ID's rules; get(date) returns (entry, exit) like the per-day dict did."""
+
+    def __init__(self, rows):
+        # rows: (rule_id, valid_from, valid_to, entry, exit, weekdays), sorted by valid_from
+        self._rules = list(rows)
+        self._starts = [rule[1] for rule in self._rules]
+
+    def __len__(self):
+        return len(self._rules)
+
+    def get(self, date: str, default=None):
+        best = None
+        for i in range(bisect_right(self._starts, date) - 1, -1, -1):
+            rule_id, _, valid_to, entry, exit_, weekdays = rule = self._rules[i]
+            if valid_to < date or (best is not None and rule_id < best[0]):
+                continue
+            if weekdays != ALL_WEEKDAYS and not weekdays >> weekday(int(date[:4]), int(date[4:6]), int(date[6:8])) & 1:
+                continue
+            best = rule
+        return (best[3], best[4]) if best is not None else default
+
+
+def migrate_day_rows(cursor):
+    """Replace a per-day exceptions table by rules (runs of consecutive days with equal hours)
+    and the exceptions view."""
+    cursor.execute(SQL_CREATE_RULES)
+    cursor.execute(SQL_CREATE_RULES_INDEX)
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'exceptions'")
+    found = cursor.fetchone()
+    if found and found[0] == "table":
+        cursor.execute("""
+            SELECT e.id, e.date, e.entry, e.exit, k.rowid_day
+            FROM exceptions e
+            LEFT JOIN (SELECT date, ROW_NUMBER() OVER (ORDER BY date) AS rowid_day FROM calendar) k
+              ON k.date = e.date
+            ORDER BY e.id, e.entry, e.exit, e.date
+        """)
+        rules = []
+        for pid, date, entry, exit_, day_number in cursor.fetchall():
+            last = rules[-1] if rules else None
+            if (last and last[0] == (pid, entry, exit_) and day_number is not None
+                    and last[3] is not None and day_number == last[3] + 1):
+                last[2], last[3] = date, day_number
+            else:
+                rules.append([(pid, entry, exit_), date, date, day_number])
+        execute_values(cursor, SQL_INSERT_RULES, [
+            (pid, valid_from, valid_to, entry, exit_, ALL_WEEKDAYS, "migrated")
+            for (pid, entry, exit_), valid_from, valid_to, _ in rules
+        ])
+        cursor.execute("DROP TABLE exceptions")
+    cursor.execute(SQL_CREATE_EXCEPTIONS_VIEW)
@@ -0,0 +1,140 @@
+"""Out-of-core punch sorting for log archives larger than memory.
+
+Punches are parsed line by line into sorted runs of at most max_punches,
+each written to a temporary file; the runs are then k-way merged (see
+core.ingest.merge_punches) into one sorted, distinct stream. Memory use is
+set by the run size, not the input size. LogProcessor.load_archive cuts
+the merged stream into (id, date)-aligned batches and stores them one
+batch at a time.
+"""
+import os
+import shutil
+import tempfile
+from itertools import groupby
+from core.errors import LogFormatError
+from core.ingest import Quarantine, iter_punches, merge_punches, quarantine_path
+
+# Rough in-memory size of one parsed punch (a tuple of two ID/date strings,
+# an int and a code string, plus its list slot); sizes runs and batches
+BYTES_PER_PUNCH = 300
+# Most run files merged at once; more runs are merged in several passes
+MERGE_FAN_IN = 64
+
+
+def punches_for_memory(memory_limit_mb) -> int:
+    """Punches that fit in memory_limit_mb megabytes (at least 1000)."""
+    return max(1000, int(memory_limit_mb * 1024 * 1024) // BYTES_PER_PUNCH)
+
+
+def _write_run(punches, tmp_dir):
+    punches.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.writelines(f"{pid}\t{date}\t{minute}\t{code}\n" for pid, date, minute, code in punches)
+    return path
+
+
+def iter_run(path):
+    """Yield the (person_id, date, minute, code) tuples of a run file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            pid, date, minute, code = line.rstrip("\n").split("\t")
+            yield pid, date, int(minute), code
+
+
+def write_sorted_runs(paths, max_punches, tmp_dir, quarantine=False, max_error_rate=None):
+    """Parse the logs into sorted run files of at most max_punches punches each.
+
+    Returns (runs, months, rejected): the run file paths, the set of months
+    seen and the number of malformed lines set aside (quarantine=True, one
+    quarantine_path() file per log). Otherwise raises LogFormatError (naming
+    the file) for a malformed line.
+    """
+    runs, months, buffer, rejected = [], set(), [], 0
+    for path in paths:
+        sink = Quarantine(quarantine_path(path), max_error_rate) if quarantine else None
+        try:
+            for _, pid, date, minute, code in iter_punches(path, sink):
+                buffer.append((pid, date, minute, code))
+                months.add(date[:6])
+                if len(buffer) >= max_punches:
+                    runs.append(_write_run(buffer, tmp_dir))
+                    buffer = []
+        except LogFormatError as e:
+            raise type(e)(e.line_no, f"{os.path.basename(path)}: {e}", e.reason) from None
+        rejected += sink.rejected if sink else 0
+    if buffer:
+        runs.append(_write_run(buffer, tmp_dir))
+    return runs, months, rejected
+
+
+def _merge_runs(runs, tmp_dir):
+    """Merge run files MERGE_FAN_IN at a time until one pass can merge the rest."""
+    while len(runs) > MERGE_FAN_IN:
+        merged = []
+        for start in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[start:start + MERGE_FAN_IN]
+            fd, path = tempfile.mkstemp(suffix=".run", dir=tmp_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for pid, date, minute, code in merge_punches([iter_run(run) for run in group]):
+                    f.write(f"{pid}\t{date}\t{minute}\t{code}\n")
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+    return runs
+
+
+def iter_day_batches(punches, max_punches):
+    """Cut a stream sorted by (id, date) into lists of whole (id, date) days.
+
+    A batch closes at the first day boundary after max_punches punches, so no
+    day is split across batches.
+    """
+    batch = []
+    for _, day in groupby(punches, key=lambda p: (p[0], p[1])):
+        batch.extend(day)
+        if len(batch) >= max_punches:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ExternalSort:
+    """Context manager that sorts log files on disk and cleans up its run files.
+
+        with ExternalSort(paths, memory_limit_mb=256) as sort:
+            for punch in sort.punches():
+                ...
+    """
+
+    def __init__(self, paths, memory_limit_mb, tmp_dir=None, quarantine=False, max_error_rate=None):
+        self.paths = list(paths)
+        self.max_punches = punches_for_memory(memory_limit_mb)
+        self.tmp_dir = tmp_dir
+        self.quarantine = quarantine
+        self.max_error_rate = max_error_rate
+        self.runs = []
+        self.months = set()
+        self.rejected = 0
+        self._work_dir = None
+
+    def __enter__(self):
+        self._work_dir = tempfile.mkdtemp(prefix="punch-runs-", dir=self.tmp_dir)
+        try:
+            self.runs, self.months, self.rejected = write_sorted_runs(
+                self.paths, self.max_punches, self._work_dir, self.quarantine, self.max_error_rate)
+            self.runs = _merge_runs(self.runs, self._work_dir)
+        except BaseException:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self._work_dir, ignore_errors=True)
+        return False
+
+    def punches(self):
+        """The distinct punches of every file, sorted by (id, date, minute, code)."""
+        return merge_punches([iter_run(run) for run in self.runs])
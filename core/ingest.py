@@ -0,0 +1,443 @@
+import heapq
+import mmap
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from core.errors import LogFormatError, TooManyBadLinesError
+from core.timeutil import TIME_TO_MINUTES
+from resources.config import QUARANTINE_MAX_ERROR_RATE, QUARANTINE_MIN_LINES
+
+
+FORMAT_HINT = (
+    "Expected format: ID(8 chars) DATE(YYYYMMDD) TIME(HH:MM) CODE\n"
+    "Example: 00000010 14040603 16:38 05"
+)
+
+# Fixed-width device layout: "00000010 14040603 16:38 05" + newline
+FIXED_WIDTH_LINE = 26
+PUNCH_DTYPE = np.dtype([("id", "<u4"), ("date", "<u4"), ("minute", "<u2"), ("code", "u1")])
+FIXED_WIDTH_CHUNK = 1 << 16  # lines decoded per step, bounds the temporary arrays
+
+_DIGIT_COLUMNS = [*range(0, 8), *range(9, 17), 18, 19, 21, 22, 24, 25]
+_SEPARATORS = {8: ord(" "), 17: ord(" "), 20: ord(":"), 23: ord(" ")}
+_PLACE_VALUES = 10 ** np.arange(7, -1, -1, dtype=np.uint32)
+
+
+class Quarantine:
+    """Sets malformed log lines aside instead of stopping at the first one.
+
+    Each rejected line goes to the quarantine file as "line_no<TAB>reason<TAB>line".
+    TooManyBadLinesError is raised once more than max_error_rate of the lines
+    read are bad: checked as lines are rejected from min_lines lines on, and
+    for the whole file by finish(). The file is only written when a line is
+    rejected; one left by an earlier import of the same log is then removed.
+    """
+
+    def __init__(self, path, max_error_rate=None, min_lines=None):
+        self.path = path
+        self.max_error_rate = QUARANTINE_MAX_ERROR_RATE if max_error_rate is None else max_error_rate
+        self.min_lines = QUARANTINE_MIN_LINES if min_lines is None else min_lines
+        self.rejected = 0
+        self.lines = 0
+        self.first_error = None
+        self._file = None
+
+    def reject(self, error: LogFormatError, line: str):
+        """Record one malformed line (error as raised by parse_line)."""
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(f"{error.line_no}\t{error.reason}\t{line.rstrip(chr(13) + chr(10))}\n")
+        self.rejected += 1
+        if self.first_error is None:
+            self.first_error = str(error)
+        if error.line_no >= self.min_lines:
+            self._check(error.line_no)
+
+    def finish(self, lines: int):
+        """Close the file and apply the error rate to all `lines` lines of the log."""
+        self.lines = lines
+        self.close()
+        if not self.rejected and os.path.exists(self.path):
+            os.remove(self.path)
+        self._check(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check(self, lines: int):
+        if self.rejected > self.max_error_rate * lines:
+            self.close()
+            raise TooManyBadLinesError(
+                lines,
+                f"{self.rejected} of {lines} lines are malformed (more than {self.max_error_rate:.1%}); "
+                f"rejected lines are listed in {self.path}.\nFirst: {self.first_error}",
+                "error rate exceeded",
+            )
+
+
+def quarantine_path(txt_path: str) -> str:
+    """Quarantine file for a log: 'gate1.txt' → 'gate1.quarantine.log' (not picked up as a log)."""
+    return os.path.splitext(txt_path)[0] + ".quarantine.log"
+
+
+def parse_line(line_no: int, line: str):
+    """Validate one log line and return (person_id, date, minute, code).
+
+    The time column is returned as minutes since midnight (see core.timeutil).
+    Raises LogFormatError with the message the old three-pass validation showed.
+    """
+    parts = line.split()
+
+    # Check 4 columns
+    if len(parts) != 4:
+        raise LogFormatError(
+            line_no,
+            f"Line {line_no} does not have exactly 4 columns: '{line.strip()}'" + FORMAT_HINT,
+            "not 4 columns",
+        )
+
+    person_id, date_str, time_str, code = parts
+
+    # Check date: exactly 8 numeric characters
+    if len(date_str) != 8 or not date_str.isdigit():
+        raise LogFormatError(
+            line_no,
+            f"Line {line_no} has invalid date (must be 8 digits): '{date_str}'" + FORMAT_HINT,
+            "invalid date",
+        )
+
+    # Check ID: exactly 8 numeric characters
+    if len(person_id) != 8 or not person_id.isdigit():
+        raise LogFormatError(
+            line_no,
+            f"Line {line_no} has invalid ID (must be 8 digits): '{person_id}'\n" + FORMAT_HINT,
+            "invalid ID",
+        )
+
+    # Check time: format HH:MM (lookup instead of strptime)
+    minute = TIME_TO_MINUTES.get(time_str)
+    if minute is None:
+        raise LogFormatError(
+            line_no,
+            f"Line {line_no} has invalid time format (should be HH:MM): '{time_str}'" + FORMAT_HINT,
+            "invalid time",
+        )
+
+    return person_id, date_str, minute, code
+
+
+def iter_punches(txt_path: str, quarantine=None):
+    """Yield validated (line_no, person_id, date, minute, code) tuples in a single read.
+
+    Without a quarantine, raises LogFormatError on the first malformed line;
+    with one, malformed lines are passed to quarantine.reject and skipped.
+    """
+    line_no = 0
+    with open(txt_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            try:
+                punch = parse_line(line_no, line)
+            except LogFormatError as e:
+                if quarantine is None:
+                    raise
+                quarantine.reject(e, line)
+                continue
+            yield (line_no, *punch)
+    if quarantine is not None:
+        quarantine.finish(line_no)
+
+
+def _valid_rows(rows):
+    """Mask of the rows of an (n, line width) uint8 array that match the fixed-width layout."""
+    valid = rows[:, -1] == ord("\n")
+    if rows.shape[1] == FIXED_WIDTH_LINE + 2:
+        valid &= rows[:, -2] == ord("\r")
+    for column, byte in _SEPARATORS.items():
+        valid &= rows[:, column] == byte
+    digits = rows[:, _DIGIT_COLUMNS] - np.uint8(ord("0"))
+    valid &= (digits <= 9).all(axis=1)  # non-digits wrap around above 9
+    valid &= digits[:, 16] * 10 + digits[:, 17] <= 23
+    valid &= digits[:, 18] * 10 + digits[:, 19] <= 59
+    return valid
+
+
+def _decode_rows(rows):
+    """Decode fixed-width rows that passed _valid_rows into a PUNCH_DTYPE array."""
+    digits = (rows[:, _DIGIT_COLUMNS] - np.uint8(ord("0"))).astype(np.uint32)
+    punches = np.empty(len(rows), dtype=PUNCH_DTYPE)
+    punches["id"] = digits[:, 0:8] @ _PLACE_VALUES
+    punches["date"] = digits[:, 8:16] @ _PLACE_VALUES
+    punches["minute"] = (digits[:, 16] * 10 + digits[:, 17]) * 60 + digits[:, 18] * 10 + digits[:, 19]
+    punches["code"] = digits[:, 20] * 10 + digits[:, 21]
+    return punches
+
+
+def _decode_fixed_width(rows):
+    """Decode an (n, line width) uint8 array of fixed-width lines, or return None if any line differs."""
+    if not _valid_rows(rows).all():
+        return None
+    return _decode_rows(rows)
+
+
+def read_fixed_width(txt_path: str):
+    """Decode a fixed-width device log straight from a memory map.
+
+    Returns a PUNCH_DTYPE array (id, date, minute, code as integers) in file
+    order, or None when the file is empty or any line differs from the
+    fixed-width layout (e.g. an H:MM time or extra spaces); callers then use
+    the general parser, which also reports the exact bad line.
+    No per-line Python strings are created.
+    """
+    if os.path.getsize(txt_path) == 0:
+        return None
+    with open(txt_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        width = mm.find(b"\n") + 1  # LF or CRLF line endings
+        if width not in (FIXED_WIDTH_LINE + 1, FIXED_WIDTH_LINE + 2):
+            return None
+        lines, tail = divmod(len(mm), width)
+
+        decoded = []
+        for start in range(0, lines, FIXED_WIDTH_CHUNK):
+            count = min(FIXED_WIDTH_CHUNK, lines - start)
+            rows = np.frombuffer(mm, dtype=np.uint8, count=count * width, offset=start * width)
+            chunk = _decode_fixed_width(rows.reshape(count, width))
+            del rows  # the map cannot close while a view into it exists
+            if chunk is None:
+                return None
+            decoded.append(chunk)
+
+        if tail:
+            # Last line without a line ending
+            last = mm[lines * width:]
+            if len(last) != FIXED_WIDTH_LINE:
+                return None
+            line = last + (b"\r\n" if width == FIXED_WIDTH_LINE + 2 else b"\n")
+            chunk = _decode_fixed_width(np.frombuffer(line, dtype=np.uint8).reshape(1, width))
+            if chunk is None:
+                return None
+            decoded.append(chunk)
+    return np.concatenate(decoded)
+
+
+def scan_fixed_width(txt_path: str, quarantine):
+    """Byte-level validation of a fixed-width log that may hold corrupted lines.
+
+    Lines of the fixed width are checked and decoded as arrays, as in
+    read_fixed_width; every other line is checked by parse_line and passed to
+    quarantine.reject. Returns the PUNCH_DTYPE array of the good lines in file
+    order, or None when the file does not look fixed-width (its first line
+    differs, or a differing line is valid for parse_line) so the caller can
+    use iter_punches with the same quarantine.
+    """
+    if os.path.getsize(txt_path) == 0:
+        return None
+    with open(txt_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        width = mm.find(b"\n") + 1
+        if width not in (FIXED_WIDTH_LINE + 1, FIXED_WIDTH_LINE + 2):
+            return None
+        data = np.frombuffer(mm, dtype=np.uint8)
+        ends = np.flatnonzero(data == ord("\n"))
+        if ends[-1] != len(data) - 1:
+            ends = np.append(ends, len(data) - 1)  # last line without a line ending
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        lengths = ends - starts + 1
+
+        # --- Step 1: Decode the lines of the fixed width, chunk by chunk ---
+        decoded, irregular = [], [np.flatnonzero(lengths != width)]
+        offsets = np.arange(width)
+        regular = np.flatnonzero(lengths == width)
+        for start in range(0, len(regular), FIXED_WIDTH_CHUNK):
+            lines = regular[start:start + FIXED_WIDTH_CHUNK]
+            rows = data[starts[lines][:, None] + offsets]
+            valid = _valid_rows(rows)
+            decoded.append(_decode_rows(rows[valid]))
+            irregular.append(lines[~valid])
+        del data  # the map cannot close while a view into it exists
+
+        # --- Step 2: Give every other line to the general parser ---
+        rejected = []
+        for index in np.sort(np.concatenate(irregular)).tolist():
+            line = mm[starts[index]:ends[index] + 1].decode("utf-8", errors="replace")
+            if index == len(starts) - 1 and not line.endswith("\n") and len(line) == FIXED_WIDTH_LINE:
+                # Last line without a line ending: same layout check as the rest
+                row = np.frombuffer((line + "\r\n"[-(width - FIXED_WIDTH_LINE):]).encode(), dtype=np.uint8)
+                if len(row) == width and _valid_rows(row.reshape(1, width))[0]:
+                    decoded.append(_decode_rows(row.reshape(1, width)))
+                    continue
+            try:
+                parse_line(index + 1, line)
+            except LogFormatError as e:
+                rejected.append((e, line))
+            else:
+                return None
+    for error, line in rejected:
+        quarantine.reject(error, line)
+    quarantine.finish(len(starts))
+    return np.concatenate(decoded) if decoded else np.empty(0, dtype=PUNCH_DTYPE)
+
+
+def unique_punches(punches):
+    """Return the distinct punches of a PUNCH_DTYPE array, sorted by id, date, minute and code."""
+    order = np.lexsort((punches["code"], punches["minute"], punches["date"], punches["id"]))
+    ordered = punches[order]
+    keep = np.ones(len(ordered), dtype=bool)
+    keep[1:] = ordered[1:] != ordered[:-1]
+    return ordered[keep]
+
+
+def iter_array_punches(punches):
+    """Yield (person_id, date, minute, code) tuples from a PUNCH_DTYPE array.
+
+    ID and date strings are built once per distinct value and shared; the
+    array is converted FIXED_WIDTH_CHUNK rows at a time.
+    """
+    ids, id_index = np.unique(punches["id"], return_inverse=True)
+    dates, date_index = np.unique(punches["date"], return_inverse=True)
+    id_text = [f"{v:08d}" for v in ids.tolist()]
+    date_text = [f"{v:08d}" for v in dates.tolist()]
+    code_text = [f"{v:02d}" for v in range(100)]
+    for start in range(0, len(punches), FIXED_WIDTH_CHUNK):
+        chunk = slice(start, start + FIXED_WIDTH_CHUNK)
+        yield from zip(
+            map(id_text.__getitem__, id_index[chunk].tolist()),
+            map(date_text.__getitem__, date_index[chunk].tolist()),
+            punches["minute"][chunk].tolist(),
+            map(code_text.__getitem__, punches["code"][chunk].tolist()),
+        )
+
+
+def read_log(txt_path: str):
+    """Validate, find the month and group punches in one pass over the file.
+
+    Returns (month_in_file, records) where month_in_file is the first six digits
+    of the first date (e.g. '140406'), or None for an empty file, and records is
+    {person_id: {date: [minute, ...]}}. Fixed-width files take the read_fixed_width
+    fast path.
+    """
+    month_in_file = None
+    records = defaultdict(lambda: defaultdict(list))
+    fixed = read_fixed_width(txt_path)
+    if fixed is not None:
+        month_in_file = f"{fixed['date'][0]:08d}"[:6]
+        for person_id, date_str, minute, _ in iter_array_punches(fixed):
+            records[person_id][date_str].append(minute)
+        return month_in_file, records
+
+    for _, person_id, date_str, minute, _ in iter_punches(txt_path):
+        if month_in_file is None:
+            month_in_file = date_str[:6]
+        records[person_id][date_str].append(minute)
+    return month_in_file, records
+
+
+def _read_fixed(txt_path: str, quarantine=None):
+    """The fixed-width fast path: read_fixed_width, or scan_fixed_width with a quarantine."""
+    if quarantine is None:
+        return read_fixed_width(txt_path)
+    return scan_fixed_width(txt_path, quarantine)
+
+
+def _array_month(punches):
+    return f"{punches['date'][0]:08d}"[:6] if len(punches) else None
+
+
+def read_punches(txt_path: str, quarantine=None):
+    """Validate the file and return (month_in_file, punches) in one pass.
+
+    punches is a set of (person_id, date, minute, code) tuples, so repeated
+    identical lines count once. Fixed-width files take the read_fixed_width
+    fast path and are de-duplicated before any tuple is built. With a
+    Quarantine, malformed lines are set aside instead of raising.
+    """
+    fixed = _read_fixed(txt_path, quarantine)
+    if fixed is not None:
+        return _array_month(fixed), set(iter_array_punches(unique_punches(fixed)))
+
+    month_in_file = None
+    punches = set()
+    for _, person_id, date_str, minute, code in iter_punches(txt_path, quarantine):
+        if month_in_file is None:
+            month_in_file = date_str[:6]
+        punches.add((person_id, date_str, minute, code))
+    return month_in_file, punches
+
+
+def log_paths(paths):
+    """Expand files and directories into the list of log files to ingest.
+
+    A directory contributes its *.txt files (any case), sorted by name.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(".txt") and os.path.isfile(os.path.join(path, name))
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def read_sorted_punches(txt_path: str, quarantine=False, max_error_rate=None):
+    """Worker: return (month_in_file, punches, rejected) with the file's distinct punches sorted.
+
+    punches is a PUNCH_DTYPE array (fixed-width fast path) or a sorted list of
+    (person_id, date, minute, code) tuples; both pickle compactly enough to
+    send back from a worker process. With quarantine=True malformed lines go
+    to quarantine_path(txt_path) and rejected counts them. LogFormatError
+    messages name the file.
+    """
+    sink = Quarantine(quarantine_path(txt_path), max_error_rate) if quarantine else None
+    try:
+        fixed = _read_fixed(txt_path, sink)
+        if fixed is not None:
+            return _array_month(fixed), unique_punches(fixed), sink.rejected if sink else 0
+        month_in_file, punches = read_punches(txt_path, sink)
+    except LogFormatError as e:
+        raise type(e)(e.line_no, f"{os.path.basename(txt_path)}: {e}", e.reason) from None
+    return month_in_file, sorted(punches), sink.rejected if sink else 0
+
+
+def merge_punches(streams):
+    """K-way merge sorted punch streams by (id, date, minute, code), dropping repeats.
+
+    A punch found in several files (e.g. seen by two gates) is yielded once.
+    """
+    last = None
+    for punch in heapq.merge(*streams):
+        if punch != last:
+            yield punch
+            last = punch
+
+
+def read_punch_files(paths, workers=None, quarantine=False, max_error_rate=None):
+    """Parse several logs in worker processes and merge them into one sorted stream.
+
+    Returns (files, merged) where files is [(path, month_in_file, punch count,
+    rejected lines)] in the given order (month_in_file is None for an empty
+    file) and merged a generator over the distinct punches of all files.
+    workers=None uses one process per CPU (at most one per file); workers=0,
+    or a single file, parses in this process. quarantine and max_error_rate
+    apply to each file (see read_sorted_punches).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    read = partial(read_sorted_punches, quarantine=quarantine, max_error_rate=max_error_rate)
+    if workers <= 1:
+        parsed = [read(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(read, paths))
+
+    files = [(path, month, len(punches), rejected) for path, (month, punches, rejected) in zip(paths, parsed)]
+    streams = [
+        iter_array_punches(punches) if isinstance(punches, np.ndarray) else iter(punches)
+        for _, punches, _ in parsed
+    ]
+    return files, merge_punches(streams)
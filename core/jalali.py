@@ -0,0 +1,154 @@
+"""Jalali (Solar Hijri) calendar: month lengths, Gregorian dates and holiday bitmaps.
+
+Dates are the 'YYYYMMDD' strings used everywhere else (e.g. '14040702').
+Months 1–6 have 31 days, 7–11 have 30 and Esfand (12) has 29, or 30 in a
+leap year. Leap years follow the 33-year cycle (years whose remainder mod 33
+is 1, 5, 9, 13, 17, 22, 26 or 30), which matches the official calendar from
+1343 to 1472.
+
+The calendar table holds one precomputed row per day (weekday, Gregorian
+date, working-day flag) so SQL can join against it (see build_calendar);
+Calendar keeps each month's holidays as an int bitmap (bit d set = day d
+is a holiday), so checking a date is one dict lookup and one shift.
+"""
+from datetime import date, timedelta
+from core.db import execute_values
+
+LEAP_REMAINDERS = frozenset((1, 5, 9, 13, 17, 22, 26, 30))
+DAYS_PER_CYCLE = 33 * 365 + len(LEAP_REMAINDERS)
+WEEKDAY_NAMES = ("Saturday", "Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+
+SQL_CREATE_CALENDAR = """
+    CREATE TABLE IF NOT EXISTS calendar (
+        date TEXT PRIMARY KEY,    -- Jalali YYYYMMDD
+        year_month TEXT,
+        day INTEGER,
+        weekday INTEGER,          -- 0 = Saturday ... 6 = Friday
+        gregorian TEXT,           -- ISO YYYY-MM-DD
+        is_working INTEGER
+    ) WITHOUT ROWID
+"""
+SQL_INSERT_CALENDAR = """
+    INSERT OR REPLACE INTO calendar (date, year_month, day, weekday, gregorian, is_working)
+    VALUES {values}
+"""
+
+
+def is_leap(year: int) -> bool:
+    return year % 33 in LEAP_REMAINDERS
+
+
+def days_in_month(year: int, month: int) -> int:
+    if not 1 <= month <= 12:
+        raise ValueError(f"month must be 1..12, not {month}")
+    if month <= 6:
+        return 31
+    if month <= 11:
+        return 30
+    return 30 if is_leap(year) else 29
+
+
+def month_length(year_month: str) -> int:
+    """days_in_month for a 'YYYYMM' string."""
+    return days_in_month(int(year_month[:4]), int(year_month[4:6]))
+
+
+def month_dates(year_month: str):
+    """All 'YYYYMMDD' dates of a 'YYYYMM' month, in order."""
+    return [f"{year_month}{day:02d}" for day in range(1, month_length(year_month) + 1)]
+
+
+def _days_before_year(year):
+    """Days from 1/01/01 to year/01/01 (leap years among 1..year-1 by the 33-year cycle)."""
+    return 365 * (year - 1) + year // 33 * 8 + sum(r < year % 33 for r in LEAP_REMAINDERS)
+
+
+# Gregorian ordinal of the day before 1/01/01, anchored on 1404/01/01 = 2025-03-21
+EPOCH_ORDINAL = date(2025, 3, 21).toordinal() - _days_before_year(1404) - 1
+
+
+def _day_of_year(month, day):
+    return (month - 1) * 31 + day if month <= 7 else 186 + (month - 7) * 30 + day
+
+
+def to_gregorian(year: int, month: int, day: int) -> date:
+    return date.fromordinal(EPOCH_ORDINAL + _days_before_year(year) + _day_of_year(month, day))
+
+
+def from_gregorian(value: date):
+    """Return (year, month, day) of a Gregorian date."""
+    days = value.toordinal() - EPOCH_ORDINAL
+    year = days * 33 // DAYS_PER_CYCLE + 1
+    while _days_before_year(year) >= days:
+        year -= 1
+    while _days_before_year(year + 1) < days:
+        year += 1
+    day_of_year = days - _days_before_year(year)
+    if day_of_year <= 186:
+        return year, (day_of_year - 1) // 31 + 1, (day_of_year - 1) % 31 + 1
+    return year, (day_of_year - 187) // 30 + 7, (day_of_year - 187) % 30 + 1
+
+
+def weekday(year: int, month: int, day: int) -> int:
+    """Day of the Persian week: 0 = Saturday ... 6 = Friday."""
+    return (to_gregorian(year, month, day).weekday() + 2) % 7
+
+
+def calendar_rows(first_year: int, last_year: int, days_off=()):
+    """Yield calendar table rows for every day of first_year..last_year (inclusive).
+
+    days_off: weekdays (0 = Saturday) that are never working days.
+    """
+    gregorian = to_gregorian(first_year, 1, 1)
+    one_day = timedelta(days=1)
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            for day in range(1, days_in_month(year, month) + 1):
+                week_day = (gregorian.weekday() + 2) % 7
+                yield (f"{year:04d}{month:02d}{day:02d}", f"{year:04d}{month:02d}", day, week_day,
+                       gregorian.isoformat(), int(week_day not in days_off))
+                gregorian += one_day
+
+
+def build_calendar(cursor, first_year: int, last_year: int, days_off=()):
+    """Create the calendar table and (re)write the rows of first_year..last_year."""
+    cursor.execute(SQL_CREATE_CALENDAR)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_calendar_month ON calendar (year_month, is_working)")
+    execute_values(cursor, SQL_INSERT_CALENDAR, calendar_rows(first_year, last_year, days_off))
+
+
+class Calendar:
+    """Per-month holiday bitmaps: {year_month: int}, bit d set when day d is a holiday."""
+
+    def __init__(self):
+        self._holidays = {}
+
+    def clear(self):
+        self._holidays.clear()
+
+    def set_holiday(self, date_str: str, is_holiday=True):
+        year_month, bit = date_str[:6], 1 << int(date_str[6:8])
+        bitmap = self._holidays.get(year_month, 0)
+        self._holidays[year_month] = bitmap | bit if is_holiday else bitmap & ~bit
+
+    def load(self, work_schedules):
+        """Rebuild the bitmaps from {date: schedule} (schedules with an is_holiday flag)."""
+        self.clear()
+        for date_str, info in work_schedules.items():
+            if info.get("is_holiday"):
+                self.set_holiday(date_str)
+
+    def is_holiday(self, date_str: str) -> bool:
+        return bool(self._holidays.get(date_str[:6], 0) >> int(date_str[6:8]) & 1)
+
+    def holiday_bitmap(self, year_month: str) -> int:
+        return self._holidays.get(year_month, 0)
+
+    def holidays(self, year_month: str):
+        """Day numbers of year_month's holidays, in order."""
+        bitmap = self._holidays.get(year_month, 0)
+        return [day for day in range(1, 32) if bitmap >> day & 1]
+
+    def holiday_dates(self):
+        """Every holiday as a 'YYYYMMDD' date, in order."""
+        return [f"{ym}{day:02d}" for ym in sorted(self._holidays) for day in self.holidays(ym)]
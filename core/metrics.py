@@ -0,0 +1,193 @@
+"""Per-stage timings, row counts and peak memory of user actions.
+
+    with processor.metrics.action("load_file"):
+        with processor.metrics.stage("parse") as stage:
+            ...
+            stage.rows = len(punches)
+
+A finished action is kept as Metrics.last and, when a path is set, written
+out: as JSON lines (one object per stage plus a "total" line) or, for a
+*.prom path, as a Prometheus text file (node_exporter textfile collector)
+holding the latest value of every action and stage. With a profile_dir each
+action also runs under cProfile and its stats are dumped there (read them
+with pstats or snakeviz). Given a ConnectionManager, the SQL statements
+each stage runs are counted too, and Action.sql keeps their shapes and
+times (core.db.QueryTracer).
+
+Stages opened outside an action, and actions opened inside another one,
+are recorded as stages of the enclosing action or not at all, so helpers
+can be instrumented whatever calls them.
+"""
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: no RSS high-water mark
+    resource = None
+
+PROMETHEUS_METRICS = (
+    ("seconds", "Wall time of the last run of each stage, in seconds."),
+    ("rows", "Rows handled by the last run of each stage."),
+    ("peak_bytes", "Peak traced Python allocations during the last run of each stage."),
+    ("max_rss_kb", "Process RSS high-water mark after the last run of each stage, in KiB."),
+    ("queries", "SQL statements run by the last run of each stage."),
+)
+
+
+def _max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+
+class Stage:
+    """One timed stage; code inside the stage sets rows."""
+
+    __slots__ = ("name", "seconds", "rows", "peak_bytes", "max_rss_kb", "queries")
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = None
+        self.peak_bytes = None  # set only when Python allocations are traced
+        self.max_rss_kb = None
+        self.queries = None  # set only when SQL is traced
+
+
+class Action:
+    """A user action (e.g. load_file) and its stages in run order."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.total = Stage("total")
+        self.stages = []
+        self.profile_path = None
+        self.sql = None  # core.db.QueryTracer when SQL is traced
+
+    def stage(self, name):
+        """Return the first stage called name (None if it did not run)."""
+        return next((s for s in self.stages if s.name == name), None)
+
+
+class Metrics:
+    """Collects and exports the stage metrics of user actions.
+
+    path: JSON lines file, or Prometheus text file when it ends in .prom
+    (None keeps the metrics in memory only). profile_dir: dump a cProfile of
+    each action there. trace_memory: trace Python allocations (tracemalloc)
+    for per-stage peak memory; this slows the stages down noticeably.
+    connections: count the SQL statements run on this ConnectionManager.
+    """
+
+    def __init__(self, path=None, profile_dir=None, trace_memory=False, connections=None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.connections = connections
+        self.last = None  # the last finished Action
+        self._current = None
+        self._latest = {}  # (action, stage) → Stage, for the Prometheus file
+
+    @contextmanager
+    def _measure(self, stage):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        sql = self._current.sql if self._current is not None else None
+        queries = sql.count if sql is not None else None
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            if sql is not None:
+                stage.queries = sql.count - queries
+            if self.trace_memory and tracemalloc.is_tracing():
+                stage.peak_bytes = tracemalloc.get_traced_memory()[1]
+            stage.max_rss_kb = _max_rss_kb()
+
+    @contextmanager
+    def stage(self, name):
+        """Time one stage of the current action; yields the Stage."""
+        stage = Stage(name)
+        with self._measure(stage):
+            yield stage
+        if self._current is not None:
+            self._current.stages.append(stage)
+
+    @contextmanager
+    def action(self, name):
+        """Time a user action and export its stages when it finishes; yields the Action."""
+        if self._current is not None:
+            with self.stage(name):
+                yield self._current
+            return
+
+        action = Action(name)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profile = cProfile.Profile() if self.profile_dir else None
+        self._current = action
+        try:
+            with ExitStack() as stack:
+                if self.connections is not None:
+                    action.sql = stack.enter_context(self.connections.trace())
+                if profile is not None:
+                    stack.enter_context(profile)
+                with self._measure(action.total):
+                    yield action
+        finally:
+            self._current = None
+            if started_tracing:
+                tracemalloc.stop()
+        # Only actions that finish are exported
+        if profile is not None:
+            action.profile_path = self._dump_profile(profile, name)
+        self.last = action
+        if self.path:
+            self._export(action)
+
+    def _dump_profile(self, profile, name):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.profile_dir, f"{name}-{stamp}-{os.getpid()}.prof")
+        profile.dump_stats(path)
+        return path
+
+    def _export(self, action):
+        if self.path.endswith(".prom"):
+            for stage in (*action.stages, action.total):
+                self._latest[(action.name, stage.name)] = stage
+            write_prometheus(self.path, self._latest)
+        else:
+            write_json_lines(self.path, action)
+
+
+def write_json_lines(path, action):
+    """Append one JSON object per stage of action (and its total) to path."""
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(action.started))
+    with open(path, "a", encoding="utf-8") as f:
+        for stage in (*action.stages, action.total):
+            line = {"time": stamp, "action": action.name, "stage": stage.name}
+            line.update((field, getattr(stage, field)) for field in Stage.__slots__[1:])
+            f.write(json.dumps(line) + "\n")
+
+
+def write_prometheus(path, stages):
+    """Write {(action, stage): Stage} as Prometheus gauges, replacing path atomically."""
+    lines = []
+    for field, help_text in PROMETHEUS_METRICS:
+        metric = f"punctuality_stage_{field}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for (action, stage), values in sorted(stages.items()):
+            value = getattr(values, field)
+            if value is not None:
+                lines.append(f'{metric}{{action="{action}",stage="{stage}"}} {value}')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
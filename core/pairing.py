@@ -0,0 +1,187 @@
+"""Batch session pairing on the sorted columns of a PunchStore.
+
+pair_columns() applies the pairing rules to every employee-day at once:
+- odd punch count → one 'fallback' session from the first to the last punch;
+- even punch count → a 'Paired' session from the first to the last punch,
+  plus one 'Leave' session per inner exit/entry pair (punches 2–3, 4–5, …).
+Rows come out per day in that order (main session, then Leave periods), days
+sorted by (id, date).
+
+pair_rows_by_direction() is the "direction" pairing mode: on odd days it
+reads each punch's device code (resources.config.PUNCH_DIRECTIONS) to find
+the session and tags the punches it cannot pair, instead of one 'fallback'.
+"""
+from itertools import repeat
+import numpy as np
+from core.punchstore import code_number
+from core.sessions import (
+    Session, STRAY_MODE, UNMATCHED, UNMATCHED_ENTRY, UNMATCHED_EXIT,
+)
+from core.timeutil import MINUTES_TO_TIME
+from resources.config import PUNCH_DIRECTIONS
+
+PAIRING_MODES = ("parity", "direction")
+
+_TIME_TEXT = np.array(MINUTES_TO_TIME, dtype=object)
+_STATUS_TEXT = np.array(["fallback", "Paired"], dtype=object)
+_MODE_TEXT = np.array(["Leave", None], dtype=object)
+
+def pair_columns(store):
+    """Pair every employee-day of a PunchStore into session columns.
+
+    Returns [ids, dates, entries, exits, statuses, durations, modes], lists in
+    Session field order (reason is always None).
+    """
+    n = len(store)
+    if not n:
+        return [[] for _ in range(7)]
+    ids, dates = store.ids, store.dates
+    minutes = store.minutes.astype(np.int64)
+
+    # --- Step 1: Group boundaries of the (id, date) runs ---
+    new_day = np.empty(n, dtype=bool)
+    new_day[0] = True
+    np.not_equal(ids[1:], ids[:-1], out=new_day[1:])
+    new_day[1:] |= dates[1:] != dates[:-1]
+    starts = np.flatnonzero(new_day)
+    counts = np.diff(np.append(starts, n))
+    ends = starts + counts - 1
+    paired = counts % 2 == 0
+
+    # --- Step 2: Leave periods: odd positions inside even days, except the last punch ---
+    day_of_row = np.repeat(np.arange(len(starts)), counts)
+    position = np.arange(n) - starts[day_of_row]
+    is_leave = paired[day_of_row] & (position % 2 == 1) & (position < counts[day_of_row] - 1)
+    leave_rows = np.flatnonzero(is_leave)
+    leave_durations = minutes[leave_rows + 1] - minutes[leave_rows]
+
+    # --- Step 3: Interleave main and Leave sessions by punch position ---
+    # A day's main session sorts at its first punch, each Leave at its exit punch.
+    main_count = len(starts)
+    key = np.concatenate((starts, leave_rows))
+    order = np.argsort(key, kind="stable")
+    is_main = order < main_count
+    day = np.concatenate((np.arange(main_count), day_of_row[leave_rows]))[order]
+    entry_row = np.concatenate((starts, leave_rows))[order]
+    exit_row = np.concatenate((ends, leave_rows + 1))[order]
+    duration = np.concatenate((np.zeros(main_count, dtype=np.int64), leave_durations))[order]
+
+    # --- Step 4: String columns by table lookup, one object per distinct value ---
+    day_ids, id_index = np.unique(ids[starts], return_inverse=True)
+    day_dates, date_index = np.unique(dates[starts], return_inverse=True)
+    id_text = np.array([f"{v:08d}" for v in day_ids.tolist()], dtype=object)
+    date_text = np.array([f"{v:08d}" for v in day_dates.tolist()], dtype=object)
+
+    return [
+        id_text[id_index[day]].tolist(),
+        date_text[date_index[day]].tolist(),
+        _TIME_TEXT[minutes[entry_row]].tolist(),
+        _TIME_TEXT[minutes[exit_row]].tolist(),
+        _STATUS_TEXT[(~is_main | paired[day]).astype(np.intp)].tolist(),
+        duration.tolist(),
+        _MODE_TEXT[is_main.astype(np.intp)].tolist(),
+    ]
+
+
+def punch_directions(directions):
+    """Return {code number: True for entry, False for exit} for a PUNCH_DIRECTIONS-style map."""
+    result = {}
+    for code, direction in directions.items():
+        if direction not in ("entry", "exit"):
+            raise ValueError(f"Punch direction for code {code!r} must be 'entry' or 'exit', not {direction!r}")
+        result[code_number(code)] = direction == "entry"
+    return result
+
+
+def pair_rows_by_direction(store, directions=None):
+    """Pair every employee-day, using punch directions where the count leaves it open.
+
+    Days with an even punch count are paired by order, as pair_columns() does:
+    the device code is often the wrong button on those (an '05' at 08:46 and
+    at 17:07), while the order is not. Odd days, which parity can only mark
+    'fallback', take one pass in time order: an entry opens a session and the
+    next exit closes it; an exit with nothing open, or an entry while one is
+    open (the earlier entry is kept), is a stray punch. A punch whose code has
+    no direction closes the open session, or opens one if none is open.
+
+    Closed sessions give the day's 'Paired' session (first entry → last exit)
+    and a 'Leave' session for each gap between them; each stray punch inside
+    it becomes a zero-length 'unmatched entry' / 'unmatched exit' row with
+    mode 'Unmatched'. A day with no closed session (e.g. a lone exit punch),
+    or with a stray punch before or after it (the codes disagree with the
+    order, e.g. 08:00 '04', 12:00 '05', 17:00 '05'), keeps a single first →
+    last punch row for review, tagged 'unmatched entry', 'unmatched exit',
+    'unmatched' (both kinds) or, if no stray has a known direction, 'fallback'.
+    Returns DB row tuples like pair_rows().
+    """
+    is_entry_code = punch_directions(PUNCH_DIRECTIONS if directions is None else directions)
+    times = MINUTES_TO_TIME
+    rows = []
+    append = rows.append
+    for pid, date, minutes, codes in store.days(with_codes=True):
+        # --- Step 1: Even days: by order (main session, Leave for each inner pair) ---
+        if len(minutes) % 2 == 0:
+            append((pid, date, times[minutes[0]], times[minutes[-1]], "Paired", 0, None, None))
+            for i in range(1, len(minutes) - 1, 2):
+                append((pid, date, times[minutes[i]], times[minutes[i + 1]], "Paired",
+                        minutes[i + 1] - minutes[i], "Leave", None))
+            continue
+
+        # --- Step 2: Odd days: close each entry with the next exit ---
+        spans, strays = [], []  # (entry, exit) minutes / (minute, is_entry, code known)
+        open_entry = None
+        for minute, code in zip(minutes, codes):
+            is_entry = is_entry_code.get(code)
+            known = is_entry is not None
+            if not known:
+                is_entry = open_entry is None
+            if not is_entry and open_entry is not None:
+                spans.append((open_entry[0], minute))
+                open_entry = None
+            elif is_entry and open_entry is None:
+                open_entry = (minute, known)
+            else:
+                strays.append((minute, is_entry, known))
+        if open_entry is not None:
+            strays.append((open_entry[0], True, open_entry[1]))
+
+        # --- Step 3: No closed session, or strays outside it: one row for the whole day ---
+        if not spans or any(not spans[0][0] <= minute <= spans[-1][1] for minute, _, _ in strays):
+            kinds = {is_entry for _, is_entry, known in strays if known}
+            if not kinds:
+                status = "fallback"
+            elif len(kinds) == 2:
+                status = UNMATCHED
+            else:
+                status = UNMATCHED_ENTRY if True in kinds else UNMATCHED_EXIT
+            append((pid, date, times[minutes[0]], times[minutes[-1]], status, 0, None, None))
+            continue
+
+        # --- Step 4: Main session, Leave gaps, then the stray punches ---
+        append((pid, date, times[spans[0][0]], times[spans[-1][1]], "Paired", 0, None, None))
+        for (_, out), (back, _) in zip(spans, spans[1:]):
+            append((pid, date, times[out], times[back], "Paired", back - out, "Leave", None))
+        for minute, is_entry, _ in sorted(strays):
+            status = UNMATCHED_ENTRY if is_entry else UNMATCHED_EXIT
+            append((pid, date, times[minute], times[minute], status, 0, STRAY_MODE, None))
+    return rows
+
+
+def pair_sessions(store, mode="parity", directions=None):
+    """Return the Session rows for every employee-day of a PunchStore."""
+    if mode == "parity":
+        return list(map(Session, *pair_columns(store)))
+    return [Session(*row) for row in pair_rows(store, mode, directions)]
+
+
+def pair_rows(store, mode="parity", directions=None):
+    """Return (id, date, entry, exit, status, duration, mode, reason) tuples, as the DB stores them.
+
+    mode is one of PAIRING_MODES; directions overrides PUNCH_DIRECTIONS for "direction".
+    """
+    if mode == "direction":
+        return pair_rows_by_direction(store, directions)
+    if mode != "parity":
+        raise ValueError(f"Unknown pairing mode {mode!r}; expected one of {', '.join(PAIRING_MODES)}")
+    columns = pair_columns(store)
+    return list(zip(*columns, repeat(None, len(columns[0]))))
@@ -0,0 +1,115 @@
+"""Batch late/early reports for every employee, spread over worker processes.
+
+The parent first adds the missing-day Leave rows of every ID in one set-based
+fill (core.reports.fill_missing_days), for one month or all of them. Employee IDs are then partitioned across
+a ProcessPoolExecutor; each worker opens its own read-only SQLite connection,
+runs the late/early rules for its IDs and writes one CSV per employee. The
+parent writes the merged report.
+"""
+import csv
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from core.db import write_transaction
+from core.processor import SQL_SESSIONS_FOR_ID, SQL_SESSIONS_FOR_ID_MONTH, evaluate_late_early, exceptions_for
+from core.reports import LATE_EARLY_HEADER, fill_missing_days
+from core.resolver import ScheduleResolver
+
+MERGED_REPORT_NAME = "late_early_all.csv"
+# Chunks per worker; more, smaller chunks even out IDs with very different session counts
+CHUNKS_PER_WORKER = 4
+
+
+def employee_report_name(pid: str) -> str:
+    return f"late_early_{pid}.csv"
+
+
+def _write_csv(path, rows):
+    with open(path, mode="w", newline='', encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(LATE_EARLY_HEADER)
+        writer.writerows(rows)
+
+
+def _report_chunk(db_path, pids, work_schedules, defaults, out_dir, year_month=None):
+    """Worker: evaluate and write CSVs for a slice of IDs (read-only DB access)."""
+    chunk_results = []
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        resolver = ScheduleResolver(work_schedules, defaults, lambda pid: exceptions_for(cursor, pid))
+        for pid in pids:
+            if year_month is None:
+                cursor.execute(SQL_SESSIONS_FOR_ID, (pid,))
+            else:
+                cursor.execute(SQL_SESSIONS_FOR_ID_MONTH, (year_month, pid))
+            sessions = cursor.fetchall()
+
+            skipped = []
+            rows = evaluate_late_early(
+                sessions, resolver.resolve, on_invalid=lambda *session: skipped.append(session),
+            )
+            _write_csv(os.path.join(out_dir, employee_report_name(pid)), rows)
+            chunk_results.append((pid, rows, skipped))
+    finally:
+        conn.close()
+    return chunk_results
+
+
+def _partition(items, parts):
+    """Split items into at most `parts` contiguous, nearly equal slices."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    slices, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(items[start:end])
+        start = end
+    return slices
+
+
+def generate_reports(db_path: str, out_dir: str, work_schedules, defaults, workers=None, pragmas=None,
+                     year_month=None):
+    """Write per-employee late/early CSVs and a merged report for every ID in the DB.
+
+    year_month ('YYYYMM') limits the fill and the reports to one month and its IDs; None covers all months.
+    workers=None uses one process per CPU; workers=0 runs everything in this process.
+    Returns a summary dict with counts and the written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    # --- Step 1: Missing-day Leave fill for every ID, in one transaction ---
+    with write_transaction(db_path, pragmas) as cursor:
+        leave_filled = fill_missing_days(cursor, work_schedules, defaults, year_month=year_month)
+        if year_month is None:
+            cursor.execute("SELECT DISTINCT id FROM sessions ORDER BY id")
+        else:
+            cursor.execute("SELECT DISTINCT id FROM sessions WHERE year_month = ? ORDER BY id", (year_month,))
+        pids = [row[0] for row in cursor.fetchall()]
+
+    # --- Step 2: Evaluate ID chunks (in parallel unless workers == 0) ---
+    if workers == 0:
+        chunks = [_report_chunk(db_path, pids, work_schedules, defaults, out_dir, year_month)] if pids else []
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_report_chunk, db_path, chunk, work_schedules, defaults, out_dir, year_month)
+                for chunk in _partition(pids, workers * CHUNKS_PER_WORKER)
+            ]
+            chunks = [future.result() for future in futures]
+    per_employee = [item for chunk in chunks for item in chunk]
+
+    # --- Step 3: Merged report (IDs are already in order) ---
+    merged_path = os.path.join(out_dir, MERGED_REPORT_NAME)
+    _write_csv(merged_path, (row for _, rows, _ in per_employee for row in rows))
+
+    return {
+        "employees": len(per_employee),
+        "records": sum(len(rows) for _, rows, _ in per_employee),
+        "leave_filled": leave_filled,
+        "skipped": [session for *_, skipped in per_employee for session in skipped],
+        "employee_files": [os.path.join(out_dir, employee_report_name(pid)) for pid, *_ in per_employee],
+        "merged_file": merged_path,
+    }
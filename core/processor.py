@@ -1,24 +1,221 @@
 import csv
+import os
 import sqlite3
-from collections import defaultdict
-from datetime import datetime, timedelta
-from resources.config import DEFAULT_ENTRY, DEFAULT_EXIT, DEFAULT_FLOATING, DEFAULT_LATE_ALLOWED, EXCEPTIONS
-from tkinter import messagebox
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from core.batch import evaluate_month
+from core.db import ConnectionManager, execute_values
+from core.errors import EmptyLogError
+from core.exception_rules import SQL_RULES_FOR_ID, ExceptionRules, config_rules, migrate_day_rows, sync_config_rules
+from core.external import ExternalSort, iter_day_batches
+from core.ingest import Quarantine, log_paths, quarantine_path, read_punch_files, read_punches
+from core.jalali import Calendar, build_calendar, month_dates
+from core.metrics import Metrics
+from core.pairing import PAIRING_MODES, pair_rows, pair_sessions
+from core.punchstore import PunchStore
+from core.resolver import ScheduleResolver
+from core.sessions import STRAY_MODE, Session, SessionTable
+from core.timeutil import to_minutes
+from resources.config import (
+    CALENDAR_YEARS, DEBOUNCE_MINUTES, DEFAULT_ENTRY, DEFAULT_EXIT, DEFAULT_FLOATING, DEFAULT_LATE_ALLOWED,
+    EXCEPTIONS, INGEST_MEMORY_LIMIT_MB, METRICS_PATH, METRICS_TRACE_MEMORY, METRICS_TRACE_SQL, PAIRING_MODE,
+    PROFILE_DIR, WEEKLY_DAYS_OFF,
+)
+
+# Bumped whenever _upgrade_schema gains a step (stored in PRAGMA user_version)
+SCHEMA_VERSION = 5
+
+# Hot read paths; kept as constants so tests can check their query plans
+SQL_MONTH_EXISTS = """
+    SELECT EXISTS (SELECT 1 FROM sessions WHERE year_month = ?)
+"""
+SQL_SESSIONS_FOR_ID = """
+    SELECT id, date, entry, exit, status, duration, mode, reason
+    FROM sessions
+    WHERE id = ?
+    ORDER BY date, session_id
+"""
+SQL_SESSIONS_FOR_ID_MONTH = """
+    SELECT id, date, entry, exit, status, duration, mode, reason
+    FROM sessions
+    WHERE year_month = ? AND id = ?
+    ORDER BY date, session_id
+"""
+SQL_MONTH_HAS_PUNCHES = """
+    SELECT EXISTS (SELECT 1 FROM punches WHERE date BETWEEN ? AND ?)
+"""
+# Incremental ingest: stored punches and sessions of the (id, date) days a delta touches
+SQL_NEW_PUNCHES = """
+    SELECT i.id, i.date, i.minute, i.code
+    FROM incoming_punches i
+    WHERE NOT EXISTS (
+        SELECT 1 FROM punches p
+        WHERE p.id = i.id AND p.date = i.date AND p.minute = i.minute AND p.code = i.code
+    )
+"""
+SQL_PUNCHES_FOR_DAYS = """
+    SELECT p.id, p.date, p.minute, p.code
+    FROM affected_days a
+    JOIN punches p ON p.id = a.id AND p.date = a.date
+"""
+SQL_SESSIONS_FOR_DAYS = """
+    SELECT s.session_id, s.id, s.date, s.entry, s.exit
+    FROM affected_days a
+    JOIN sessions s ON s.id = a.id AND s.date = a.date
+"""
+
+
+def exceptions_for(cursor, pid: str):
+    """Return one ID's exception rules, read in a single query; .get(date) gives (entry, exit) or None."""
+    cursor.execute(SQL_RULES_FOR_ID, (pid,))
+    return ExceptionRules(cursor.fetchall())
+
+
+def evaluate_late_early(sessions, resolve, on_invalid=None):
+    """Apply the late/early rules to one ID's session rows as read from the DB.
+
+    sessions are (id, date, entry, exit, status, duration, mode, reason) rows ordered
+    by date; resolve(pid, date) returns the day's EffectiveSchedule (see
+    core.resolver.ScheduleResolver); on_invalid is called for sessions whose times
+    cannot be parsed (they are skipped).
+    """
+    results = []
+
+    # --- Remove duplicates in memory (keep first occurrence) ---
+    seen = set()
+    unique_sessions = []
+    for s in sessions:
+        key = (s[1], s[2], s[3])  # date, entry, exit
+        if key not in seen:
+            seen.add(key)
+            unique_sessions.append(s)
+
+    sessions = unique_sessions
+    # 🔹 Sort by ID then date (extra safety)
+    sessions.sort(key=lambda s: (s[0], s[1]))
+    for s in sessions:
+        # --- Step 2: Unpack session depending on tuple length ---
+        if len(s) == 5:
+            pid_s, date, entry_str, exit_str, status = s
+            duration, mode, reason = 0, None, None
+        else:
+            pid_s, date, entry_str, exit_str, status, duration, mode, reason = s
+
+        # --- Step 3: Skip Leave sessions (they are reported as-is) ---
+        if mode == "Leave":
+            results.append((pid_s, date, entry_str, exit_str, status, duration, mode))
+            continue
+        # Stray punches of a day that has a complete session are not checked
+        if mode == STRAY_MODE:
+            continue
+
+        # --- Step 4: Convert actual entry/exit strings to minutes since midnight ---
+        try:
+            entry_min = to_minutes(entry_str)
+            exit_min = to_minutes(exit_str)
+        except ValueError:
+            if on_invalid:
+                on_invalid(pid_s, date, entry_str, exit_str)
+            continue
+
+        # --- Step 5: Effective schedule (in-memory schedule → ID exception → defaults) ---
+        schedule = resolve(pid_s, date)
+        scheduled_entry = schedule.entry
+        scheduled_exit = schedule.exit
+        float_minutes = schedule.floating
+
+        # --- Step 7: Allowed entry window (floating hours, optional 10-minute grace) ---
+        latest_allowed_entry = schedule.latest_entry
+
+        # --- Step 8: Check Late Entry ---
+        if entry_min > latest_allowed_entry:
+            minutes_late = entry_min - latest_allowed_entry
+            results.append((pid_s, date, entry_str, exit_str, status, minutes_late, "Late Entry"))
+            allowed_exit = scheduled_exit + float_minutes
+        else:
+            if entry_min <= scheduled_entry:
+                entry_min = scheduled_entry
+            # Allowed entry → allowed exit is extended by difference between actual and scheduled entry
+            allowed_exit = scheduled_exit + (entry_min - scheduled_entry)
+
+        # --- Step 9: Check Early Exit ---
+        if exit_min < allowed_exit:
+            minutes_early = allowed_exit - exit_min
+            results.append((pid_s, date, entry_str, exit_str, status, minutes_early, "Early Exit"))
+
+    return results
+
+
+def build_sessions(records, pairing="parity", directions=None):
+    """Pair the punches of a PunchStore into Session rows (see core.pairing).
+
+    Per day: the first and last punch form the main 'Paired' session (or a
+    'fallback' one for an odd punch count) and each inner exit/entry pair a
+    'Leave' session. pairing="direction" pairs by punch code instead.
+    A {pid: {date: [minutes]}} mapping is accepted too.
+    """
+    if not isinstance(records, PunchStore):
+        records = PunchStore.from_records(records)
+    return pair_sessions(records, pairing, directions)
+
+
+@dataclass
+class LoadResult:
+    """Outcome of LogProcessor.load_file."""
+    month: str                      # e.g. "140406"
+    loaded_from_db: bool = False    # True when the month was already in the DB
+    new_punches: int = 0            # punches not seen in earlier imports
+    files: int = 1                  # log files merged into this import
+    duplicate_punches: int = 0      # punches found in more than one of those files
+    debounced_punches: int = 0      # repeat reads left out when pairing the rebuilt days
+    rejected_lines: int = 0         # malformed lines set aside (quarantine=True)
+    quarantine_files: list = field(default_factory=list)
+    affected_days: int = 0          # (id, date) days whose sessions were rebuilt
+    sessions: int = 0
+    schedules: int = 0              # work schedule rows loaded from the DB
+    warnings: list = field(default_factory=list)
 
 
 class LogProcessor:
-    def __init__(self, db_path="sessions.db"):
-        self.records = defaultdict(lambda: defaultdict(list))
-        self.sessions = []
+    def __init__(self, db_path="sessions.db", pragmas=None, pairing=None):
+        self.pairing = pairing or PAIRING_MODE  # "parity" or "direction", see core.pairing
+        if self.pairing not in PAIRING_MODES:
+            raise ValueError(f"Unknown pairing mode {self.pairing!r}; expected one of {', '.join(PAIRING_MODES)}")
+        self.max_error_rate = None  # quarantined imports; None → QUARANTINE_MAX_ERROR_RATE
+        self.debounce_minutes = DEBOUNCE_MINUTES  # repeat reads dropped before pairing, see PunchStore.debounce
+        self.records = PunchStore()  # raw punches of the last loaded file
+        self.sessions = SessionTable()
         self.work_schedules = {} 
-        self.exceptions = {}
+        self.calendar = Calendar()  # holiday bitmaps of work_schedules, see core.jalali
+        self.exceptions = []  # config exception rules, see core.exception_rules
+        self.month_in_file = None  # e.g. "140406", set by load_file
         self.db_path = db_path
+        self.pragmas = pragmas  # None → resources.config.SQLITE_PRAGMAS
+        # Shared by ReportGenerator and ScheduleManager too; see connections.stats()
+        self.connections = ConnectionManager(db_path, pragmas)
+        # Stage timings of load_file, find_late_early, the Leave fill and export_csv (core.metrics)
+        self.metrics = Metrics(METRICS_PATH, PROFILE_DIR, METRICS_TRACE_MEMORY,
+                               self.connections if METRICS_TRACE_SQL else None)
+        # Effective schedule of (pid, date); bumped whenever schedules or exceptions change
+        self.resolver = ScheduleResolver(self.work_schedules, self.schedule_defaults(), self._exceptions_for)
         self._init_db()                              
 
+    @property
+    def sessions(self):
+        """Sessions of the loaded month, as a SessionTable indexed by ID."""
+        return self._sessions
+
+    @sessions.setter
+    def sessions(self, rows):
+        self._sessions = rows if isinstance(rows, SessionTable) else SessionTable(rows)
+
+    def close(self):
+        """Close the processor's database connections."""
+        self.connections.close()
+
     def _init_db(self):
         """Initialize SQLite DB and sessions table."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self.connections.transaction() as cursor:
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS sessions (
                     session_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,106 +243,125 @@ class LogProcessor:
                     late_allowed INTEGER DEFAULT {int(DEFAULT_LATE_ALLOWED)}
                 )
             ''')
+            self._upgrade_schema(cursor)
+
+    def _upgrade_schema(self, cursor):
+        """Bring an existing database up to SCHEMA_VERSION, one step at a time."""
+        cursor.execute("PRAGMA user_version")
+        (version,) = cursor.fetchone()
+
+        if version < 1:
+            # Month partition column (e.g. '140406') so month filters can use an index
+            # instead of substr(date,1,6), plus composite indexes for the per-ID paths.
+            cursor.execute("PRAGMA table_info(sessions)")
+            columns = {row[1] for row in cursor.fetchall()}
+            if "year_month" not in columns:
+                cursor.execute("""
+                    ALTER TABLE sessions
+                    ADD COLUMN year_month TEXT GENERATED ALWAYS AS (substr(date, 1, 6)) VIRTUAL
+                """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_id_date ON sessions (id, date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_month_id ON sessions (year_month, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_id_mode ON sessions (id, mode)")
 
+        if version < 2:
+            # Raw punch history, so a later file only adds its new punches and
+            # rebuilds the sessions of the days they belong to.
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS exceptions (
+                CREATE TABLE IF NOT EXISTS punches (
                     id TEXT,
                     date TEXT,
-                    entry TEXT,
-                    exit TEXT,
-                    PRIMARY KEY (id, date)
+                    minute INTEGER,    -- minutes since midnight
+                    code TEXT,
+                    PRIMARY KEY (id, date, minute, code)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_punches_date ON punches (date)")
+
+        if version < 3:
+            # Natural session key, so a session row cannot be stored twice; duplicates
+            # left by earlier imports are dropped first (the oldest row is kept).
+            cursor.execute("""
+                DELETE FROM sessions
+                WHERE session_id NOT IN (
+                    SELECT MIN(session_id)
+                    FROM sessions
+                    GROUP BY id, date, entry, exit, IFNULL(mode, '')
                 )
             """)
-            conn.commit()
-    def load_exceptions_from_config(self, month_in_file):
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_key
+                ON sessions (id, date, entry, exit, IFNULL(mode, ''))
+            """)
+
+        if version < 4:
+            # Precomputed Jalali calendar (weekday, Gregorian date, working-day flag per day)
+            build_calendar(cursor, *CALENDAR_YEARS, WEEKLY_DAYS_OFF)
+
+        if version < 5:
+            # Exceptions as date-range rules; the per-day table of older databases is
+            # merged into rules and replaced by a view expanding them (core.exception_rules)
+            migrate_day_rows(cursor)
+
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def load_exceptions_from_config(self, month_in_file=None):
         """
-        Read constant exceptions from config.py, expand them by all days in the given month,
-        and insert into the database.
+        Store the constant exceptions of config.py as exception rules (one row per
+        entry, whatever the month; see core.exception_rules). The rules are only
+        rewritten when the config changed. month_in_file is accepted for the callers
+        that load a month; rules do not depend on it.
         """
-        self.exceptions.clear()
-        if not month_in_file:
-            return
-
-        year = int(month_in_file[:4])
-        month = int(month_in_file[4:6])
-        # --- Determine number of days in month (Jalali logic simplified) ---
-        if 1 <= month <= 6:
-            days_in_month = 31
-        elif 7 <= month <= 12:
-            days_in_month = 30
-        else:
-            days_in_month = 31  
-        # --- Build and insert defaults ---
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for e in EXCEPTIONS:
-                pid = str(e["id"]).zfill(8)
-                for day in range(1, days_in_month + 1):
-                    date_str = f"{year:04d}{month:02d}{day:02d}"
-                    entry, exit_ = e["entry"], e["exit"]
-
-                    # Store in memory too
-                    self.exceptions[(pid, date_str)] = (entry, exit_)
-
-                    # Insert into database
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO exceptions (id, date, entry, exit)
-                        VALUES (?, ?, ?, ?)
-                    """, (pid, date_str, entry, exit_))
-            conn.commit()
+        self.exceptions = config_rules(EXCEPTIONS)
+        with self.connections.transaction() as cursor:
+            changed = sync_config_rules(cursor, self.exceptions)
+        if changed:
+            self.resolver.bump()
 
     def _build_and_save_schedules_to_db(self, month_in_file: str):
         """
-        Completely rebuild the work_schedules table for a single month.
-        Deletes all existing data and inserts fresh daily records
-        for the given month (month_in_file, e.g. "140406").
-        Uses Jalali calendar rules:
-        - Months 1–6 → 31 days
-        - Months 7–12 → 30 days
+        Rebuild the work_schedules rows of a single month with defaults.
+        Other months are left untouched.
         """
-
-        y = int(month_in_file[:4])
-        m = int(month_in_file[4:6])
-
-        # Jalali month length
-        if 7 <= m <= 12:
-            days_in_month = 30
-        else:
-            days_in_month = 31
-
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            # 🔹 1. Wipe the table clean
-            cursor.execute("DELETE FROM work_schedules")
-            conn.commit()
-            print("Cleared all existing work_schedules data.")
-
+        with self.metrics.stage("build_schedules"), self.connections.transaction() as cursor:
+            # 🔹 1. Remove this month's rows only
+            cursor.execute(
+                "DELETE FROM work_schedules WHERE date BETWEEN ? AND ?",
+                (f"{month_in_file}00", f"{month_in_file}99"),
+            )
             # 🔹 2. Insert all days for this month
-            for d in range(1, days_in_month + 1):
-                date_str = f"{y:04d}{m:02d}{d:02d}"
+            self._insert_default_schedules(cursor, month_in_file)
+
+    def _insert_default_schedules(self, cursor, month_in_file: str):
+        """Add default work_schedules rows for the days of a month that have none."""
+        # Existing dates (and the holidays set on them) are kept as they are
+        execute_values(cursor, """
+            INSERT OR IGNORE INTO work_schedules (date, is_holiday, entry, exit, floating, late_allowed)
+            VALUES {values}
+        """, [
+            (
+                date_str,
+                0,  # not holiday by default
+                DEFAULT_ENTRY,
+                DEFAULT_EXIT,
+                DEFAULT_FLOATING,
+                int(DEFAULT_LATE_ALLOWED),
+            )
+            for date_str in month_dates(month_in_file)
+        ])
 
-                cursor.execute("""
-                    INSERT INTO work_schedules (date, is_holiday, entry, exit, floating, late_allowed)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    date_str,
-                    0,  # not holiday by default
-                    DEFAULT_ENTRY,
-                    DEFAULT_EXIT,
-                    DEFAULT_FLOATING,
-                    int(DEFAULT_LATE_ALLOWED),
-                ))
+    def _load_schedules_from_db(self, month_in_file: str, warnings=None):
+        """Load all work schedules from the database into self.work_schedules.
 
-            conn.commit()       
-    def _load_schedules_from_db(self, month_in_file: str):
-        """Load all work schedules from the database into self.work_schedules."""
+        Returns the number of rows loaded. If the table cannot be read, the month
+        is rebuilt with defaults and a message is appended to warnings.
+        """
 
         self.work_schedules.clear()
 
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self.connections.cursor() as cursor:
                 cursor.execute("""
                     SELECT date, is_holiday, entry, exit, floating, late_allowed
                     FROM work_schedules
@@ -154,13 +370,13 @@ class LogProcessor:
                 rows = cursor.fetchall()
 
         except sqlite3.Error as e:
-            messagebox.showerror(
-                "Database Error",
-                f"Failed to load schedules from the database:\n{e}\n\n"
-                f"Rebuilding schedules for month {month_in_file}..."
-            )
+            if warnings is not None:
+                warnings.append(
+                    f"Failed to load schedules from the database:\n{e}\n\n"
+                    f"Rebuilding schedules for month {month_in_file}..."
+                )
             self._build_and_save_schedules_to_db(month_in_file)
-            return
+            return 0
 
         # Build dictionary
         for date, is_holiday, entry, exit_, floating, late_allowed in rows:
@@ -171,22 +387,32 @@ class LogProcessor:
                 "floating": float(floating),
                 "late_allowed": bool(late_allowed),
             }
+        self.calendar.load(self.work_schedules)
+        self.resolver.bump()
+        return len(rows)
+
+    def _load_sessions_from_db(self, months=None):
+        """Load sessions from SQLite database into self.sessions.
 
-        messagebox.showinfo(
-            "Work Schedules Loaded",
-            f"✅ Loaded {len(rows)} work schedule records from DB."
-        )        
-    def _load_sessions_from_db(self):
-        """Load all sessions from SQLite database into self.sessions."""
+        months limits the load to those year_month values (e.g. ["140406"]); None loads all.
+        """
         self.sessions.clear()
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, date, entry, exit, status, duration, mode, reason
-                FROM sessions
-                ORDER BY id, date
-            """)
+        with self.connections.cursor() as cursor:
+            if months is None:
+                cursor.execute("""
+                    SELECT id, date, entry, exit, status, duration, mode, reason
+                    FROM sessions
+                    ORDER BY id, date
+                """)
+            else:
+                months = list(months)
+                cursor.execute(f"""
+                    SELECT id, date, entry, exit, status, duration, mode, reason
+                    FROM sessions
+                    WHERE year_month IN ({", ".join("?" * len(months))})
+                    ORDER BY id, date
+                """, months)
             rows = cursor.fetchall()
 
             for row in rows:
@@ -195,324 +421,335 @@ class LogProcessor:
                 # 🔹 Convert ID back to 8-digit padded string for UI display
                 pid_str = str(pid).zfill(8)
 
-                self.sessions.append([
+                self.sessions.append(Session(
                     pid_str, date, entry, exit_, status, duration, mode, reason
-                ])
+                ))
 
-    def load_file(self, txt_path: str):
-        """Load and process TXT log file."""
-        self.records.clear()
-        self.sessions.clear()
-        # --- Step 0: Validate file content for proper format ---
-        with open(txt_path, encoding="utf-8") as f:
-            for line_no, line in enumerate(f, start=1):
-                parts = line.strip().split()
-
-                # Check 4 columns
-                if len(parts) != 4:
-                    messagebox.showerror(
-                        "Invalid File",
-                        f"Line {line_no} does not have exactly 4 columns: '{line.strip()}'"
-                        "Expected format: ID(8 chars) DATE(YYYYMMDD) TIME(HH:MM) CODE\n"
-                        "Example: 00000010 14040603 16:38 05"
-                    )
-                    return
-
-                person_id, date_str, time_str, code = parts
-
-                # Check date: exactly 8 numeric characters
-                if len(date_str) != 8 or not date_str.isdigit():
-                    messagebox.showerror(
-                        "Invalid File",
-                        f"Line {line_no} has invalid date (must be 8 digits): '{date_str}'"
-                        "Expected format: ID(8 chars) DATE(YYYYMMDD) TIME(HH:MM) CODE\n"
-                        "Example: 00000010 14040603 16:38 05"
-                    )
-                    return
-                
-                # Check ID: exactly 8 numeric characters
-                if len(person_id) != 8 or not person_id.isdigit():
-                    messagebox.showerror(
-                        "Invalid File",
-                        f"Line {line_no} has invalid ID (must be 8 digits): '{person_id}'\n"
-                        "Expected format: ID(8 chars) DATE(YYYYMMDD) TIME(HH:MM) CODE\n"
-                        "Example: 00000010 14040603 16:38 05"
-                    )
-                    return
-
-                # Check time: format HH:MM
-                try:                    
-                    datetime.strptime(time_str, "%H:%M")
-                except ValueError:
-                    messagebox.showerror(
-                        "Invalid File",
-                        f"Line {line_no} has invalid time format (should be HH:MM): '{time_str}'"
-                        "Expected format: ID(8 chars) DATE(YYYYMMDD) TIME(HH:MM) CODE\n"
-                        "Example: 00000010 14040603 16:38 05"
-                    )
-                    return
-        # --- Step 1: Peek into file and find the first month (first 6 digits) ---
-        month_in_file = None
-        with open(txt_path, encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) != 4:
-                    continue
-                _, date_str, _, _ = parts
-                if len(date_str) < 6:
-                    continue
-                year_month = date_str[:6]  # first 6 digits, e.g., '140406'
-                if month_in_file is None:
-                    month_in_file = year_month
-
-        # --- Step 1b: Show message if no valid date found ---
-        if not month_in_file:
-            messagebox.showwarning(
-                "Invalid File",
-                "No valid dates found in the file. Please check the file format."
-            )
-            return
+    def load_month(self, month_in_file: str, warnings=None) -> int:
+        """Load an already imported month from the DB: sessions, schedules and exceptions.
 
-        # --- Step 2: Check DB for existing sessions in this month ---
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT COUNT(*) FROM sessions
-                WHERE substr(date,1,6) = ?
-            """, (month_in_file,))
-            (count_existing,) = cursor.fetchone()
-
-        # --- Step 3: If found, just load from DB ---
-        if count_existing > 0:
-            messagebox.showinfo(
-                "Data Loaded",
-                f"Sessions for month {month_in_file} already exist in the database. Loading existing data."
-            )
-            self._load_sessions_from_db()
-            self._load_schedules_from_db(month_in_file)
-            self.load_exceptions_from_config(month_in_file)    
-            self.app._refresh_id_menu()
-            return
-        # --- Step 4: Otherwise, parse TXT normally and save to DB ---
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM sessions")  # Clear old DB entries
-
-        with open(txt_path, encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) != 4:
-                    continue
-                person_id, date, time, _ = parts
-                self.records[person_id][date].append(time)
-
-        # --- Step 5: Build sessions and save ---
-        self._build_sessions()
-        self._save_sessions_to_db()
-        self._build_and_save_schedules_to_db(month_in_file)
-        self.load_exceptions_from_config(month_in_file) 
+        Returns the number of work schedule rows loaded.
+        """
+        self.month_in_file = month_in_file
+        self._load_sessions_from_db([month_in_file])
+        schedules = self._load_schedules_from_db(month_in_file, warnings)
+        self.load_exceptions_from_config(month_in_file)
+        return schedules
+
+    def load_file(self, txt_path: str, quarantine=False) -> LoadResult:
+        """Load a TXT log file into the DB incrementally.
+
+        Only punches not seen in earlier imports are stored, and only the sessions
+        of the (id, date) days they fall on are rebuilt; other days, other months
+        and the reasons assigned to them are kept. Loading the same file twice is
+        a no-op apart from reloading the month.
+
+        With quarantine=True malformed lines are written to quarantine_path(txt_path)
+        with their line numbers and reasons, and the good lines are imported;
+        TooManyBadLinesError is raised only above the allowed error rate
+        (max_error_rate, default QUARANTINE_MAX_ERROR_RATE).
+
+        Raises LogFormatError for a malformed line and EmptyLogError when the
+        file holds no punches.
+        """
+        with self.metrics.action("load_file"):
+            self.records = PunchStore()
+            self.sessions.clear()
+            # --- Step 0/1: Validate and collect the file's punches in a single pass ---
+            with self.metrics.stage("parse") as stage:
+                sink = Quarantine(quarantine_path(txt_path), self.max_error_rate) if quarantine else None
+                month_in_file, punches = read_punches(txt_path, sink)
+                stage.rows = len(punches)
+
+            # --- Step 1b: Stop if no valid date found ---
+            if not month_in_file:
+                raise EmptyLogError("No valid dates found in the file. Please check the file format.")
+            result = LoadResult(month=month_in_file)
+            if sink and sink.rejected:
+                result.rejected_lines, result.quarantine_files = sink.rejected, [sink.path]
+            return self._ingest(month_in_file, punches, result)
+
+    def load_files(self, paths, workers=None, quarantine=False) -> LoadResult:
+        """Load several TXT logs of the same period (e.g. one per gate) as one import.
+
+        paths may name files or directories of *.txt files. Each file is parsed
+        and sorted in a worker process (see core.ingest.read_punch_files), the
+        sorted files are k-way merged with punches seen by several gates kept
+        once, and the merged punches go through the incremental merge of
+        load_file. LoadResult.month is the earliest month in the files.
+        quarantine works per file as in load_file.
+
+        Raises LogFormatError (naming the file) for a malformed line and
+        EmptyLogError when no file holds punches.
+        """
+        with self.metrics.action("load_files"):
+            self.records = PunchStore()
+            self.sessions.clear()
+            # --- Step 1: Parse the files in parallel, merge them into one sorted stream ---
+            with self.metrics.stage("parse") as stage:
+                files, merged = read_punch_files(log_paths(paths), workers, quarantine, self.max_error_rate)
+                punches = list(merged)
+                stage.rows = len(punches)
+            months = sorted(month for _, month, _, _ in files if month)
+            if not months:
+                raise EmptyLogError("No valid dates found in the selected files. Please check the file format.")
+
+            result = LoadResult(month=months[0], files=len(files))
+            result.duplicate_punches = sum(count for _, _, count, _ in files) - len(punches)
+            result.rejected_lines = sum(rejected for *_, rejected in files)
+            result.quarantine_files = [quarantine_path(path) for path, *_, rejected in files if rejected]
+            return self._ingest(months[0], punches, result)
+
+    def load_archive(self, paths, memory_limit_mb=None, tmp_dir=None, quarantine=False) -> LoadResult:
+        """Load log archives larger than memory (e.g. several years) out of core.
+
+        Punches are sorted into runs on disk and merged (core.external), then
+        stored in (id, date)-aligned batches of as many punches as
+        memory_limit_mb holds (default INGEST_MEMORY_LIMIT_MB), each through the
+        incremental merge of load_file in its own transaction; an interrupted
+        run can simply be repeated. Months with sessions but no punch history
+        only get their punches recorded, as in load_file. The latest month is
+        loaded afterwards (LoadResult.month). quarantine works per file as in
+        load_file.
+
+        Raises LogFormatError (naming the file) for a malformed line and
+        EmptyLogError when no file holds punches.
+        """
+        with self.metrics.action("load_archive"):
+            self.records = PunchStore()
+            self.sessions.clear()
+            files = log_paths(paths)
+            with ExitStack() as stack:
+                with self.metrics.stage("sort"):
+                    archive = stack.enter_context(ExternalSort(
+                        files, memory_limit_mb or INGEST_MEMORY_LIMIT_MB, tmp_dir, quarantine, self.max_error_rate))
+                if not archive.months:
+                    raise EmptyLogError("No valid dates found in the selected files. Please check the file format.")
+                months = sorted(archive.months)
+                result = LoadResult(month=months[-1], files=len(files), rejected_lines=archive.rejected)
+                result.quarantine_files = [
+                    quarantine_path(path) for path in files if quarantine and os.path.exists(quarantine_path(path))
+                ]
+
+                # --- Step 1: Months imported before punches were kept (checked before any insert) ---
+                legacy = set()
+                with self.connections.cursor() as cursor:
+                    for month in months:
+                        cursor.execute(SQL_MONTH_EXISTS, (month,))
+                        exists = bool(cursor.fetchone()[0])
+                        cursor.execute(SQL_MONTH_HAS_PUNCHES, (f"{month}00", f"{month}99"))
+                        if exists and not cursor.fetchone()[0]:
+                            legacy.add(month)
+                        if month == result.month:
+                            result.loaded_from_db = exists
+
+                # --- Step 2: Store the merged punches one batch of whole days at a time ---
+                with self.metrics.stage("merge") as stage:
+                    for batch in iter_day_batches(archive.punches(), archive.max_punches):
+                        with self.connections.transaction() as cursor:
+                            if legacy:
+                                cursor.executemany(
+                                    "INSERT OR IGNORE INTO punches (id, date, minute, code) VALUES (?, ?, ?, ?)",
+                                    [p for p in batch if p[1][:6] in legacy],
+                                )
+                                batch = [p for p in batch if p[1][:6] not in legacy]
+                            if batch:
+                                new_punches, affected_days, debounced = self._merge_punches(cursor, batch)
+                                result.new_punches += new_punches
+                                result.affected_days += affected_days
+                                result.debounced_punches += debounced
+                    stage.rows = result.new_punches
+
+            # --- Step 3: Default schedules, then load the latest month ---
+            with self.metrics.stage("schedules"), self.connections.transaction() as cursor:
+                for month in months:
+                    self._insert_default_schedules(cursor, month)
+            with self.metrics.stage("load_month") as stage:
+                result.schedules = self.load_month(result.month, result.warnings)
+                result.sessions = stage.rows = len(self.sessions)
+            return result
+
+    def _ingest(self, month_in_file, punches, result):
+        """Store validated (id, date, minute, code) punches and load the month(s) they touch."""
+        self.month_in_file = month_in_file
+        months = sorted({date[:6] for _, date, _, _ in punches})
+
+        with self.metrics.stage("store") as stage:
+            self.records = PunchStore.from_rows(punches)
+            stage.rows = len(self.records)
+
+        with self.connections.transaction() as cursor:
+            # --- Step 2: Check DB for this month's sessions and punch history ---
+            cursor.execute(SQL_MONTH_EXISTS, (month_in_file,))
+            result.loaded_from_db = bool(cursor.fetchone()[0])
+            cursor.execute(SQL_MONTH_HAS_PUNCHES, (f"{month_in_file}00", f"{month_in_file}99"))
+            has_history = bool(cursor.fetchone()[0])
+
+            with self.metrics.stage("merge") as stage:
+                if result.loaded_from_db and not has_history:
+                    # --- Step 3a: Month imported before punches were kept: record them as the
+                    # baseline and leave its sessions (and edits/reasons) untouched ---
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO punches (id, date, minute, code) VALUES (?, ?, ?, ?)", punches)
+                else:
+                    # --- Step 3b: Store new punches, rebuild the days they touch ---
+                    result.new_punches, result.affected_days, result.debounced_punches = \
+                        self._merge_punches(cursor, punches)
+                stage.rows = result.new_punches
+
+            # --- Step 4: Default schedules for months seen for the first time ---
+            with self.metrics.stage("schedules"):
+                for month in months:
+                    self._insert_default_schedules(cursor, month)
+
+        # --- Step 5: Load the month(s) for display and late/early checks ---
+        with self.metrics.stage("load_sessions") as stage:
+            self._load_sessions_from_db(months)
+            stage.rows = len(self.sessions)
+        with self.metrics.stage("load_schedules") as stage:
+            result.schedules = stage.rows = self._load_schedules_from_db(month_in_file, result.warnings)
+        with self.metrics.stage("exceptions") as stage:
+            self.load_exceptions_from_config(month_in_file)
+            stage.rows = len(self.exceptions)
+        result.sessions = len(self.sessions)
+        return result
+
+    def _merge_punches(self, cursor, punches):
+        """Store the punches not already in the DB and rebuild the sessions of their days.
+
+        A rebuilt session that matches a stored one on (id, date, entry, exit) keeps
+        the stored row, so reasons given to it survive; stored rows that no longer
+        match (including missing-day 'Leave' fills) are removed. Repeat reads
+        (debounce_minutes) are left out of the pairing but kept in the history.
+        Returns (new_punches, affected_days, debounced_punches).
+        """
+        # --- Step 1: Diff the file against the punch history ---
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_punches (id TEXT, date TEXT, minute INTEGER, code TEXT)")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS affected_days (id TEXT, date TEXT, PRIMARY KEY (id, date))")
+        cursor.execute("DELETE FROM incoming_punches")
+        cursor.execute("DELETE FROM affected_days")
+        cursor.executemany("INSERT INTO incoming_punches VALUES (?, ?, ?, ?)", punches)
+        cursor.execute(SQL_NEW_PUNCHES)
+        new_punches = cursor.fetchall()
+        if not new_punches:
+            return 0, 0, 0
+        cursor.executemany("INSERT INTO punches (id, date, minute, code) VALUES (?, ?, ?, ?)", new_punches)
+        days = {(pid, date) for pid, date, _, _ in new_punches}
+        cursor.executemany("INSERT INTO affected_days VALUES (?, ?)", days)
+
+        # --- Step 2: Re-pair every punch of the affected days ---
+        cursor.execute(SQL_PUNCHES_FOR_DAYS)
+        day_punches = PunchStore.from_rows(cursor.fetchall())
+        kept = day_punches.debounce(self.debounce_minutes)
+        rebuilt = {}
+        for row in pair_rows(kept, self.pairing):
+            rebuilt.setdefault(row[:4], row)
+
+        # --- Step 3: Replace only the rows that changed ---
+        cursor.execute(SQL_SESSIONS_FOR_DAYS)
+        stored_keys = set()
+        stale = []
+        for session_id, pid, date, entry, exit_ in cursor.fetchall():
+            key = (pid, date, entry, exit_)
+            if key in rebuilt:
+                stored_keys.add(key)
+            else:
+                stale.append((session_id,))
+        cursor.executemany("DELETE FROM sessions WHERE session_id = ?", stale)
+        cursor.executemany("""
+            INSERT INTO sessions (id, date, entry, exit, status, duration, mode, reason)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            row
+            for key, row in sorted(rebuilt.items(), key=lambda item: item[0][:2])
+            if key not in stored_keys
+        ])
+        return len(new_punches), len(days), len(day_punches) - len(kept)
 
     def _build_sessions(self):
-        """Convert raw records into sessions."""
-        self.sessions.clear()
-        for person_id, dates in self.records.items():
-            for date, times in dates.items():
-                sorted_times = sorted(times)
-
-                # If fewer than 1 times, skip
-                if len(sorted_times) < 1:
-                    continue
-
-                # If odd count -> fallback
-                if len(sorted_times) % 2 != 0:
-                    self.sessions.append([
-                        person_id,
-                        date,
-                        sorted_times[0],
-                        sorted_times[-1],
-                        "fallback"
-                    ])
-                    continue
-
-                # First Entry and Last Exit
-                first_entry = sorted_times[0]
-                last_exit = sorted_times[-1]
-
-                # Main paired session
-                self.sessions.append([
-                    person_id,
-                    date,
-                    first_entry,
-                    last_exit,
-                    "Paired"
-                ])
-
-                # Leave periods
-                for i in range(1, len(sorted_times) - 1, 2):
-                    first_exit = sorted_times[i]
-                    second_entry = sorted_times[i + 1]
-
-                    try:
-                        t1 = datetime.strptime(first_exit, "%H:%M")
-                        t2 = datetime.strptime(second_entry, "%H:%M")
-                        duration_min = int((t2 - t1).total_seconds() // 60)
-                    except ValueError:
-                        duration_min = 0
-
-                    self.sessions.append([
-                        person_id,
-                        date,
-                        first_exit,
-                        second_entry,
-                        "Paired",
-                        duration_min,
-                        "Leave",
-                        None
-                    ])
+        """Convert the raw punch store (minutes since midnight) into sessions."""
+        with self.metrics.stage("build_sessions") as stage:
+            self.sessions.clear()
+            self.sessions.extend(build_sessions(self.records.debounce(self.debounce_minutes), self.pairing))
+            stage.rows = len(self.sessions)
 
     def _save_sessions_to_db(self):
         """Save sessions into SQLite database, sorted by ID and date."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # 🔹 Sort by ID (pid) and then by date
-            sorted_sessions = sorted(self.sessions, key=lambda s: (s[0], s[1]))
-            for s in sorted_sessions:
-                # Handle variable length (leave sessions have more fields)
-                if len(s) == 5:
-                    pid, date, entry, exit_, status = s
-                    duration = 0
-                    mode = None
-                    reason = None
-                else:
-                    pid, date, entry, exit_, status, duration, mode, reason = s
+        # 🔹 Sort by ID (pid) and then by date
+        sorted_sessions = sorted(self.sessions, key=lambda s: (s.pid, s.date))
+        with self.metrics.stage("save_sessions") as stage, self.connections.transaction() as cursor:
+            stage.rows = len(sorted_sessions)
+            cursor.executemany("""
+                INSERT OR IGNORE INTO sessions (id, date, entry, exit, status, duration, mode, reason)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (tuple(s) for s in sorted_sessions))
 
-                cursor.execute("""
-                    INSERT INTO sessions (id, date, entry, exit, status, duration, mode, reason)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (pid, date, entry, exit_, status, duration, mode, reason))
-            conn.commit()
-        # 🔹 Refresh the ID menu in UI after saving
-        if hasattr(self, "app"):
-            self.app._refresh_id_menu()
     def get_fallback_sessions(self, pid: str):
-        """Return fallback sessions for a person ID."""
-        return [(i, s) for i, s in enumerate(self.sessions) if s[0] == pid and s[4] == "fallback"]
+        """Return [(index, session), ...] of the fallback sessions of a person ID."""
+        return self.sessions.fallback_for(pid)
 
     def edit_fallback_sessions(self, pid: str, updates: list[tuple[int, str, str]]):
         for idx, entry, exit_ in updates:
-            self.sessions[idx][2] = entry
-            self.sessions[idx][3] = exit_
+            self.sessions[idx].entry = entry
+            self.sessions[idx].exit = exit_
         # Update database as well
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for idx, entry, exit_ in updates:
-                s = self.sessions[idx]
-                cursor.execute("""
-                    UPDATE sessions
-                    SET entry=?, exit=?
-                    WHERE id=? AND date=? AND status=?
-                """, (entry, exit_, s[0], s[1], s[4]))
-            conn.commit()
+        with self.connections.transaction() as cursor:
+            cursor.executemany("""
+                UPDATE sessions
+                SET entry=?, exit=?
+                WHERE id=? AND date=? AND status=?
+            """, [
+                (entry, exit_, self.sessions[idx].pid, self.sessions[idx].date, self.sessions[idx].status)
+                for idx, entry, exit_ in updates
+            ])
         # 🔹 Sort sessions by ID and then by date
-        self.sessions.sort(key=lambda s: (s[0], s[1]))
-
-    def find_late_early(self, pid: str):
-        """Return late/early sessions with minutes and reasons, using DB schedules and exceptions."""
-        results = []
-
-        # --- Step 1: Fetch all sessions for this ID from the DB ---
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, date, entry, exit, status, duration, mode, reason
-                FROM sessions
-                WHERE id = ?
-                ORDER BY date
-            """, (pid,))
-            sessions = cursor.fetchall()
-        # --- Remove duplicates in memory (keep first occurrence) ---
-        seen = set()
-        unique_sessions = []
-        for s in sessions:
-            key = (s[1], s[2], s[3])  # date, entry, exit
-            if key not in seen:
-                seen.add(key)
-                unique_sessions.append(s)
-
-        sessions = unique_sessions
-        # 🔹 Sort by ID then date (extra safety)
-        sessions.sort(key=lambda s: (s[0], s[1]))
-        for s in sessions:
-            # --- Step 2: Unpack session depending on tuple length ---
-            if len(s) == 5:
-                pid_s, date, entry_str, exit_str, status = s
-                duration, mode, reason = 0, None, None
-            else:
-                pid_s, date, entry_str, exit_str, status, duration, mode, reason = s
-
-            # --- Step 3: Skip Leave sessions (they are reported as-is) ---
-            if mode == "Leave":
-                results.append((pid_s, date, entry_str, exit_str, status, duration, mode))
-                continue
-
-            # --- Step 4: Convert actual entry/exit strings to datetime objects ---
-            try:
-                entry_dt = datetime.strptime(entry_str, "%H:%M")
-                exit_dt = datetime.strptime(exit_str, "%H:%M")
-            except ValueError:
-                messagebox.showwarning("Invalid Time", f"Skipping session for {pid_s} on {date}: {entry_str}, {exit_str}")
-                continue
-           
-            # --- Step 5: Fetch scheduled times from in-memory schedules first ---
-            schedule = getattr(self.app, "work_schedules", {}).get(date)
-
-            if schedule:
-                scheduled_entry_str = schedule.get("entry", getattr(self.app, "DEFAULT_ENTRY", "07:30"))
-                scheduled_exit_str = schedule.get("exit", getattr(self.app, "DEFAULT_EXIT", "16:30"))
-                floating = schedule.get("floating", getattr(self.app, "DEFAULT_FLOATING", 1.0))
-                late_allowed = schedule.get("late_allowed", getattr(self.app, "DEFAULT_LATE_ALLOWED", 0))
-            else:
-                # --- Schedule missing in memory: check ID-specific exceptions in DB ---
-                cursor.execute("SELECT entry, exit FROM exceptions WHERE id = ? AND date = ?", (pid_s, date))
-                ex_row = cursor.fetchone()
-
-                if ex_row:
-                    scheduled_entry_str, scheduled_exit_str = ex_row
-                    floating = getattr(self.app, "DEFAULT_FLOATING", 1.0)
-                    late_allowed = getattr(self.app, "DEFAULT_LATE_ALLOWED", 0)
+        self.sessions.sort(key=lambda s: (s.pid, s.date))
+
+    def _exceptions_for(self, pid: str):
+        with self.connections.cursor() as cursor:
+            return exceptions_for(cursor, pid)
+
+    def schedule_defaults(self):
+        """Default schedule values from resources.config."""
+        return {
+            "entry": DEFAULT_ENTRY,
+            "exit": DEFAULT_EXIT,
+            "floating": DEFAULT_FLOATING,
+            "late_allowed": DEFAULT_LATE_ALLOWED,
+        }
+
+    def find_late_early(self, pid: str, on_invalid=None, year_month=None):
+        """Return late/early sessions with minutes and reasons, using DB schedules and exceptions.
+
+        on_invalid(pid, date, entry, exit) is called for sessions skipped because of unparsable times.
+        year_month ('YYYYMM') limits the check to one month, as find_late_early_all() is; None checks all.
+        """
+        with self.metrics.action("find_late_early"), self.connections.cursor() as cursor:
+            # --- Step 1: Fetch all sessions for this ID from the DB ---
+            with self.metrics.stage("read_sessions") as stage:
+                if year_month is None:
+                    cursor.execute(SQL_SESSIONS_FOR_ID, (pid,))
                 else:
-                    # --- Fallback to defaults ---
-                    scheduled_entry_str = getattr(self.app, "DEFAULT_ENTRY", "07:30")
-                    scheduled_exit_str = getattr(self.app, "DEFAULT_EXIT", "16:30")
-                    floating = getattr(self.app, "DEFAULT_FLOATING", 1.0)
-                    late_allowed = getattr(self.app, "DEFAULT_LATE_ALLOWED", 0)
-
-            # --- Step 6: Convert schedule strings to datetime objects ---
-            scheduled_entry = datetime.strptime(scheduled_entry_str, "%H:%M")
-            scheduled_exit = datetime.strptime(scheduled_exit_str, "%H:%M")
-            float_minutes = int(float(floating) * 60)
-
-            # --- Step 7: Calculate allowed entry window ---
-            if late_allowed:
-                latest_allowed_entry = scheduled_entry + timedelta(minutes=10 + float_minutes)
-            else:
-                latest_allowed_entry = scheduled_entry + timedelta(minutes=float_minutes)
-
-            # --- Step 8: Check Late Entry ---
-            if entry_dt > latest_allowed_entry:
-                minutes_late = int((entry_dt - latest_allowed_entry).total_seconds() // 60)
-                results.append((pid_s, date, entry_str, exit_str, status, minutes_late, "Late Entry"))
-                allowed_exit = scheduled_exit + timedelta(minutes=float_minutes)
-            else:
-                if entry_dt <= scheduled_entry:
-                    entry_dt = scheduled_entry
-                # Allowed entry → allowed exit is extended by difference between actual and scheduled entry
-                delta_entry = entry_dt - scheduled_entry
-                allowed_exit = scheduled_exit + delta_entry
-
-            # --- Step 9: Check Early Exit ---
-            if exit_dt < allowed_exit:
-                minutes_early = int((allowed_exit - exit_dt).total_seconds() // 60)
-                results.append((pid_s, date, entry_str, exit_str, status, minutes_early, "Early Exit"))
-
-        return results
-
+                    cursor.execute(SQL_SESSIONS_FOR_ID_MONTH, (year_month, pid))
+                sessions = cursor.fetchall()
+                stage.rows = len(sessions)
+
+                self.resolver.exceptions(pid)  # read here, not while evaluating
+
+            with self.metrics.stage("evaluate") as stage:
+                results = evaluate_late_early(sessions, self.resolver.resolve, on_invalid=on_invalid)
+                stage.rows = len(results)
+            return results
+
+    def find_late_early_all(self, year_month: str):
+        """Return {pid: late/early results} for every ID of a month, evaluated with NumPy arrays."""
+        with self.metrics.action("find_late_early_all"), self.metrics.stage("evaluate") as stage:
+            results = evaluate_month(
+                self.db_path,
+                year_month,
+                work_schedules=self.work_schedules,
+                defaults=self.schedule_defaults(),
+                conn=self.connections.connection(),
+            )
+            stage.rows = sum(len(rows) for rows in results.values())
+            return results
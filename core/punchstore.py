@@ -0,0 +1,148 @@
+"""Columnar storage for raw punches.
+
+A PunchStore keeps parallel NumPy arrays sorted by (id, date, minute): uint32
+person IDs and dates (the 8-digit columns as integers), uint16 minutes since
+midnight and uint8 device codes, plus an offset index per person. That is 11
+bytes a punch instead of the Python objects of a nested dict of lists.
+"""
+import numpy as np
+from core.ingest import iter_punches, read_fixed_width
+
+# Code column value for codes that are missing or not a number below 255
+UNKNOWN_CODE = 255
+
+
+def code_number(code) -> int:
+    """Return a device code such as '04' as its number (UNKNOWN_CODE if it has none)."""
+    if isinstance(code, str) and code.isdigit() and int(code) < UNKNOWN_CODE:
+        return int(code)
+    return UNKNOWN_CODE
+
+
+class PunchStore:
+    """Punches sorted by (id, date, minute, code), with per-person offsets.
+
+    The punches of person_ids[i] are rows person_offsets[i]:person_offsets[i + 1].
+    """
+
+    __slots__ = ("ids", "dates", "minutes", "codes", "person_ids", "person_offsets")
+
+    def __init__(self, ids=(), dates=(), minutes=(), codes=None):
+        ids = np.asarray(ids, dtype=np.uint32)
+        dates = np.asarray(dates, dtype=np.uint32)
+        minutes = np.asarray(minutes, dtype=np.uint16)
+        if codes is None:
+            codes = np.full(len(ids), UNKNOWN_CODE, dtype=np.uint8)
+        codes = np.asarray(codes, dtype=np.uint8)
+        order = np.lexsort((codes, minutes, dates, ids))
+        self.ids = ids[order]
+        self.dates = dates[order]
+        self.minutes = minutes[order]
+        self.codes = codes[order]
+        self.person_ids, starts = np.unique(self.ids, return_index=True)
+        self.person_offsets = np.append(starts, len(self.ids)).astype(np.int64)
+
+    @classmethod
+    def from_array(cls, punches):
+        """Build from a core.ingest.PUNCH_DTYPE array (the fixed-width fast path)."""
+        return cls(punches["id"], punches["date"], punches["minute"], punches["code"])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (person_id, date, minute[, code]) rows with 8-digit string columns."""
+        rows = list(rows)
+        return cls(
+            np.fromiter((int(r[0]) for r in rows), dtype=np.uint32, count=len(rows)),
+            np.fromiter((int(r[1]) for r in rows), dtype=np.uint32, count=len(rows)),
+            np.fromiter((r[2] for r in rows), dtype=np.uint16, count=len(rows)),
+            np.fromiter((code_number(r[3]) if len(r) > 3 else UNKNOWN_CODE for r in rows),
+                        dtype=np.uint8, count=len(rows)),
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from the older {person_id: {date: [minute, ...]}} mapping."""
+        return cls.from_rows(
+            (person_id, date, minute)
+            for person_id, dates in records.items()
+            for date, minutes in dates.items()
+            for minute in minutes
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column and index arrays."""
+        return sum(a.nbytes for a in (self.ids, self.dates, self.minutes, self.codes,
+                                      self.person_ids, self.person_offsets))
+
+    def debounce(self, window):
+        """Return the store without repeat reads of a badge.
+
+        A punch at most window minutes after the previous punch of the same
+        (id, date) is dropped, so a burst of reads keeps only its first punch;
+        window=0 drops same-minute repeats only, window=None keeps every punch.
+        """
+        if window is None or len(self) < 2:
+            return self
+        repeat = ((self.ids[1:] == self.ids[:-1]) & (self.dates[1:] == self.dates[:-1])
+                  & (np.diff(self.minutes.astype(np.int32)) <= window))
+        if not repeat.any():
+            return self
+        keep = np.concatenate(([True], ~repeat))
+        return PunchStore(self.ids[keep], self.dates[keep], self.minutes[keep], self.codes[keep])
+
+    def person(self, person_id: str):
+        """Return the row slice holding one person's punches (empty if unknown)."""
+        key = int(person_id)
+        i = int(np.searchsorted(self.person_ids, key))
+        if i == len(self.person_ids) or self.person_ids[i] != key:
+            return slice(0, 0)
+        return slice(int(self.person_offsets[i]), int(self.person_offsets[i + 1]))
+
+    def days(self, with_codes=False):
+        """Yield (person_id, date, minutes) per employee-day, minutes sorted ascending.
+
+        with_codes adds the matching list of device codes as a fourth item.
+        """
+        if not len(self):
+            return
+        new_day = (self.ids[1:] != self.ids[:-1]) | (self.dates[1:] != self.dates[:-1])
+        starts = np.concatenate(([0], np.flatnonzero(new_day) + 1))
+        bounds = [*starts.tolist(), len(self)]
+
+        # ID and date strings are formatted once per distinct value
+        id_text = [f"{v:08d}" for v in self.person_ids.tolist()]
+        day_ids = np.searchsorted(self.person_ids, self.ids[starts]).tolist()
+        date_values, day_dates = np.unique(self.dates[starts], return_inverse=True)
+        date_text = [f"{v:08d}" for v in date_values.tolist()]
+
+        minutes = self.minutes.tolist()
+        codes = self.codes.tolist() if with_codes else None
+        for i, (id_index, date_index) in enumerate(zip(day_ids, day_dates.tolist())):
+            start, end = bounds[i], bounds[i + 1]
+            if with_codes:
+                yield id_text[id_index], date_text[date_index], minutes[start:end], codes[start:end]
+            else:
+                yield id_text[id_index], date_text[date_index], minutes[start:end]
+
+
+def read_store(txt_path: str):
+    """Read a TXT log into (month_in_file, PunchStore), keeping repeated lines.
+
+    Uses the fixed-width fast path when the file allows it; raises
+    LogFormatError like core.ingest.read_log otherwise.
+    """
+    fixed = read_fixed_width(txt_path)
+    if fixed is not None:
+        return f"{fixed['date'][0]:08d}"[:6], PunchStore.from_array(fixed)
+
+    month_in_file = None
+    rows = []
+    for _, person_id, date_str, minute, code in iter_punches(txt_path):
+        if month_in_file is None:
+            month_in_file = date_str[:6]
+        rows.append((person_id, date_str, minute, code))
+    return month_in_file, PunchStore.from_rows(rows)
@@ -0,0 +1,123 @@
+"""Effective work schedule of an ID on a date: schedule → ID exception → defaults.
+
+    resolver = ScheduleResolver(work_schedules, defaults, load_exceptions)
+    schedule = resolver.resolve("00000022", "14040702")
+    schedule.entry, schedule.latest_entry   # minutes since midnight
+
+The late/early check, the missing-day fill (as SQL, see core.reports) and the
+schedule editor all resolve schedules this way. Results are kept in a
+bounded LRU cache; version counts schedule and exception changes, and
+cached entries from an older version are resolved again, so bump() after
+changing work_schedules or the exceptions.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from core.timeutil import to_hhmm, to_minutes
+
+# Extra minutes a schedule with late_allowed lets an entry be late
+LATE_GRACE_MINUTES = 10
+DEFAULT_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class EffectiveSchedule:
+    """A resolved schedule; times are minutes since midnight."""
+    entry: int
+    exit: int
+    floating: int           # minutes
+    late_allowed: bool
+    is_holiday: bool = False
+    source: str = "default"  # "schedule", "exception" or "default"
+
+    @property
+    def latest_entry(self):
+        """Latest entry that is not late."""
+        return self.entry + self.floating + (LATE_GRACE_MINUTES if self.late_allowed else 0)
+
+    def as_schedule(self):
+        """The work_schedules dict form ('HH:MM' times, floating in hours)."""
+        return {
+            "entry": to_hhmm(self.entry),
+            "exit": to_hhmm(self.exit),
+            "floating": self.floating / 60,
+            "late_allowed": self.late_allowed,
+            "is_holiday": self.is_holiday,
+        }
+
+
+class ScheduleResolver:
+    """Resolves (pid, date) to an EffectiveSchedule through a versioned LRU cache.
+
+    work_schedules: the {date: schedule} dict the app keeps (read, not copied);
+    defaults: entry, exit, floating and late_allowed for days with neither a
+    schedule nor an exception; load_exceptions(pid) returns {date: (entry, exit)}
+    and is called once per ID and version.
+    """
+
+    def __init__(self, work_schedules, defaults, load_exceptions, maxsize=DEFAULT_CACHE_SIZE):
+        self.work_schedules = work_schedules
+        self.defaults = defaults
+        self.load_exceptions = load_exceptions
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # (pid, date) → (version, EffectiveSchedule)
+        self._exceptions = {}        # pid → {date: (entry, exit)} of the current version
+        self._exceptions_version = 0
+
+    def bump(self):
+        """Invalidate every cached schedule (work_schedules or exceptions changed)."""
+        self.version += 1
+
+    def exceptions(self, pid: str):
+        """{date: (entry, exit)} of pid, loaded once per version."""
+        if self._exceptions_version != self.version:
+            self._exceptions.clear()
+            self._exceptions_version = self.version
+        found = self._exceptions.get(pid)
+        if found is None:
+            found = self._exceptions[pid] = self.load_exceptions(pid)
+        return found
+
+    def resolve(self, pid: str, date: str) -> EffectiveSchedule:
+        key = (pid, date)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self.version:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached[1]
+
+        self.misses += 1
+        schedule = self._resolve(pid, date)
+        self._cache[key] = (self.version, schedule)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return schedule
+
+    def _resolve(self, pid, date):
+        defaults = self.defaults
+        schedule = self.work_schedules.get(date)
+        if schedule:
+            return EffectiveSchedule(
+                to_minutes(schedule.get("entry", defaults["entry"])),
+                to_minutes(schedule.get("exit", defaults["exit"])),
+                int(float(schedule.get("floating", defaults["floating"])) * 60),
+                bool(schedule.get("late_allowed", defaults["late_allowed"])),
+                bool(schedule.get("is_holiday")),
+                "schedule",
+            )
+        exception = self.exceptions(pid).get(date)
+        entry, exit_ = exception or (defaults["entry"], defaults["exit"])
+        return EffectiveSchedule(
+            to_minutes(entry),
+            to_minutes(exit_),
+            int(float(defaults["floating"]) * 60),
+            bool(defaults["late_allowed"]),
+            source="exception" if exception else "default",
+        )
+
+    def stats(self):
+        """Cache counters, like ConnectionManager.stats()."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "version": self.version}
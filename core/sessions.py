@@ -0,0 +1,121 @@
+"""In-memory session rows and the per-ID index the app browses them with."""
+
+# Statuses of day rows that need a manual fix (core.pairing sets them)
+UNMATCHED_ENTRY = "unmatched entry"   # entry punch(es) with no exit
+UNMATCHED_EXIT = "unmatched exit"     # exit punch(es) with no entry
+UNMATCHED = "unmatched"               # both kinds, no complete session
+REVIEW_STATUSES = frozenset({"fallback", UNMATCHED_ENTRY, UNMATCHED_EXIT, UNMATCHED})
+# Mode of a stray punch on a day that also has a complete session; such rows
+# are kept for review but not checked for late entry / early exit
+STRAY_MODE = "Unmatched"
+
+
+class Session:
+    """One session: (id, date, entry, exit, status, duration, mode, reason).
+
+    Fixed shape with __slots__; still indexable and iterable like the row lists
+    it replaces, so s[0] is the ID and tuple(s) is the DB row.
+    """
+
+    __slots__ = ("pid", "date", "entry", "exit", "status", "duration", "mode", "reason")
+
+    def __init__(self, pid, date, entry, exit, status, duration=0, mode=None, reason=None):
+        self.pid = pid
+        self.date = date
+        self.entry = entry
+        self.exit = exit
+        self.status = status
+        self.duration = duration
+        self.mode = mode
+        self.reason = reason
+
+    @classmethod
+    def coerce(cls, row):
+        """Return row as a Session (rows may be 5- or 8-element sequences)."""
+        return row if isinstance(row, cls) else cls(*row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return getattr(self, self.__slots__[index])
+
+    def __setitem__(self, index, value):
+        setattr(self, self.__slots__[index], value)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (Session, list, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Session{tuple(self)!r}"
+
+
+class SessionTable:
+    """Ordered list of Sessions with a pid → positions index and a fallback index.
+
+    Looking up one ID costs O(its sessions) instead of a scan of the whole list.
+    The fallback index holds the day rows that need a manual fix (statuses in
+    REVIEW_STATUSES, stray-punch rows excluded). The indexes follow each
+    session's ID and status as they were when it was added; sort() and clear()
+    rebuild them.
+    """
+
+    def __init__(self, rows=()):
+        self._rows = []
+        self._by_pid = {}
+        self._fallback = {}
+        self.extend(rows)
+
+    def _index(self, position, session):
+        self._by_pid.setdefault(session.pid, []).append(position)
+        if session.status in REVIEW_STATUSES and session.mode != STRAY_MODE:
+            self._fallback.setdefault(session.pid, []).append(position)
+
+    def append(self, row):
+        session = Session.coerce(row)
+        self._rows.append(session)
+        self._index(len(self._rows) - 1, session)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def clear(self):
+        self._rows.clear()
+        self._by_pid.clear()
+        self._fallback.clear()
+
+    def sort(self, key=None):
+        self._rows.sort(key=key)
+        self._by_pid.clear()
+        self._fallback.clear()
+        for position, session in enumerate(self._rows):
+            self._index(position, session)
+
+    def pids(self):
+        """IDs that have at least one session."""
+        return self._by_pid.keys()
+
+    def for_pid(self, pid: str):
+        """Return [(position, session), ...] for one ID."""
+        return [(i, self._rows[i]) for i in self._by_pid.get(pid, ())]
+
+    def fallback_for(self, pid: str):
+        """Return [(position, session), ...] of one ID's fallback sessions."""
+        return [(i, self._rows[i]) for i in self._fallback.get(pid, ())]
+
+    def __getitem__(self, position):
+        return self._rows[position]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
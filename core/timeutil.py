@@ -0,0 +1,34 @@
+"""Integer minute-of-day time model.
+
+Punches and schedules are held as minutes since midnight (0–1439) instead of
+datetime objects. Parsing and formatting go through precomputed lookup tables,
+so converting "HH:MM" costs one dict/tuple access instead of a strptime call.
+"""
+
+MINUTES_PER_DAY = 24 * 60
+
+# 1,440-entry formatting table: MINUTES_TO_TIME[450] == "07:30"
+MINUTES_TO_TIME = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY))
+
+# Parsing table covering every spelling datetime.strptime(..., "%H:%M") accepts
+# ("7:05", "07:5", "07:05", ...).
+TIME_TO_MINUTES = {
+    f"{h_str}:{m_str}": h * 60 + m
+    for h in range(24)
+    for h_str in {str(h), f"{h:02d}"}
+    for m in range(60)
+    for m_str in {str(m), f"{m:02d}"}
+}
+
+
+def to_minutes(time_str: str) -> int:
+    """Parse 'HH:MM' into minutes since midnight; raise ValueError like strptime."""
+    try:
+        return TIME_TO_MINUTES[time_str]
+    except (KeyError, TypeError):
+        raise ValueError(f"time data {time_str!r} does not match format '%H:%M'") from None
+
+
+def to_hhmm(minutes: int) -> str:
+    """Format minutes since midnight as 'HH:MM' (wraps past midnight like datetime does)."""
+    return MINUTES_TO_TIME[minutes % MINUTES_PER_DAY]
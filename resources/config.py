@@ -11,9 +11,60 @@ DEFAULT_EXIT = "16:30"
 DEFAULT_FLOATING = 1.0
 DEFAULT_LATE_ALLOWED = False
 
-# Constant exceptions 
+# Constant exceptions, stored as rules (core.exception_rules), not per day.
+# Optional keys: "valid_from" / "valid_to" (YYYYMMDD, inclusive) and
+# "weekdays" (0 = Saturday ... 6 = Friday); without them an entry applies
+# to every day. Where entries of an ID overlap, the later one wins
 EXCEPTIONS = [
     {"id": 6, "entry": "07:30", "exit": "13:30"},
     {"id": 15, "entry": "07:30", "exit": "13:30"},
     {"id": 22, "entry": "07:30", "exit": "14:30"},
-]
\ No newline at end of file
+]
+
+# SQLite PRAGMAs applied to every connection opened by core.db
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,      # negative = KiB, i.e. ~20 MB page cache
+    "temp_store": "MEMORY",
+}
+
+# Quarantined imports: malformed lines go to a quarantine file; the import
+# gives up only when more than this share of lines is bad (checked from
+# QUARANTINE_MIN_LINES lines on, and for the whole file at the end)
+QUARANTINE_MAX_ERROR_RATE = 0.01
+QUARANTINE_MIN_LINES = 1000
+
+# Memory ceiling (MB) for the punches LogProcessor.load_archive holds at once
+INGEST_MEMORY_LIMIT_MB = 256
+
+# Session pairing: "parity" pairs a day's punches by their order alone,
+# "direction" also uses the device code of each punch on days with an odd
+# punch count, tagging the unmatched punches (see core.pairing)
+PAIRING_MODE = "parity"
+# Device code → punch direction; punches with other codes (e.g. "00") are
+# taken as whichever direction completes the open session
+PUNCH_DIRECTIONS = {"04": "entry", "05": "exit"}
+
+# Jalali calendar table (core.jalali): the years it is precomputed for, and the
+# weekdays that are never working days (0 = Saturday ... 6 = Friday, e.g. (6,));
+# the missing-day fill and the exceptions view only cover these years. Applied when the
+# table is built, i.e. when a database is created or upgraded
+CALENDAR_YEARS = (1390, 1420)
+WEEKLY_DAYS_OFF = ()
+
+# Repeat reads: a punch at most this many minutes after the previous punch of
+# the same employee-day is dropped before pairing (0 = same-minute repeats
+# only, None = keep every punch); raw punches are stored as read
+DEBOUNCE_MINUTES = 1
+
+# Instrumentation (core.metrics): per-stage timings and row counts of each
+# user action go to METRICS_PATH (*.prom = Prometheus text file, otherwise
+# JSON lines; None = kept in memory only); PROFILE_DIR gets a cProfile dump
+# of each action (None = off); METRICS_TRACE_MEMORY adds per-stage peak
+# Python memory through tracemalloc, which slows the stages down, and
+# METRICS_TRACE_SQL the number of SQL statements each stage runs
+METRICS_PATH = None
+PROFILE_DIR = None
+METRICS_TRACE_MEMORY = False
+METRICS_TRACE_SQL = False
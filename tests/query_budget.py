@@ -0,0 +1,28 @@
+"""Query budgets: fail a test when an action runs more SQL statements than allowed.
+
+    class TestSomething(QueryBudgetMixin, unittest.TestCase):
+        def test_fill(self):
+            with self.assertQueryBudget(processor.connections, 8):
+                reporter.fill_missing_days(pid)
+
+Statements are counted with core.db.QueryTracer, so a statement run per row
+(a loop of execute calls, or executemany) counts once per row and breaks the
+budget as the data grows.
+"""
+from contextlib import contextmanager
+
+
+class QueryBudgetMixin:
+    """unittest.TestCase mixin adding assertQueryBudget."""
+
+    @contextmanager
+    def assertQueryBudget(self, connections, max_statements, max_repeats=None):
+        """Fail if the block runs more than max_statements statements on connections
+        (a core.db.ConnectionManager), or one statement shape more than max_repeats times.
+        """
+        with connections.trace() as tracer:
+            yield tracer
+        if tracer.count > max_statements:
+            self.fail(f"{tracer.count} SQL statements, budget {max_statements}:\n{tracer.report()}")
+        if max_repeats is not None and tracer.repeated(max_repeats + 1):
+            self.fail(f"a statement ran more than {max_repeats} times:\n{tracer.report()}")
@@ -0,0 +1,76 @@
+import os
+import random
+import tempfile
+import unittest
+from core.processor import LogProcessor
+from core.timeutil import to_hhmm
+
+
+class TestEvaluateMonth(unittest.TestCase):
+    """The NumPy batch engine must agree with the per-ID find_late_early path."""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(self._remove_db)
+        self.processor = LogProcessor(db_path=self.db_path)
+
+    def _remove_db(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def _random_month(self, rng, month="140407"):
+        sessions = []
+        for n in range(1, 41):
+            pid = f"{n:08d}"
+            for day in range(1, 31):
+                date = f"{month}{day:02d}"
+                if rng.random() < 0.1:
+                    continue
+                entry = to_hhmm(rng.randint(6 * 60, 10 * 60))
+                exit_ = to_hhmm(rng.randint(13 * 60, 18 * 60))
+                status = "fallback" if rng.random() < 0.1 else "Paired"
+                sessions.append([pid, date, entry, exit_, status])
+                if rng.random() < 0.1:
+                    sessions.append([pid, date, entry, exit_, status])  # duplicate row
+                if rng.random() < 0.2:
+                    sessions.append([pid, date, "10:00", "10:25", "Paired", 25, "Leave", None])
+                if rng.random() < 0.05:
+                    sessions.append([pid, date, "18:40", "18:40", "unmatched entry", 0, "Unmatched", None])
+        sessions.append(["00000003", f"{month}05", "bad", "16:30", "fallback"])
+        return sessions
+
+    def test_matches_per_id_path(self):
+        rng = random.Random(1404)
+        self.processor.sessions = self._random_month(rng)
+        self.processor._save_sessions_to_db()
+        self.processor._build_and_save_schedules_to_db("140407")
+        self.processor.load_exceptions_from_config("140407")
+
+        # Schedules for only part of the month, so exceptions and defaults are exercised too
+        work_schedules = {}
+        for day in range(1, 16):
+            work_schedules[f"140407{day:02d}"] = {
+                "entry": rng.choice(["07:30", "08:00", "09:00"]),
+                "exit": rng.choice(["16:30", "17:00"]),
+                "floating": rng.choice([0.0, 0.5, 1.0]),
+                "late_allowed": rng.random() < 0.5,
+                "is_holiday": False,
+            }
+        self.processor.work_schedules.update(work_schedules)
+
+        expected = {}
+        for pid in sorted({s[0] for s in self.processor.sessions}):
+            rows = self.processor.find_late_early(pid)
+            if rows:
+                expected[pid] = rows
+
+        self.assertEqual(self.processor.find_late_early_all("140407"), expected)
+
+    def test_empty_month(self):
+        self.assertEqual(self.processor.find_late_early_all("140407"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
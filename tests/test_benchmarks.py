@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from benchmarks.run import SCENARIOS, run_benchmarks
+from benchmarks.synthetic import generate_lines, write_log
+from core.ingest import read_log
+
+
+class TestSyntheticLog(unittest.TestCase):
+    def test_log_is_valid_and_reproducible(self):
+        options = dict(employees=5, days=3, punches_per_day=4, odd_rate=0.5, duplicate_rate=0.1, seed=7)
+        self.assertEqual(list(generate_lines(**options)), list(generate_lines(**options)))
+
+        fd, path = tempfile.mkstemp(suffix=".TXT")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        lines = write_log(path, **options)
+        month, records = read_log(path)
+        self.assertEqual(month, "140402")
+        self.assertEqual(len(records), 5)
+        self.assertEqual(sum(len(m) for dates in records.values() for m in dates.values()), lines)
+        # Some days lost a punch, so the log exercises the fallback path
+        self.assertTrue(any(len(m) % 2 for dates in records.values() for m in dates.values()))
+
+    def test_report_covers_every_scenario(self):
+        report = run_benchmarks(repeat=1, employees=3, days=2)
+        self.assertEqual(set(report["scenarios"]), set(SCENARIOS))
+        for result in report["scenarios"].values():
+            self.assertEqual(len(result["runs_s"]), 1)
+            self.assertGreaterEqual(result["min_s"], 0)
+        self.assertEqual(report["connections_opened"], 1)
+        self.assertLess(report["memory"]["punch_store_bytes"], report["memory"]["records_dict_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from core.cli import main
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "ordibehesht.TXT")
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db = os.path.join(self.tmp, "sessions.db")
+
+    def run_cli(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            code = main(["--db", self.db, *argv])
+        return code, out.getvalue(), err.getvalue()
+
+    def test_ingest_then_evaluate_and_export(self):
+        code, out, _ = self.run_cli("ingest", SAMPLE)
+        self.assertEqual(code, 0)
+        self.assertIn("Month 140402", out)
+
+        code, out, _ = self.run_cli("late-early", "140402", "--id", "00000022")
+        self.assertEqual(code, 0)
+        self.assertTrue(out.startswith("ID,Date,Entry,Exit"))
+
+        csv_path = os.path.join(self.tmp, "all.csv")
+        self.assertEqual(self.run_cli("export", csv_path)[0], 0)
+        self.assertTrue(os.path.exists(csv_path))
+
+    def _ingest_two_months(self):
+        """The sample month 140402 and a copy of it as 140403."""
+        with open(SAMPLE, encoding="utf-8") as f:
+            lines = f.read().replace(" 140402", " 140403")
+        next_month = os.path.join(self.tmp, "khordad.TXT")
+        with open(next_month, "w", encoding="utf-8") as f:
+            f.write(lines)
+        self.assertEqual(self.run_cli("ingest", SAMPLE)[0], 0)
+        self.assertEqual(self.run_cli("ingest", next_month)[0], 0)
+
+    def test_late_early_covers_one_month(self):
+        self._ingest_two_months()
+        code, out, _ = self.run_cli("late-early", "140403", "--id", "00000010")
+        self.assertEqual(code, 0)
+        rows = [line.split(",") for line in out.splitlines()[1:]]
+        self.assertTrue(rows)
+        self.assertEqual({row[1][:6] for row in rows}, {"140403"})
+        _, out, _ = self.run_cli("late-early", "140403")
+        self.assertEqual([row for row in (line.split(",") for line in out.splitlines()[1:])
+                          if row[0] == "00000010"], rows)
+
+    def test_reports_cover_one_month(self):
+        self._ingest_two_months()
+
+        def month_rows(month):
+            with sqlite3.connect(self.db) as conn:
+                return conn.execute("SELECT COUNT(*) FROM sessions WHERE year_month = ?", (month,)).fetchone()[0]
+
+        before = month_rows("140402"), month_rows("140403")
+        out_dir = os.path.join(self.tmp, "reports")
+        self.assertEqual(self.run_cli("reports", "140403", out_dir, "--workers", "0")[0], 0)
+        self.assertEqual(month_rows("140402"), before[0])  # no Leave rows added to the other month
+        self.assertGreater(month_rows("140403"), before[1])
+        with open(os.path.join(out_dir, "late_early_all.csv"), encoding="utf-8") as f:
+            dates = {line.split(",")[1] for line in f.read().splitlines()[1:]}
+        self.assertTrue(dates)
+        self.assertEqual({date[:6] for date in dates}, {"140403"})
+
+    def test_ingest_several_files(self):
+        with open(SAMPLE, encoding="utf-8") as f:
+            lines = f.readlines()
+        gates = []
+        for n, part in enumerate((lines[0::2], lines[1::2] + lines[0:10:2])):
+            gates.append(os.path.join(self.tmp, f"gate{n}.txt"))
+            with open(gates[-1], "w", encoding="utf-8") as f:
+                f.writelines(part)
+        code, out, _ = self.run_cli("ingest", *gates, "--workers", "0")
+        self.assertEqual(code, 0)
+        self.assertIn("from 2 files (5 duplicate punches dropped)", out)
+
+    def test_archive(self):
+        code, out, _ = self.run_cli("archive", SAMPLE, "--memory-mb", "0.001", "--tmp-dir", self.tmp)
+        self.assertEqual(code, 0)
+        self.assertIn("month 140402 has", out)
+
+    def test_ingest_quarantines_bad_lines(self):
+        with open(SAMPLE, encoding="utf-8") as f:
+            lines = f.readlines()
+        export = os.path.join(self.tmp, "export.txt")
+        with open(export, "w", encoding="utf-8") as f:
+            f.writelines(lines[:300] + ["00000022 14040202 6h40 04\n"] + lines[300:])
+        code, out, err = self.run_cli("ingest", export)
+        self.assertEqual(code, 0)
+        self.assertIn("1 malformed lines set aside in", err)
+        self.assertEqual(self.run_cli("ingest", export, "--strict")[0], 2)
+
+    def test_bad_file_reports_error(self):
+        bad = os.path.join(self.tmp, "bad.txt")
+        with open(bad, "w", encoding="utf-8") as f:
+            f.write("00000022 14040202 6h40 04\n")
+        code, _, err = self.run_cli("ingest", bad)
+        self.assertEqual(code, 2)
+        self.assertIn("invalid time format", err)
+
+    def test_month_without_data(self):
+        code, _, err = self.run_cli("late-early", "140402")
+        self.assertEqual(code, 2)
+        self.assertIn("run 'ingest' first", err)
+
+    def test_core_does_not_import_tkinter(self):
+        code = "import sys, core.cli; sys.exit('tkinter' in sys.modules)"
+        root = os.path.join(os.path.dirname(__file__), "..")
+        self.assertEqual(subprocess.run([sys.executable, "-c", code], cwd=root).returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
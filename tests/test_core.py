@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 from datetime import datetime
 from core.processor import LogProcessor
@@ -7,7 +10,11 @@ from resources.config import DEFAULT_ENTRY, DEFAULT_EXIT, DEFAULT_FLOATING, DEFA
 
 class TestLogProcessor(unittest.TestCase):
     def setUp(self):
-        self.processor = LogProcessor()
+        # A temp DB, so test runs leave the app's sessions.db alone
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        self.addCleanup(self.processor.close)
         # Sample sessions: [ID, Date, Entry, Exit, Mode]
         self.processor.sessions = [
             ["1", "2025-08-27", "08:00", "17:00", "paired"],
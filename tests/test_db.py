@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from core.db import ConnectionManager, write_transaction
+from core import exception_rules, processor, reports
+from core.processor import LogProcessor
+from core.reports import ReportGenerator
+from core.scheduler import ScheduleManager
+from resources.config import EXCEPTIONS
+
+
+class TestBulkWrites(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(self._remove_db)
+        self.processor = LogProcessor(db_path=self.db_path)
+        self.addCleanup(self.processor.close)
+
+    def _remove_db(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def _count(self, table):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with write_transaction(self.db_path) as cursor:
+                cursor.execute("INSERT INTO sessions (id, date) VALUES ('00000001', '14040201')")
+                raise RuntimeError("boom")
+        self.assertEqual(self._count("sessions"), 0)
+
+    def test_pragmas_are_applied(self):
+        with write_transaction(self.db_path) as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+
+    def test_save_sessions_in_one_batch(self):
+        self.processor.sessions = [
+            ["00000001", "14040201", "07:30", "16:30", "Paired"],
+            ["00000001", "14040201", "10:00", "10:30", "Paired", 30, "Leave", None],
+            ["00000002", "14040201", "07:40", "07:40", "fallback"],
+        ]
+        self.processor._save_sessions_to_db()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT id, duration, mode FROM sessions ORDER BY session_id").fetchall()
+        self.assertEqual(rows, [("00000001", 0, None), ("00000001", 30, "Leave"), ("00000002", 0, None)])
+
+    def test_schedules_and_exceptions_for_month(self):
+        self.processor._build_and_save_schedules_to_db("140407")
+        self.processor.load_exceptions_from_config("140407")
+        self.assertEqual(self._count("work_schedules"), 30)
+        # One rule per config entry, expanded per day only when read
+        self.assertEqual(self._count("exception_rules"), len(EXCEPTIONS))
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM exceptions WHERE date BETWEEN '14040700' AND '14040799'")
+            self.assertEqual(rows.fetchone(), (30 * len(EXCEPTIONS),))
+
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, self.db_path)
+        self.manager = ConnectionManager(self.db_path)
+        self.addCleanup(self.manager.close)
+        with self.manager.transaction() as cursor:
+            cursor.execute("CREATE TABLE t (x INTEGER)")
+
+    def test_one_connection_per_thread(self):
+        for _ in range(3):
+            with self.manager.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM t")
+        self.assertEqual(self.manager.stats()["opened"], 1)
+
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(self.manager.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], self.manager.connection())
+        self.assertEqual(self.manager.stats()["opened"], 2)
+
+    def test_nested_transaction_joins_and_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.manager.transaction() as cursor:
+                cursor.execute("INSERT INTO t VALUES (1)")
+                with self.manager.transaction() as inner:
+                    inner.execute("INSERT INTO t VALUES (2)")
+                raise RuntimeError("boom")
+        with self.manager.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM t")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_close_reopens_lazily(self):
+        self.manager.connection()
+        self.manager.close()
+        self.assertEqual(self.manager.stats()["open"], 0)
+        self.manager.connection()
+        self.assertEqual(self.manager.stats(), {"opened": 2, "open": 1, "checkouts": 3})
+
+    def test_core_modules_share_the_processor_connection(self):
+        processor = LogProcessor(db_path=self.db_path)
+        self.addCleanup(processor.close)
+        processor._build_and_save_schedules_to_db("140407")
+        processor.load_month("140407")
+        manager = ScheduleManager(processor)
+        manager.current_month()
+        manager.schedules_for("00000001")
+        reporter = ReportGenerator(processor)
+        reporter.fill_missing_days("00000001")
+        processor.find_late_early("00000001")
+        self.assertEqual(processor.connections.stats()["opened"], 1)
+
+
+class TestQueryPlans(unittest.TestCase):
+    """The per-ID and per-month paths must be served by indexes, never full scans."""
+
+    HOT_QUERIES = [
+        (processor.SQL_MONTH_EXISTS, ("140402",)),
+        (processor.SQL_SESSIONS_FOR_ID, ("00000001",)),
+        (processor.SQL_SESSIONS_FOR_ID_MONTH, ("140402", "00000001")),
+        (exception_rules.SQL_RULES_FOR_ID, ("00000001",)),
+        ("SELECT * FROM exceptions WHERE id = ? AND date BETWEEN ? AND ?", ("00000001", "14040700", "14040799")),
+        (processor.SQL_MONTH_HAS_PUNCHES, ("14040200", "14040299")),
+        (reports.SQL_DELETE_HOLIDAY_LEAVE.replace("{person}", "id = :pid"), {"pid": "00000001"}),
+        (reports.SQL_DELETE_SESSIONS_FOR_KEYS.replace("{values}", "(?, ?, ?)"),
+         ("00000001", "14040201", "07:30", "16:30")),
+        (reports.SQL_FILL_MISSING_DAYS.replace("{person}", "id = :pid"),
+         {"pid": "00000001", "entry": "07:30", "exit": "16:30"}),
+        (reports.SQL_FILL_MISSING_DAYS.replace("{person}", "1 AND year_month = :year_month"),
+         {"year_month": "140402", "entry": "07:30", "exit": "16:30"}),
+    ]
+
+    # Scans bounded by the calendar, not the table sizes: the fill's months of the ID (m)
+    # and the schedules it was given (fill_schedules)
+    BOUNDED_SCANS = {"SCAN CONSTANT ROW", "SCAN m", "SCAN fill_schedules"}
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, self.db_path)
+        LogProcessor(db_path=self.db_path)
+
+    def test_no_full_scans(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(reports.SQL_CREATE_FILL_SCHEDULES)
+            for sql, params in self.HOT_QUERIES:
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                self.assertTrue(plan, sql)
+                for detail in plan:
+                    full_scan = detail.startswith("SCAN") and detail not in self.BOUNDED_SCANS
+                    self.assertFalse(full_scan, f"{detail!r} in plan of {sql.strip()}")
+
+    def test_upgrade_adds_month_column_to_old_database(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DROP TABLE sessions")
+            conn.execute("""
+                CREATE TABLE sessions (session_id INTEGER PRIMARY KEY, id TEXT, date TEXT, entry TEXT, exit TEXT,
+                                       mode TEXT)
+            """)
+            conn.execute("INSERT INTO sessions (id, date) VALUES ('00000001', '14040215')")
+            conn.execute("PRAGMA user_version = 0")
+        LogProcessor(db_path=self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT year_month FROM sessions").fetchone(), ("140402",))
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list(sessions)")}
+        self.assertTrue({"idx_sessions_id_date", "idx_sessions_month_id", "idx_sessions_id_mode"} <= indexes)
+
+    def test_upgrade_drops_duplicate_sessions(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DROP INDEX idx_sessions_key")
+            conn.executemany("INSERT INTO sessions (id, date, entry, exit, status, mode) VALUES (?, ?, ?, ?, ?, ?)", [
+                ("00000001", "14040201", "07:30", "16:30", "Paired", None),
+                ("00000001", "14040201", "07:30", "16:30", "Paired", None),
+                ("00000001", "14040201", "07:30", "16:30", "Paired", "Late Entry"),
+                ("00000001", "14040201", "07:30", "16:30", "Paired", "Late Entry"),
+            ])
+            conn.execute("PRAGMA user_version = 2")
+        LogProcessor(db_path=self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT session_id, mode FROM sessions").fetchall(),
+                             [(1, None), (3, "Late Entry")])
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone(), (processor.SCHEMA_VERSION,))
+            indexes = {row[1]: row[2] for row in conn.execute("PRAGMA index_list(sessions)")}
+            # Step 4 adds the Jalali calendar table
+            self.assertEqual(conn.execute("SELECT gregorian, weekday FROM calendar WHERE date = '14040101'").fetchone(),
+                             ("2025-03-21", 6))
+        self.assertEqual(indexes["idx_sessions_key"], 1)  # unique
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from core.exception_rules import ALL_WEEKDAYS, ExceptionRules, config_rules, weekday_mask
+from core.jalali import month_dates
+from core.processor import LogProcessor, exceptions_for
+from core.reports import ReportGenerator
+from tests.query_budget import QueryBudgetMixin
+
+
+class TestExceptionRules(unittest.TestCase):
+    def test_ranges_weekdays_and_newest_rule(self):
+        rules = ExceptionRules([
+            (1, "14040101", "14041229", "07:30", "14:30", ALL_WEEKDAYS),
+            (3, "14040701", "14040715", "08:00", "12:00", weekday_mask([0, 1])),  # Saturdays and Sundays
+            (2, "14040710", "14040720", "09:00", "15:00", ALL_WEEKDAYS),
+        ])
+        self.assertIsNone(rules.get("14031230"))
+        self.assertEqual(rules.get("14040101"), ("07:30", "14:30"))
+        self.assertEqual(rules.get("14040705"), ("08:00", "12:00"))   # a Saturday
+        self.assertEqual(rules.get("14040706"), ("08:00", "12:00"))   # a Sunday
+        self.assertEqual(rules.get("14040707"), ("07:30", "14:30"))   # Monday: only rule 1
+        self.assertEqual(rules.get("14040712"), ("08:00", "12:00"))   # rule 3 is newer than 2
+        self.assertEqual(rules.get("14040716"), ("09:00", "15:00"))
+        self.assertEqual(rules.get("14050101", "none"), "none")
+        with self.assertRaises(ValueError):
+            weekday_mask([7])
+
+    def test_config_entries(self):
+        self.assertEqual(config_rules([
+            {"id": 6, "entry": "07:30", "exit": "13:30"},
+            {"id": 15, "entry": "08:00", "exit": "12:00", "valid_from": "14040701", "weekdays": (6,)},
+        ]), [
+            ("00000006", "00000000", "99999999", "07:30", "13:30", ALL_WEEKDAYS),
+            ("00000015", "14040701", "99999999", "08:00", "12:00", 1 << 6),
+        ])
+
+
+class TestRuleStorage(QueryBudgetMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db_path = os.path.join(self.tmp, "sessions.db")
+
+    def _processor(self):
+        processor = LogProcessor(db_path=self.db_path)
+        self.addCleanup(processor.close)
+        return processor
+
+    def test_migration_from_per_day_rows(self):
+        self._processor().close()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DROP VIEW exceptions")
+            conn.execute("DELETE FROM exception_rules")
+            conn.execute("CREATE TABLE exceptions (id TEXT, date TEXT, entry TEXT, exit TEXT, PRIMARY KEY (id, date))")
+            rows = [("00000022", d, "07:30", "14:30") for d in month_dates("140406") + month_dates("140407")]
+            rows[40] = ("00000022", rows[40][1], "08:00", "12:00")  # one different day splits the run
+            rows += [("00000006", d, "07:30", "13:30") for d in month_dates("140407")[:10]]
+            conn.executemany("INSERT INTO exceptions VALUES (?, ?, ?, ?)", rows)
+            conn.execute("PRAGMA user_version = 4")
+
+        processor = self._processor()
+        with processor.connections.cursor() as cursor:
+            cursor.execute("SELECT id, valid_from, valid_to, entry, exit, source FROM exception_rules ORDER BY rule_id")
+            self.assertEqual(cursor.fetchall(), [
+                ("00000006", "14040701", "14040710", "07:30", "13:30", "migrated"),
+                ("00000022", "14040601", "14040709", "07:30", "14:30", "migrated"),
+                ("00000022", "14040711", "14040730", "07:30", "14:30", "migrated"),
+                ("00000022", "14040710", "14040710", "08:00", "12:00", "migrated"),
+            ])
+            cursor.execute("SELECT id, date, entry, exit FROM exceptions ORDER BY id DESC, date")
+            self.assertEqual(cursor.fetchall(), sorted(rows, key=lambda r: (r[0] != "00000022", r[0], r[1])))
+            self.assertEqual(exceptions_for(cursor, "00000022").get("14040710"), ("08:00", "12:00"))
+
+    def test_config_rules_are_written_once(self):
+        processor = self._processor()
+        processor.load_exceptions_from_config("140407")
+        version = processor.resolver.version
+        with self.assertQueryBudget(processor.connections, 3):  # unchanged config: read only
+            processor.load_exceptions_from_config("140408")
+        self.assertEqual(processor.resolver.version, version)
+        with processor.connections.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM exception_rules")
+            self.assertEqual(cursor.fetchone(), (len(processor.exceptions),))
+
+    def test_fill_uses_newest_rule(self):
+        processor = self._processor()
+        processor.sessions = [["00000022", "14040703", "07:30", "16:30", "Paired"]]
+        processor._save_sessions_to_db()
+        processor.load_exceptions_from_config()
+        with processor.connections.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO exception_rules (id, valid_from, valid_to, entry, exit, weekdays, source)
+                VALUES ('00000022', '14040710', '14040712', '08:00', '12:00', 127, 'config')
+            """)
+        processor.resolver.bump()
+        self.assertEqual(ReportGenerator(processor).fill_missing_days("00000022"), 29)
+        with processor.connections.cursor() as cursor:
+            cursor.execute("SELECT date, entry, exit FROM sessions WHERE mode = 'Leave' ORDER BY date")
+            rows = cursor.fetchall()
+        self.assertEqual([r for r in rows if r[1] != "07:30" or r[2] != "14:30"],
+                         [(f"140407{d}", "08:00", "12:00") for d in ("10", "11", "12")])
+        for date, entry, exit_ in rows:
+            self.assertEqual(processor.resolver.resolve("00000022", date).source, "exception")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.synthetic import generate_lines
+from core import external
+from core.errors import EmptyLogError, LogFormatError
+from core.external import ExternalSort, iter_day_batches
+from core.ingest import read_punches
+from core.processor import LogProcessor
+
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        # Two months of 60 employees: ~7000 punches with repeats, i.e. several 1000-punch runs
+        self.archive = os.path.join(self.tmp, "archive.txt")
+        with open(self.archive, "w", encoding="utf-8") as f:
+            for month in ("140401", "140402"):
+                f.writelines(generate_lines(employees=60, days=29, odd_rate=0.1,
+                                            duplicate_rate=0.05, year_month=month, seed=17))
+
+    def _sessions(self, db_path):
+        with sqlite3.connect(db_path) as conn:
+            return conn.execute("""
+                SELECT id, date, entry, exit, status, duration, mode FROM sessions ORDER BY id, date, entry, exit
+            """).fetchall()
+
+    def test_runs_merge_to_the_sorted_distinct_punches(self):
+        _, expected = read_punches(self.archive)
+        with mock.patch.object(external, "MERGE_FAN_IN", 2):
+            with ExternalSort([self.archive], memory_limit_mb=0.001, tmp_dir=self.tmp) as archive:
+                self.assertEqual(archive.max_punches, 1000)
+                self.assertLessEqual(len(archive.runs), 2)  # merged in passes
+                self.assertEqual(archive.months, {"140401", "140402"})
+                punches = list(archive.punches())
+                batches = list(iter_day_batches(punches, 1000))
+        self.assertEqual(punches, sorted(expected))
+        self.assertEqual(os.listdir(self.tmp), ["archive.txt"])  # run files removed
+        # Batches hold whole days: no (id, date) is split across two of them
+        edges = [(a[-1][:2], b[0][:2]) for a, b in zip(batches, batches[1:])]
+        self.assertTrue(all(last != first for last, first in edges))
+        self.assertEqual(sum(map(len, batches)), len(punches))
+
+    def test_load_archive_matches_load_file(self):
+        in_memory = LogProcessor(db_path=os.path.join(self.tmp, "memory.db"))
+        in_memory.load_file(self.archive)
+        in_memory.close()
+        out_of_core = LogProcessor(db_path=os.path.join(self.tmp, "archive.db"))
+        try:
+            result = out_of_core.load_archive([self.archive], memory_limit_mb=0.001, tmp_dir=self.tmp)
+            self.assertEqual((result.month, result.loaded_from_db), ("140402", False))
+            self.assertEqual({s.date[:6] for s in out_of_core.sessions}, {"140402"})
+            # Repeating the run (e.g. after an interruption) changes nothing
+            self.assertEqual(out_of_core.load_archive([self.archive]).new_punches, 0)
+        finally:
+            out_of_core.close()
+        self.assertEqual(self._sessions(os.path.join(self.tmp, "archive.db")),
+                         self._sessions(os.path.join(self.tmp, "memory.db")))
+
+    def test_errors(self):
+        processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        empty = os.path.join(self.tmp, "empty.txt")
+        bad = os.path.join(self.tmp, "bad.txt")
+        open(empty, "w").close()
+        with open(bad, "w", encoding="utf-8") as f:
+            f.write("00000022 14040202 6h40 04\n")
+        try:
+            with self.assertRaises(EmptyLogError):
+                processor.load_archive([empty], tmp_dir=self.tmp)
+            with self.assertRaises(LogFormatError) as caught:
+                processor.load_archive([self.archive, bad], tmp_dir=self.tmp)
+            self.assertIn("bad.txt", str(caught.exception))
+        finally:
+            processor.close()
+        self.assertFalse([name for name in os.listdir(self.tmp) if name.startswith("punch-runs-")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from core.processor import LogProcessor
+
+
+class TestIncrementalIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "sessions.db")
+        self.processor = LogProcessor(db_path=self.db_path)
+
+    def _write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _sessions(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("""
+                SELECT session_id, id, date, entry, exit, status, mode, reason
+                FROM sessions ORDER BY id, date, entry
+            """).fetchall()
+
+    def test_delta_rebuilds_only_touched_days(self):
+        self.processor.load_file(self._write("day1.txt",
+            "00000001 14040201 07:30 04\n"
+            "00000001 14040201 16:30 05\n"
+            "00000002 14040201 08:00 04\n"
+        ))
+        before = {row[1:3]: row for row in self._sessions()}
+        # A reason given to the first day must survive the delta
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE sessions SET reason = 'Announced' WHERE id = '00000001'")
+
+        # Late batch: the missing exit of ID 2 and a new day for ID 1
+        result = self.processor.load_file(self._write("delta.txt",
+            "00000002 14040201 16:00 05\n"
+            "00000001 14040202 07:35 04\n"
+            "00000001 14040202 16:40 05\n"
+        ))
+        self.assertTrue(result.loaded_from_db)
+        self.assertEqual((result.new_punches, result.affected_days), (3, 2))
+
+        rows = self._sessions()
+        by_day = {row[1:3]: row for row in rows}
+        self.assertEqual(by_day[("00000001", "14040201")][0], before[("00000001", "14040201")][0])
+        self.assertEqual(by_day[("00000001", "14040201")][7], "Announced")
+        self.assertEqual(by_day[("00000002", "14040201")][3:6], ("08:00", "16:00", "Paired"))
+        self.assertEqual(by_day[("00000001", "14040202")][3:6], ("07:35", "16:40", "Paired"))
+        self.assertEqual(len(rows), 3)
+
+    def test_reloading_the_same_file_changes_nothing(self):
+        path = self._write("day1.txt",
+            "00000001 14040201 07:30 04\n"
+            "00000001 14040201 10:00 05\n"
+            "00000001 14040201 10:30 04\n"
+            "00000001 14040201 16:30 05\n"
+        )
+        self.processor.load_file(path)
+        before = self._sessions()
+        result = self.processor.load_file(path)
+        self.assertEqual((result.new_punches, result.affected_days), (0, 0))
+        self.assertEqual(self._sessions(), before)
+        self.assertEqual(result.sessions, 2)
+
+    def test_repeat_reads_are_debounced(self):
+        result = self.processor.load_file(self._write("day1.txt",
+            "00000001 14040201 07:30 04\n"
+            "00000001 14040201 07:31 04\n"   # the reader saw the badge twice
+            "00000001 14040201 16:30 05\n"
+        ))
+        self.assertEqual((result.new_punches, result.debounced_punches), (3, 1))
+        before = self._sessions()
+        self.assertEqual([row[3:6] for row in before], [("07:30", "16:30", "Paired")])
+
+        # A repeat read arriving later rebuilds the day into the same session row
+        result = self.processor.load_file(self._write("delta.txt", "00000001 14040201 16:30 04\n"))
+        self.assertEqual((result.new_punches, result.affected_days, result.debounced_punches), (1, 1, 2))
+        self.assertEqual(self._sessions(), before)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM punches").fetchone(), (4,))
+            # The natural session key keeps a second copy out
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("""
+                    INSERT INTO sessions (id, date, entry, exit, status)
+                    VALUES ('00000001', '14040201', '07:30', '16:30', 'Paired')
+                """)
+
+    def test_new_month_keeps_history(self):
+        self.processor.load_file(self._write("m1.txt", "00000001 14040201 07:30 04\n00000001 14040201 16:30 05\n"))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE work_schedules SET is_holiday = 1 WHERE date = '14040205'")
+
+        self.processor.load_file(self._write("m2.txt", "00000001 14040301 07:30 04\n00000001 14040301 16:30 05\n"))
+        self.assertEqual([row[2] for row in self._sessions()], ["14040201", "14040301"])
+        self.assertEqual([s[1] for s in self.processor.sessions], ["14040301"])
+        self.assertTrue(self.processor.work_schedules["14040205"]["is_holiday"])
+        self.assertIn("14040331", self.processor.work_schedules)
+
+    def test_month_imported_before_punch_history_is_left_alone(self):
+        # A fallback session edited by hand, as an older database would hold it
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT INTO sessions (id, date, entry, exit, status, duration)
+                VALUES ('00000001', '14040201', '07:30', '16:30', 'fallback', 0)
+            """)
+        path = self._write("m1.txt", "00000001 14040201 07:30 04\n")
+        result = self.processor.load_file(path)
+        self.assertEqual(result.new_punches, 0)
+        self.assertEqual([row[3:5] for row in self._sessions()], [("07:30", "16:30")])
+
+        # Later deltas are merged against the recorded baseline
+        result = self.processor.load_file(self._write("delta.txt", "00000001 14040201 16:45 05\n"))
+        self.assertEqual(result.new_punches, 1)
+        self.assertEqual([row[3:6] for row in self._sessions()], [("07:30", "16:45", "Paired")])
+
+
+if __name__ == "__main__":
+    unittest.main()
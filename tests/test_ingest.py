@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from core.ingest import LogFormatError, iter_array_punches, read_fixed_width, read_log, read_punches
+
+
+class TestReadLog(unittest.TestCase):
+    def _write(self, text):
+        fd, path = tempfile.mkstemp(suffix=".TXT")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_groups_punches_and_finds_month(self):
+        path = self._write(
+            "00000022 14040202 06:40 04\n"
+            "00000022 14040202 16:10 05\n"
+            "00000003 14040203 7:05 04\n"
+        )
+        month, records = read_log(path)
+        self.assertEqual(month, "140402")
+        self.assertEqual(records["00000022"]["14040202"], [400, 970])
+        self.assertEqual(records["00000003"]["14040203"], [425])
+
+    def test_empty_file_has_no_month(self):
+        month, records = read_log(self._write(""))
+        self.assertIsNone(month)
+        self.assertEqual(len(records), 0)
+
+    def test_read_punches_keeps_codes_and_drops_repeated_lines(self):
+        month, punches = read_punches(self._write(
+            "00000022 14040202 06:40 04\n"
+            "00000022 14040202 06:40 04\n"
+            "00000022 14040202 06:40 05\n"
+        ))
+        self.assertEqual(month, "140402")
+        self.assertEqual(punches, {("00000022", "14040202", 400, "04"), ("00000022", "14040202", 400, "05")})
+
+    def test_first_bad_line_is_reported(self):
+        cases = [
+            ("00000022 14040202 06:40\n", "does not have exactly 4 columns"),
+            ("00000022 1404020 06:40 04\n", "invalid date"),
+            ("0000022 14040202 06:40 04\n", "invalid ID"),
+            ("00000022 14040202 24:00 04\n", "invalid time format"),
+        ]
+        for line, message in cases:
+            path = self._write("00000022 14040202 06:40 04\n" + line)
+            with self.assertRaises(LogFormatError) as ctx:
+                read_log(path)
+            self.assertEqual(ctx.exception.line_no, 2)
+            self.assertIn(message, str(ctx.exception))
+
+
+class TestFixedWidth(unittest.TestCase):
+    SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "ordibehesht.TXT")
+
+    def _write(self, data: bytes):
+        fd, path = tempfile.mkstemp(suffix=".TXT")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_matches_general_parser(self):
+        punches = read_fixed_width(self.SAMPLE)
+        self.assertEqual(len(punches), 1110)
+        with open(self.SAMPLE, encoding="utf-8") as f:
+            expected = [tuple(line.split()) for line in f]
+        decoded = [(pid, date, minute, code) for pid, date, minute, code in iter_array_punches(punches)]
+        self.assertEqual([(p, d, c) for p, d, _, c in decoded], [(p, d, c) for p, d, _, c in expected])
+        self.assertEqual(decoded[3][2], 6 * 60 + 40)  # 00000022 14040202 06:40 04
+
+    def test_crlf_and_missing_final_newline(self):
+        path = self._write(b"00000022 14040202 06:40 04\r\n00000022 14040202 16:10 05")
+        punches = read_fixed_width(path)
+        self.assertEqual(punches["minute"].tolist(), [400, 970])
+        self.assertEqual(punches["code"].tolist(), [4, 5])
+
+    def test_other_layouts_fall_back(self):
+        for data in (
+            b"00000003 14040203 7:05 04\n",     # H:MM time
+            b"00000003  14040203 07:05 04\n"[:27],
+            b"00000003 14040203 24:05 04\n",    # out-of-range hour
+            b"0000000a 14040203 07:05 04\n",
+            b"",
+        ):
+            self.assertIsNone(read_fixed_width(self._write(data)), data)
+
+        # The general parser still pinpoints the bad line
+        path = self._write(b"00000022 14040202 06:40 04\n00000022 14040202 24:00 04\n")
+        with self.assertRaises(LogFormatError) as ctx:
+            read_punches(path)
+        self.assertEqual(ctx.exception.line_no, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
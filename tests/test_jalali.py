@@ -0,0 +1,83 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, timedelta
+from core.jalali import (
+    Calendar, WEEKDAY_NAMES, days_in_month, from_gregorian, is_leap, month_dates, to_gregorian, weekday,
+)
+from core.processor import LogProcessor
+from core.reports import ReportGenerator
+from core.scheduler import ScheduleManager
+
+
+class TestJalali(unittest.TestCase):
+    def test_month_lengths_and_leap_years(self):
+        self.assertEqual([days_in_month(1404, m) for m in range(1, 13)], [31] * 6 + [30] * 5 + [29])
+        self.assertEqual(days_in_month(1403, 12), 30)
+        self.assertEqual([y for y in range(1395, 1412) if is_leap(y)], [1395, 1399, 1403, 1408])
+        self.assertEqual(month_dates("140412")[-1], "14041229")
+        with self.assertRaises(ValueError):
+            days_in_month(1404, 13)
+
+    def test_gregorian_round_trip(self):
+        self.assertEqual(to_gregorian(1404, 1, 1), date(2025, 3, 21))
+        self.assertEqual(to_gregorian(1403, 12, 30), date(2025, 3, 20))
+        self.assertEqual(from_gregorian(date(2021, 3, 20)), (1399, 12, 30))
+        self.assertEqual(WEEKDAY_NAMES[weekday(1404, 7, 26)], "Saturday")  # 2025-10-18
+        start = date(2000, 1, 1)
+        for offset in range(0, 20000, 7):
+            day = start + timedelta(days=offset)
+            self.assertEqual(to_gregorian(*from_gregorian(day)), day)
+
+    def test_holiday_bitmaps(self):
+        calendar = Calendar()
+        calendar.load({"14040701": {"is_holiday": True}, "14040702": {"is_holiday": False},
+                       "14040731": {"is_holiday": True}, "14040615": {"is_holiday": True}})
+        self.assertTrue(calendar.is_holiday("14040701"))
+        self.assertFalse(calendar.is_holiday("14040702"))
+        self.assertFalse(calendar.is_holiday("14050701"))
+        self.assertEqual(calendar.holiday_bitmap("140407"), 1 << 1 | 1 << 31)
+        calendar.set_holiday("14040701", False)
+        self.assertEqual(calendar.holidays("140407"), [31])
+        self.assertEqual(calendar.holiday_dates(), ["14040615", "14040731"])
+
+
+class TestCalendarInUse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db_path = os.path.join(self.tmp, "sessions.db")
+        self.processor = LogProcessor(db_path=self.db_path)
+        self.addCleanup(self.processor.close)
+
+    def test_esfand_of_a_common_year(self):
+        self.processor.sessions = [["00000001", "14041203", "07:30", "16:30", "Paired"]]
+        self.processor._save_sessions_to_db()
+        self.processor._build_and_save_schedules_to_db("140412")
+        self.processor.load_month("140412")
+        self.assertEqual(len(self.processor.work_schedules), 29)
+        self.assertEqual(ScheduleManager(self.processor).current_month(), (1404, 12, 29))
+        self.assertEqual(ReportGenerator(self.processor).fill_missing_days("00000001"), 28)
+
+    def test_holidays_follow_schedule_edits(self):
+        self.processor._build_and_save_schedules_to_db("140407")
+        self.processor.load_month("140407")
+        _, holidays = ScheduleManager(self.processor).save_schedules(
+            "00000001", {"14040705": ("07:30", "16:30", 1.0, False, True)})
+        self.assertEqual(holidays, [5])
+        self.assertTrue(self.processor.calendar.is_holiday("14040705"))
+        self.processor._load_schedules_from_db("140407")
+        self.assertEqual(self.processor.calendar.holiday_dates(), ["14040705"])
+
+    def test_calendar_table(self):
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT date, gregorian, weekday, is_working FROM calendar WHERE year_month = '140312'")
+            rows = rows.fetchall()
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[-1], ("14031230", "2025-03-20", 5, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from core.cli import main
+from core.metrics import Metrics
+from core.processor import LogProcessor
+from core.reports import ReportGenerator
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "ordibehesht.TXT")
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        self.addCleanup(self.processor.close)
+
+    def test_stages_of_user_actions(self):
+        metrics_path = os.path.join(self.tmp, "metrics.jsonl")
+        self.processor.metrics = Metrics(metrics_path, trace_memory=True)
+        result = self.processor.load_file(SAMPLE)
+
+        action = self.processor.metrics.last
+        self.assertEqual([s.name for s in action.stages],
+                         ["parse", "store", "merge", "schedules", "load_sessions", "load_schedules", "exceptions"])
+        self.assertEqual(action.stage("merge").rows, result.new_punches)
+        self.assertEqual(action.stage("load_sessions").rows, result.sessions)
+        self.assertGreater(action.stage("parse").peak_bytes, 0)
+        self.assertGreaterEqual(action.total.seconds, sum(s.seconds for s in action.stages))
+
+        reporter = ReportGenerator(self.processor)
+        reporter.fill_missing_days("00000022")
+        self.processor.find_late_early("00000022")
+        reporter.export_csv(os.path.join(self.tmp, "all.csv"))
+
+        with open(metrics_path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([(line["action"], line["stage"]) for line in lines if line["stage"] == "total"], [
+            ("load_file", "total"), ("fill_missing_days", "total"),
+            ("find_late_early", "total"), ("export_csv", "total"),
+        ])
+        rows = {(line["action"], line["stage"]): line["rows"] for line in lines}
+        self.assertEqual(rows[("export_csv", "read")], rows[("load_file", "load_sessions")]
+                         + rows[("fill_missing_days", "fill")])
+
+    def test_prometheus_file_and_profile(self):
+        prom_path = os.path.join(self.tmp, "metrics.prom")
+        profile_dir = os.path.join(self.tmp, "profiles")
+        self.processor.metrics = Metrics(prom_path, profile_dir)
+        self.processor.load_file(SAMPLE)
+        self.processor.find_late_early("00000022")
+
+        with open(prom_path, encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn("# TYPE punctuality_stage_seconds gauge", text)
+        self.assertIn('punctuality_stage_rows{action="load_file",stage="parse"} ', text)
+        self.assertIn('punctuality_stage_seconds{action="find_late_early",stage="total"} ', text)
+        self.assertNotIn("peak_bytes{", text)  # memory tracing is off
+
+        profiles = sorted(os.listdir(profile_dir))
+        self.assertEqual([name.split("-")[0] for name in profiles], ["find_late_early", "load_file"])
+        stats = pstats.Stats(os.path.join(profile_dir, profiles[1]))
+        self.assertTrue(any(func[2] == "read_punches" for func in stats.stats))
+
+    def test_nesting_and_failures(self):
+        metrics = Metrics()
+        with metrics.stage("alone") as stage:  # outside an action: timed, not recorded
+            stage.rows = 1
+        with metrics.action("outer"):
+            with metrics.action("inner"):
+                with metrics.stage("step"):
+                    pass
+        self.assertEqual([s.name for s in metrics.last.stages], ["step", "inner"])
+
+        with self.assertRaises(ValueError):
+            with metrics.action("broken"):
+                raise ValueError
+        self.assertEqual(metrics.last.name, "outer")  # failed actions are not exported
+        with metrics.action("next"):
+            pass
+        self.assertEqual(metrics.last.stages, [])
+
+    def test_cli_command_is_one_action(self):
+        metrics_path = os.path.join(self.tmp, "cli.jsonl")
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = main(["--db", os.path.join(self.tmp, "cli.db"), "--metrics", metrics_path, "ingest", SAMPLE])
+        self.assertEqual(code, 0)
+        with open(metrics_path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual({line["action"] for line in lines}, {"ingest"})
+        self.assertEqual([line["stage"] for line in lines][-2:], ["load_file", "total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from core.errors import EmptyLogError, LogFormatError
+from core.ingest import log_paths, merge_punches, read_punch_files
+from core.processor import LogProcessor
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "ordibehesht.TXT")
+
+
+class TestMultiFileIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        with open(SAMPLE, encoding="utf-8") as f:
+            self.lines = f.readlines()
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        return path
+
+    def _sessions(self, db_path):
+        with sqlite3.connect(db_path) as conn:
+            return conn.execute("""
+                SELECT id, date, entry, exit, status, duration, mode FROM sessions ORDER BY id, date, entry, exit
+            """).fetchall()
+
+    def test_gates_match_a_single_file(self):
+        # Two gates, each with every other line, plus a stretch both recorded
+        gate1 = self._write("gate1.txt", self.lines[0::2] + self.lines[1:40:2])
+        gate2 = self._write("gate2.txt", self.lines[1::2])
+
+        single = LogProcessor(db_path=os.path.join(self.tmp, "single.db"))
+        single.load_file(SAMPLE)
+        single.close()
+        merged = LogProcessor(db_path=os.path.join(self.tmp, "merged.db"))
+        result = merged.load_files([gate1, gate2], workers=2)
+        merged.close()
+
+        self.assertEqual((result.month, result.files, result.duplicate_punches), ("140402", 2, 20))
+        self.assertEqual(self._sessions(os.path.join(self.tmp, "merged.db")),
+                         self._sessions(os.path.join(self.tmp, "single.db")))
+
+    def test_merge_is_sorted_and_distinct(self):
+        # One fixed-width file and one the general parser reads (H:MM times)
+        fixed = self._write("a.txt", ["00000002 14040201 07:30 04\n", "00000001 14040201 16:30 05\n"])
+        loose = self._write("b.TXT", ["00000001 14040201 7:30 04\n", "00000001 14040201 16:30 05\n"])
+        self._write("notes.md", ["not a log\n"])
+        self.assertEqual(log_paths([self.tmp]), [fixed, loose])
+
+        files, merged = read_punch_files([fixed, loose], workers=0)
+        self.assertEqual([count for _, _, count, _ in files], [2, 2])
+        self.assertEqual(list(merged), [
+            ("00000001", "14040201", 450, "04"),
+            ("00000001", "14040201", 990, "05"),
+            ("00000002", "14040201", 450, "04"),
+        ])
+        self.assertEqual(list(merge_punches([[(1,), (2,)], [(1,), (3,)]])), [(1,), (2,), (3,)])
+
+    def test_errors(self):
+        empty = self._write("empty.txt", [])
+        bad = self._write("bad.txt", ["00000022 14040202 6h40 04\n"])
+        processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        try:
+            with self.assertRaises(EmptyLogError):
+                processor.load_files([empty])
+            with self.assertRaises(LogFormatError) as caught:
+                processor.load_files([SAMPLE, bad], workers=2)
+            self.assertEqual(caught.exception.line_no, 1)
+            self.assertIn("bad.txt", str(caught.exception))
+        finally:
+            processor.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
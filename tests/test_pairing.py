@@ -0,0 +1,152 @@
+import os
+import random
+import tempfile
+import unittest
+from core.pairing import pair_rows, pair_rows_by_direction, pair_sessions
+from core.processor import LogProcessor
+from core.punchstore import PunchStore
+from core.reports import ReportGenerator
+from core.timeutil import to_hhmm, to_minutes
+
+
+def reference_sessions(records):
+    """The per-day pairing loop the batch engine replaces."""
+    sessions = []
+    for person_id, dates in sorted(records.items()):
+        for date, minutes in sorted(dates.items()):
+            sorted_minutes = sorted(minutes)
+            if len(sorted_minutes) % 2 != 0:
+                sessions.append((person_id, date, to_hhmm(sorted_minutes[0]), to_hhmm(sorted_minutes[-1]),
+                                 "fallback", 0, None, None))
+                continue
+            sessions.append((person_id, date, to_hhmm(sorted_minutes[0]), to_hhmm(sorted_minutes[-1]),
+                             "Paired", 0, None, None))
+            for i in range(1, len(sorted_minutes) - 1, 2):
+                sessions.append((person_id, date, to_hhmm(sorted_minutes[i]), to_hhmm(sorted_minutes[i + 1]),
+                                 "Paired", sorted_minutes[i + 1] - sorted_minutes[i], "Leave", None))
+    return sessions
+
+
+class TestPairing(unittest.TestCase):
+    def test_matches_reference_loop(self):
+        rng = random.Random(14)
+        records = {}
+        for n in range(1, 60):
+            pid = f"{n * 7919:08d}"
+            records[pid] = {}
+            for day in range(1, 31):
+                count = rng.choice([1, 2, 2, 3, 4, 5, 6, 8])
+                minutes = [rng.randrange(0, 1440) for _ in range(count)]
+                if rng.random() < 0.2:
+                    minutes.append(minutes[0])  # repeated punch
+                records[pid][f"140402{day:02d}"] = minutes
+
+        expected = reference_sessions(records)
+        store = PunchStore.from_records(records)
+        self.assertEqual(pair_rows(store), expected)
+        self.assertEqual([tuple(s) for s in pair_sessions(store)], expected)
+
+    def test_empty_store(self):
+        self.assertEqual(pair_sessions(PunchStore()), [])
+        self.assertEqual(pair_rows(PunchStore()), [])
+
+
+def day_rows(*punches, pid="00000001", date="14040201"):
+    """PunchStore rows for one day from "HH:MM code" strings."""
+    return [(pid, date, to_minutes(p.split()[0]), p.split()[1]) for p in punches]
+
+
+class TestDirectionPairing(unittest.TestCase):
+    def pair(self, *punches):
+        return pair_rows(PunchStore.from_rows(day_rows(*punches)), "direction")
+
+    def test_even_days_pair_by_order(self):
+        rng = random.Random(15)
+        rows = []
+        for day in range(1, 31):
+            count = rng.choice([2, 2, 4, 6])
+            for minute in rng.sample(range(1440), count):
+                rows.append(("00000001", f"140402{day:02d}", minute, rng.choice(["04", "05", "00"])))
+        store = PunchStore.from_rows(rows)
+        self.assertEqual(pair_rows(store, "direction"), pair_rows(store))
+
+    def test_odd_days_use_codes(self):
+        self.assertEqual(self.pair("07:30 04", "07:31 04", "16:30 05"), [
+            ("00000001", "14040201", "07:30", "16:30", "Paired", 0, None, None),
+            ("00000001", "14040201", "07:31", "07:31", "unmatched entry", 0, "Unmatched", None),
+        ])
+        self.assertEqual(self.pair("07:30 04", "10:00 05", "10:30 04", "10:31 04", "16:30 05"), [
+            ("00000001", "14040201", "07:30", "16:30", "Paired", 0, None, None),
+            ("00000001", "14040201", "10:00", "10:30", "Paired", 30, "Leave", None),
+            ("00000001", "14040201", "10:31", "10:31", "unmatched entry", 0, "Unmatched", None),
+        ])
+        # A code with no direction completes the open session
+        self.assertEqual(self.pair("07:30 00", "12:00 04", "16:30 00")[0],
+                         ("00000001", "14040201", "07:30", "16:30", "Paired", 0, None, None))
+
+    def test_codes_do_not_cut_the_day_short(self):
+        # Codes that disagree with the order leave the whole day for review, not an early exit at 12:00
+        self.assertEqual(self.pair("08:00 04", "12:00 05", "17:00 05"), [
+            ("00000001", "14040201", "08:00", "17:00", "unmatched exit", 0, None, None),
+        ])
+        self.assertEqual(self.pair("07:30 04", "12:00 05", "16:30 04")[0][2:5], ("07:30", "16:30", "unmatched entry"))
+        self.assertEqual(self.pair("07:30 00", "16:30 00", "16:31 00")[0][4], "fallback")
+
+    def test_days_without_a_session_are_tagged(self):
+        self.assertEqual(self.pair("17:41 05")[0][4:], ("unmatched exit", 0, None, None))
+        self.assertEqual(self.pair("07:41 04")[0][4:], ("unmatched entry", 0, None, None))
+        self.assertEqual(self.pair("07:41 00")[0][4:], ("fallback", 0, None, None))
+        self.assertEqual(self.pair("07:41 05", "08:00 05", "17:00 04")[0][2:5], ("07:41", "17:00", "unmatched"))
+
+    def test_custom_directions_and_errors(self):
+        store = PunchStore.from_rows(day_rows("08:00 01", "16:00 02", "16:05 02"))
+        self.assertEqual(pair_rows_by_direction(store, {"01": "entry", "02": "exit"})[0][4],
+                         "unmatched exit")
+        with self.assertRaises(ValueError):
+            pair_rows_by_direction(store, {"01": "in"})
+        with self.assertRaises(ValueError):
+            pair_rows(store, "nearest")
+
+    def _load(self, lines):
+        """A direction-mode LogProcessor on a temp DB with lines loaded from a log file."""
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        path = db_path + ".txt"
+        for name in (db_path, db_path + "-wal", db_path + "-shm", path):
+            self.addCleanup(lambda name=name: os.path.exists(name) and os.remove(name))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        processor = LogProcessor(db_path=db_path, pairing="direction")
+        self.addCleanup(processor.close)
+        processor.load_file(path)
+        return processor
+
+    def test_processor_direction_mode(self):
+        processor = self._load(["00000001 14040201 07:30 04",
+                                "00000001 14040201 07:31 04",
+                                "00000001 14040201 12:00 05",
+                                "00000001 14040202 17:41 05"])
+        # The lone exit is the day to fix; the stray 07:31 entry is neither fixed nor checked
+        self.assertEqual([(s.date, s.status) for _, s in processor.get_fallback_sessions("00000001")],
+                         [("14040202", "unmatched exit")])
+        checked = {(r[1], r[2]) for r in processor.find_late_early("00000001")}
+        self.assertNotIn(("14040201", "07:31"), checked)
+        self.assertIn(("14040201", "07:30"), checked)  # early exit at 12:00
+
+    def test_saved_report_keeps_stray_punches(self):
+        processor = self._load(["00000099 14040201 07:00 04",
+                                "00000099 14040201 08:00 04",
+                                "00000099 14040201 16:30 05",
+                                "00000099 14040202 08:30 04",
+                                "00000099 14040202 16:30 05"])
+        records = processor.find_late_early("00000099")
+        self.assertEqual([r[1:3] for r in records], [("14040202", "08:30")])
+        fd, report = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        self.addCleanup(os.remove, report)
+        ReportGenerator(processor).save_report_with_reasons(
+            report, "00000099", [(*r[:7], "Other") for r in records])
+        self.assertEqual([r[1:3] for r in processor.find_late_early("00000099")], [("14040202", "08:30")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from core.db import write_transaction
+from core.parallel import MERGED_REPORT_NAME, employee_report_name, generate_reports
+from core.processor import LogProcessor
+from core.reports import fill_missing_days
+
+
+class TestGenerateReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db_path = os.path.join(self.tmp, "sessions.db")
+        processor = LogProcessor(db_path=self.db_path)
+        processor.sessions = [
+            ["00000001", "14040702", "08:45", "16:30", "Paired"],
+            ["00000001", "14040703", "07:30", "15:00", "Paired"],
+            ["00000001", "14040703", "10:00", "10:30", "Paired", 30, "Leave", None],
+            ["00000006", "14040702", "07:30", "13:00", "Paired"],
+            ["00000022", "14040704", "07:20", "16:40", "fallback"],
+            ["00000022", "14040705", "07:20", "16:40", "Paired", 0, "Leave", None],
+        ]
+        processor._save_sessions_to_db()
+        processor._build_and_save_schedules_to_db("140407")
+        processor.load_exceptions_from_config("140407")
+        self.defaults = processor.schedule_defaults()
+        processor.close()  # checkpoints the WAL so the file can be copied
+        self.work_schedules = {
+            "14040705": {"entry": "07:30", "exit": "16:30", "floating": 1.0, "late_allowed": False, "is_holiday": True},
+            "14040706": {"entry": "08:00", "exit": "17:00", "floating": 0.5, "late_allowed": True, "is_holiday": False},
+        }
+
+    def _interactive_results(self, db_path):
+        """What pressing 'Check Late/Early Sessions' for every ID would do."""
+        processor = LogProcessor(db_path=db_path)
+        processor.work_schedules.update(self.work_schedules)
+        with sqlite3.connect(db_path) as conn:
+            pids = [row[0] for row in conn.execute("SELECT DISTINCT id FROM sessions ORDER BY id")]
+        results = []
+        for pid in pids:
+            with write_transaction(db_path) as cursor:
+                fill_missing_days(cursor, self.work_schedules, self.defaults, pid)
+            results.extend(processor.find_late_early(pid))
+        return results
+
+    def _sessions(self, db_path):
+        with sqlite3.connect(db_path) as conn:
+            return sorted(conn.execute("SELECT id, date, entry, exit, status, duration, mode FROM sessions"),
+                          key=repr)
+
+    def test_matches_per_id_path(self):
+        reference_db = os.path.join(self.tmp, "reference.db")
+        shutil.copy(self.db_path, reference_db)
+        expected = self._interactive_results(reference_db)
+
+        out_dir = os.path.join(self.tmp, "reports")
+        summary = generate_reports(self.db_path, out_dir, self.work_schedules, self.defaults, workers=2)
+
+        self.assertEqual(summary["employees"], 3)
+        self.assertEqual(summary["records"], len(expected))
+        self.assertEqual(self._sessions(self.db_path), self._sessions(reference_db))
+        with open(os.path.join(out_dir, MERGED_REPORT_NAME), encoding="utf-8") as f:
+            merged = [tuple(r) for r in csv.reader(f)][1:]
+        self.assertEqual(merged, [tuple(str(v) for v in r) for r in expected])
+        for pid in ("00000001", "00000006", "00000022"):
+            self.assertTrue(os.path.exists(os.path.join(out_dir, employee_report_name(pid))))
+
+    def test_in_process_mode(self):
+        summary = generate_reports(self.db_path, os.path.join(self.tmp, "r"), {}, self.defaults, workers=0)
+        self.assertEqual(summary["employees"], 3)
+        self.assertGreater(summary["leave_filled"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from core.processor import build_sessions
+from core.punchstore import PunchStore, read_store
+
+
+class TestPunchStore(unittest.TestCase):
+    def setUp(self):
+        self.records = {
+            "00000022": {"14040202": [970, 400], "14040201": [420, 600, 630, 990]},
+            "00000003": {"14040203": [425]},
+        }
+        self.store = PunchStore.from_records(self.records)
+
+    def test_sorted_columns_and_person_offsets(self):
+        self.assertEqual(self.store.ids.tolist(), [3, 22, 22, 22, 22, 22, 22])
+        self.assertEqual(self.store.dates.tolist()[1:], [14040201] * 4 + [14040202] * 2)
+        self.assertEqual(self.store.minutes.tolist(), [425, 420, 600, 630, 990, 400, 970])
+        self.assertEqual(self.store.person("00000022"), slice(1, 7))
+        self.assertEqual(self.store.person("00000099"), slice(0, 0))
+        # 4 + 4 + 2 bytes per punch in the columns
+        self.assertEqual(self.store.ids.nbytes + self.store.dates.nbytes + self.store.minutes.nbytes, 10 * 7)
+
+    def test_days(self):
+        self.assertEqual(list(self.store.days()), [
+            ("00000003", "14040203", [425]),
+            ("00000022", "14040201", [420, 600, 630, 990]),
+            ("00000022", "14040202", [400, 970]),
+        ])
+        self.assertEqual(list(PunchStore().days()), [])
+
+    def test_codes(self):
+        self.assertEqual(self.store.codes.tolist(), [255] * 7)  # mapping has no codes
+        store = PunchStore.from_rows([("00000001", "14040201", 990, "05"), ("00000001", "14040201", 450, "04"),
+                                      ("00000001", "14040202", 450, "X")])
+        self.assertEqual(list(store.days(with_codes=True)), [
+            ("00000001", "14040201", [450, 990], [4, 5]),
+            ("00000001", "14040202", [450], [255]),
+        ])
+
+    def test_debounce(self):
+        store = PunchStore.from_rows([
+            ("00000001", "14040201", 450, "04"), ("00000001", "14040201", 450, "05"),
+            ("00000001", "14040201", 451, "04"), ("00000001", "14040201", 452, "04"),
+            ("00000001", "14040201", 990, "05"), ("00000001", "14040202", 991, "05"),
+            ("00000002", "14040202", 991, "04"),
+        ])
+        self.assertEqual(list(store.debounce(1).days(with_codes=True)), [
+            ("00000001", "14040201", [450, 990], [4, 5]),   # a burst keeps its first read
+            ("00000001", "14040202", [991], [5]),
+            ("00000002", "14040202", [991], [4]),
+        ])
+        self.assertEqual(store.debounce(0).minutes.tolist(), [450, 451, 452, 990, 991, 991])
+        self.assertIs(store.debounce(None), store)
+        self.assertIs(self.store.debounce(5), self.store)  # nothing to drop
+
+    def test_build_sessions_accepts_store_and_mapping(self):
+        sessions = build_sessions(self.store)
+        self.assertEqual(sessions, build_sessions(self.records))
+        self.assertEqual(sessions[0], ["00000003", "14040203", "07:05", "07:05", "fallback", 0, None, None])
+        self.assertEqual(sessions[2], ["00000022", "14040201", "10:00", "10:30", "Paired", 30, "Leave", None])
+
+    def test_read_store_with_and_without_fast_path(self):
+        for text in ("00000022 14040202 06:40 04\n00000022 14040202 16:10 05\n",
+                     "00000022 14040202 6:40 04\n00000022 14040202 16:10 05\n"):
+            fd, path = tempfile.mkstemp(suffix=".TXT")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            self.addCleanup(os.remove, path)
+            month, store = read_store(path)
+            self.assertEqual(month, "140402")
+            self.assertEqual(list(store.days()), [("00000022", "14040202", [400, 970])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+from core.errors import LogFormatError, TooManyBadLinesError
+from core.ingest import Quarantine, quarantine_path, read_fixed_width, read_punches, scan_fixed_width
+from core.processor import LogProcessor
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "ordibehesht.TXT")
+
+# (line inserted, reason recorded)
+CORRUPTED = [
+    ("00000022 14040202 06:40\n", "not 4 columns"),      # truncated: code column missing
+    ("0000002X 14040202 06:40 04\n", "invalid ID"),
+    ("00000022 14040202 25:40 04\n", "invalid time"),
+    ("\n", "not 4 columns"),
+    ("00000022 1404O202 06:40 04\n", "invalid date"),    # letter O
+]
+
+
+class TestQuarantine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        with open(SAMPLE, encoding="utf-8") as f:
+            self.lines = f.readlines()
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.writelines(lines)
+        return path
+
+    def _corrupt(self, name="export.txt"):
+        """The sample with CORRUPTED lines spread through it; returns (path, their line numbers)."""
+        lines, line_numbers = list(self.lines), []
+        for n, (bad, _) in enumerate(CORRUPTED):
+            position = 100 + n * 150
+            lines.insert(position, bad)
+            line_numbers.append(position + 1)
+        return self._write(name, lines), line_numbers
+
+    def _quarantined(self, path):
+        with open(quarantine_path(path), encoding="utf-8") as f:
+            return [line.split("\t")[:2] for line in f]
+
+    def test_fast_path_skips_bad_lines(self):
+        path, line_numbers = self._corrupt()
+        sink = Quarantine(quarantine_path(path), max_error_rate=0.01, min_lines=100)
+        punches = scan_fixed_width(path, sink)
+        self.assertEqual(punches.tolist(), read_fixed_width(SAMPLE).tolist())
+        self.assertEqual((sink.rejected, sink.lines), (5, len(self.lines) + 5))
+        self.assertEqual(self._quarantined(path),
+                         [[str(n), reason] for n, (_, reason) in zip(line_numbers, CORRUPTED)])
+
+    def test_general_path_and_last_line(self):
+        # An H:MM time makes the file not fixed-width; both paths must agree on the result
+        lines = self.lines[:50] + ["00000022 14040202 6:41 04\n", "garbage\n"] + self.lines[50:]
+        lines[-1] = lines[-1].rstrip("\n")
+        path = self._write("mixed.txt", lines)
+        sink = Quarantine(quarantine_path(path), max_error_rate=0.01)
+        self.assertIsNone(scan_fixed_width(path, Quarantine(os.path.join(self.tmp, "unused.log"))))
+        month, punches = read_punches(path, sink)
+        self.assertEqual(month, "140402")
+        self.assertEqual(len(punches), len(read_punches(SAMPLE)[1]) + 1)
+        self.assertEqual(self._quarantined(path), [["52", "not 4 columns"]])
+
+        # Fixed-width file whose last line has no line ending, once good and once bad
+        for last, rejected in (self.lines[-1].rstrip("\n"), 0), ("00000022 14040202 99:99 04", 1):
+            path = self._write("tail.txt", self.lines[:-1] + [last])
+            sink = Quarantine(quarantine_path(path), max_error_rate=0.01)
+            punches = scan_fixed_width(path, sink)
+            self.assertEqual((len(punches), sink.rejected), (len(self.lines) - rejected, rejected))
+
+    def test_error_rate_threshold(self):
+        path, _ = self._corrupt()
+        with self.assertRaises(TooManyBadLinesError) as caught:
+            read_punches(path, Quarantine(quarantine_path(path), max_error_rate=0.001, min_lines=100000))
+        self.assertIsInstance(caught.exception, LogFormatError)
+        self.assertIn("5 of", str(caught.exception))
+        self.assertIn("does not have exactly 4 columns", str(caught.exception))  # the first bad line
+
+        # Past min_lines the import gives up as soon as the rate is exceeded
+        garbage = self._write("garbage.txt", ["junk\n"] * 10 + self.lines)
+        with self.assertRaises(TooManyBadLinesError) as caught:
+            read_punches(garbage, Quarantine(quarantine_path(garbage), max_error_rate=0.5, min_lines=5))
+        self.assertEqual(caught.exception.line_no, 5)
+
+        # Without a quarantine the first bad line still stops the import
+        with self.assertRaises(LogFormatError) as caught:
+            read_punches(path)
+        self.assertEqual(caught.exception.line_no, 101)
+
+    def test_load_file_with_quarantine(self):
+        path, _ = self._corrupt()
+        clean = LogProcessor(db_path=os.path.join(self.tmp, "clean.db"))
+        quarantined = LogProcessor(db_path=os.path.join(self.tmp, "quarantined.db"))
+        try:
+            expected = clean.load_file(SAMPLE).sessions
+            result = quarantined.load_file(path, quarantine=True)
+            self.assertEqual((result.sessions, result.rejected_lines), (expected, 5))
+            self.assertEqual(result.quarantine_files, [quarantine_path(path)])
+
+            # A clean re-export replaces the log: the old quarantine file goes away
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(self.lines)
+            self.assertEqual(quarantined.load_file(path, quarantine=True).rejected_lines, 0)
+            self.assertFalse(os.path.exists(quarantine_path(path)))
+        finally:
+            clean.close()
+            quarantined.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
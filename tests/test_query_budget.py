@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+from core.db import execute_values, sql_shape
+from core.metrics import Metrics
+from core.processor import LogProcessor
+from core.reports import ReportGenerator
+from core.scheduler import ScheduleManager
+from tests.query_budget import QueryBudgetMixin
+
+
+class TestQueryBudgets(QueryBudgetMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        self.addCleanup(self.processor.close)
+        # One worked day a month for 20 IDs, so every other day is a missing day;
+        # 00000022 has config exceptions for 140407
+        self.processor.sessions = [
+            [f"{n:08d}", f"{month}03", "07:30", "16:30", "Paired"]
+            for n in range(1, 23, 1) for month in ("140406", "140407")
+        ]
+        self.processor._save_sessions_to_db()
+        for month in ("140406", "140407"):
+            self.processor._build_and_save_schedules_to_db(month)
+        self.processor.load_exceptions_from_config("140407")
+        self.processor.load_month("140407")
+        self.reporter = ReportGenerator(self.processor)
+
+    def test_tracer(self):
+        connections = self.processor.connections
+        with connections.trace() as outer:
+            with connections.cursor() as cursor:
+                cursor.execute("CREATE TEMP TABLE t (a, b)")
+                with connections.trace() as inner:
+                    cursor.executemany("INSERT INTO t VALUES (?, ?)", [(1, "x"), (2, None), (3, "it's")])
+                    execute_values(cursor, "INSERT INTO t VALUES {values}", [(n, "y") for n in range(600)])
+        self.assertEqual(inner.count, 5)  # executemany: one statement per row; 600 rows: two statements
+        self.assertEqual(inner.shapes, {"INSERT INTO t VALUES (?, ?)": 3, "INSERT INTO t VALUES (?, ?), ...": 2})
+        self.assertEqual(outer.count, 6)
+        self.assertEqual(outer.repeated(3), [("INSERT INTO t VALUES (?, ?)", 3)])
+        self.assertIn("6 statements, 3 shapes", outer.report())
+        self.assertEqual(sql_shape("SELECT * FROM t WHERE a = 12 AND b = 'it''s'"), "SELECT * FROM t WHERE a = ? AND b = ?")
+
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(connections, 2):
+                for n in range(3):
+                    with connections.cursor() as cursor:
+                        cursor.execute("SELECT ?", (n,))
+
+    def test_missing_day_fill(self):
+        for pid in ("00000001", "00000022"):
+            with self.assertQueryBudget(self.processor.connections, 7, max_repeats=2):
+                filled = self.reporter.fill_missing_days(pid)
+            self.assertEqual(filled, 30 + 29)
+
+    def test_missing_day_fill_for_every_id(self):
+        def leave_rows():
+            with self.processor.connections.cursor() as cursor:
+                cursor.execute("SELECT id, date, entry, exit, duration FROM sessions WHERE mode = 'Leave' ORDER BY id, date")
+                return cursor.fetchall()
+
+        for pid in ("00000001", "00000022"):
+            self.reporter.fill_missing_days(pid)
+        per_id = leave_rows()
+
+        # Every ID in the same statements as one; IDs already filled are left alone
+        with self.assertQueryBudget(self.processor.connections, 7, max_repeats=2):
+            filled = self.reporter.fill_missing_days()
+        self.assertEqual(filled, 20 * (30 + 29))
+        self.assertEqual([row for row in leave_rows() if row[0] in ("00000001", "00000022")], per_id)
+        self.assertIn(("00000001", "14040701", "07:30", "16:30", 540), per_id)
+
+    def test_late_early_and_reasons(self):
+        self.reporter.fill_missing_days("00000022")
+        with self.assertQueryBudget(self.processor.connections, 2):
+            records = self.processor.find_late_early("00000022")
+        self.assertGreater(len(records), 30)
+
+        records = [(*r, "Announced") for r in records]
+        path = os.path.join(self.tmp, "report.csv")
+        for _ in range(2):  # saving again replaces the rows
+            with self.assertQueryBudget(self.processor.connections, 5):
+                self.reporter.save_report_with_reasons(path, "00000022", records)
+        with self.processor.connections.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sessions WHERE id = '00000022' AND reason = 'Announced'")
+            self.assertEqual(cursor.fetchone(), (len(records),))
+
+    def test_save_schedules(self):
+        values = {
+            f"140407{day:02d}": ("08:00", "16:30", 1.0, False, day % 7 == 0)
+            for day in range(1, 31)
+        }
+        with self.assertQueryBudget(self.processor.connections, 6):
+            _, holidays = ScheduleManager(self.processor).save_schedules("00000001", values)
+        self.assertEqual(holidays, [7, 14, 21, 28])
+        with self.processor.connections.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM work_schedules WHERE is_holiday = 1")
+            self.assertEqual(cursor.fetchone(), (4,))
+
+    def test_metrics_count_statements_per_stage(self):
+        self.processor.metrics = Metrics(connections=self.processor.connections)
+        self.processor.find_late_early("00000001")
+        action = self.processor.metrics.last
+        self.assertEqual([(s.name, s.queries) for s in action.stages], [("read_sessions", 2), ("evaluate", 0)])
+        self.assertEqual(action.total.queries, action.sql.count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from core.processor import LogProcessor
+from core.reports import ReportGenerator
+from core.resolver import EffectiveSchedule, ScheduleResolver
+from core.scheduler import ScheduleManager
+from core.timeutil import to_hhmm
+
+DEFAULTS = {"entry": "07:30", "exit": "16:30", "floating": 1.0, "late_allowed": False}
+
+
+class TestScheduleResolver(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+        self.work_schedules = {
+            "14040701": {"entry": "08:00", "exit": "17:00", "floating": 0.5, "late_allowed": True, "is_holiday": False},
+            "14040702": {"entry": "07:30", "exit": "16:30", "floating": 1.0, "late_allowed": False, "is_holiday": True},
+        }
+        self.resolver = ScheduleResolver(self.work_schedules, DEFAULTS, self._load, maxsize=3)
+
+    def _load(self, pid):
+        self.loads.append(pid)
+        return {"14040701": ("07:30", "14:30"), "14040703": ("07:30", "14:30")} if pid == "00000022" else {}
+
+    def test_schedule_then_exception_then_defaults(self):
+        resolve = self.resolver.resolve
+        self.assertEqual(resolve("00000022", "14040701"), EffectiveSchedule(480, 1020, 30, True, False, "schedule"))
+        self.assertEqual(resolve("00000022", "14040701").latest_entry, 480 + 30 + 10)
+        self.assertTrue(resolve("00000001", "14040702").is_holiday)
+        self.assertEqual(resolve("00000022", "14040703"), EffectiveSchedule(450, 870, 60, False, False, "exception"))
+        self.assertEqual(resolve("00000001", "14040703").source, "default")
+        self.assertEqual(resolve("00000001", "14040703").as_schedule(), {**DEFAULTS, "is_holiday": False})
+
+    def test_versioned_lru_cache(self):
+        resolve = self.resolver.resolve
+        for _ in range(3):
+            resolve("00000022", "14040703")
+        self.assertEqual(self.resolver.stats(), {"hits": 2, "misses": 1, "size": 1, "version": 0})
+
+        for day in ("04", "05", "06"):  # evicts the least recently used entry
+            resolve("00000022", f"140407{day}")
+        self.assertEqual(self.resolver.stats()["size"], 3)
+        resolve("00000022", "14040703")
+        self.assertEqual(self.resolver.stats()["misses"], 5)
+        self.assertEqual(self.loads, ["00000022"])  # exceptions read once per ID and version
+
+        self.work_schedules["14040703"] = {"entry": "09:00", "exit": "18:00", "floating": 0.0, "late_allowed": False}
+        self.assertEqual(resolve("00000022", "14040703").entry, 450)  # not bumped yet
+        self.resolver.bump()
+        self.assertEqual(resolve("00000022", "14040703").entry, 540)
+        resolve("00000022", "14040704")
+        self.assertEqual(self.loads, ["00000022", "00000022"])
+
+
+class TestResolverCallSites(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.processor = LogProcessor(db_path=os.path.join(self.tmp, "sessions.db"))
+        self.addCleanup(self.processor.close)
+        self.processor.sessions = [
+            ["00000001", "14040702", "08:45", "16:30", "Paired"],
+            ["00000022", "14040702", "08:45", "14:00", "Paired"],
+        ]
+        self.processor._save_sessions_to_db()
+        self.processor._build_and_save_schedules_to_db("140407")
+        self.processor.load_month("140407")
+
+    def test_saved_schedules_reach_the_late_early_check(self):
+        self.assertEqual([r[6] for r in self.processor.find_late_early("00000001")], ["Late Entry", "Early Exit"])
+        ScheduleManager(self.processor).save_schedules(
+            "00000001", {"14040702": ("08:30", "16:00", 1.0, False, False)})
+        self.assertEqual(self.processor.find_late_early("00000001"), [])
+
+    def test_fill_agrees_with_resolver(self):
+        del self.processor.work_schedules["14040710"]  # falls back to the ID's exception
+        self.processor.resolver.bump()
+        ReportGenerator(self.processor).fill_missing_days()
+        with self.processor.connections.cursor() as cursor:
+            cursor.execute("SELECT id, date, entry, exit, duration FROM sessions WHERE mode = 'Leave'")
+            rows = cursor.fetchall()
+        self.assertEqual(len(rows), 2 * 29)
+        self.assertIn(("00000022", "14040710", "07:30", "14:30", 420), rows)
+        for pid, date, entry, exit_, duration in rows:
+            schedule = self.processor.resolver.resolve(pid, date)
+            self.assertEqual((entry, exit_, duration),
+                             (to_hhmm(schedule.entry), to_hhmm(schedule.exit), schedule.exit - schedule.entry))
+
+
+if __name__ == "__main__":
+    unittest.main()
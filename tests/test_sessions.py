@@ -0,0 +1,43 @@
+import unittest
+from core.sessions import Session, SessionTable
+
+
+class TestSession(unittest.TestCase):
+    def test_row_compatibility(self):
+        s = Session("00000001", "14040201", "07:40", "07:40", "fallback")
+        self.assertEqual(tuple(s), ("00000001", "14040201", "07:40", "07:40", "fallback", 0, None, None))
+        self.assertEqual(s[4], "fallback")
+        self.assertEqual(s[1:3], ("14040201", "07:40"))
+        s[3] = "16:30"
+        self.assertEqual(s.exit, "16:30")
+        self.assertFalse(hasattr(s, "__dict__"))
+
+
+class TestSessionTable(unittest.TestCase):
+    def setUp(self):
+        self.table = SessionTable([
+            ["00000002", "14040201", "07:35", "16:30", "Paired"],
+            ["00000001", "14040202", "08:15", "08:15", "fallback"],
+            ["00000001", "14040201", "08:00", "17:00", "Paired"],
+            ["00000001", "14040201", "10:00", "10:30", "Paired", 30, "Leave", None],
+            ["00000002", "14040202", "17:41", "17:41", "unmatched exit"],
+            ["00000002", "14040201", "18:40", "18:40", "unmatched entry", 0, "Unmatched", None],
+        ])
+
+    def test_indexes(self):
+        self.assertEqual(sorted(self.table.pids()), ["00000001", "00000002"])
+        self.assertEqual([i for i, _ in self.table.for_pid("00000001")], [1, 2, 3])
+        self.assertEqual([(i, s.date) for i, s in self.table.fallback_for("00000001")], [(1, "14040202")])
+        self.assertEqual([i for i, _ in self.table.fallback_for("00000002")], [4])
+        self.assertEqual(self.table.for_pid("00000099"), [])
+
+    def test_sort_and_clear_rebuild_indexes(self):
+        self.table.sort(key=lambda s: (s.pid, s.date))
+        self.assertEqual([i for i, _ in self.table.for_pid("00000002")], [3, 4, 5])
+        self.assertEqual([i for i, _ in self.table.fallback_for("00000001")], [2])
+        self.table.clear()
+        self.assertEqual((len(self.table), list(self.table.pids())), (0, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
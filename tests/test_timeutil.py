@@ -0,0 +1,25 @@
+import unittest
+from datetime import datetime
+from core.timeutil import MINUTES_TO_TIME, TIME_TO_MINUTES, to_hhmm, to_minutes
+
+
+class TestTimeUtil(unittest.TestCase):
+    def test_lookup_tables_match_strptime(self):
+        self.assertEqual(len(MINUTES_TO_TIME), 1440)
+        for time_str, minutes in TIME_TO_MINUTES.items():
+            t = datetime.strptime(time_str, "%H:%M")
+            self.assertEqual(minutes, t.hour * 60 + t.minute)
+            self.assertEqual(MINUTES_TO_TIME[minutes], t.strftime("%H:%M"))
+
+    def test_invalid_times_raise_value_error(self):
+        for bad in ("24:00", "07:60", "0730", "", None):
+            with self.assertRaises(ValueError):
+                to_minutes(bad)
+
+    def test_format_wraps_past_midnight(self):
+        self.assertEqual(to_hhmm(450), "07:30")
+        self.assertEqual(to_hhmm(1440 + 30), "00:30")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,17 +3,19 @@ from tkinter import filedialog, messagebox, END, Entry, Label, Frame, Button
 
 from tkinter.ttk import Style, OptionMenu
 
+from core.errors import EmptyLogError, LogFormatError
+from core.parallel import generate_reports
 from core.processor import LogProcessor
 from core.reports import ReportGenerator
-from core.scheduler import WorkScheduleEditor
 from resources.config import APP_TITLE, APP_SIZE, CREATOR
+from ui.report_window import open_late_early_report_window
+from ui.schedule_editor import WorkScheduleEditor
 
 
 class LogApp:
     def __init__(self, root):
         self.root = root
         self.processor = LogProcessor()
-        self.processor.app = self
         self.reporter = ReportGenerator(self.processor, app=self)
         self.work_schedules = self.processor.work_schedules
         self.selected_id = tk.StringVar(value="Select ID")
@@ -33,7 +35,7 @@ class LogApp:
         frame.pack(expand=False, pady=10)
 
         tk.Label(frame, text="🕒 Entry-Exit Log Processor", font=("Segoe UI", 16, "bold"), bg="#f0f2f5").pack(pady=10)
-        tk.Button(frame, text="Select TXT File", command=self.load_file).pack(pady=5)
+        tk.Button(frame, text="Select TXT File(s)", command=self.load_file).pack(pady=5)
         tk.Button(frame, text="Export All to CSV", command=self.export_csv).pack(pady=5)
 
         tk.Label(frame, text="Select ID to View Sessions:", bg="#f0f2f5", font=("Segoe UI", 11)).pack(pady=(15, 0))
@@ -43,6 +45,7 @@ class LogApp:
         tk.Button(frame, text="Edit Fallback Rows", command=self.edit_fallback).pack(pady=5)
         tk.Button(frame, text="Edit Work Schedules", command=self.open_schedule_editor).pack(pady=5)
         tk.Button(frame, text="Check Late/Early Sessions", command=self.check_late_early).pack(pady=5)
+        tk.Button(frame, text="Late/Early Reports for All IDs", command=self.check_late_early_all).pack(pady=5)
 
         # Text area
         text_frame = tk.Frame(self.root)
@@ -58,21 +61,55 @@ class LogApp:
 
     # ==== Button Actions ====
     def load_file(self):
-        path = filedialog.askopenfilename(title="Select Entry-Exit TXT File", filetypes=[("Text files", "*.txt")])
-        if not path:
+        # 🔹 Several files (e.g. one per gate) are merged into one import
+        paths = filedialog.askopenfilenames(title="Select Entry-Exit TXT File(s)", filetypes=[("Text files", "*.txt")])
+        if not paths:
             return
         try:
-            self.processor.load_file(path)
-            self.sessions = self.processor.sessions
-            self._refresh_id_menu()
+            # 🔹 Malformed lines are quarantined; only a high error rate stops the import
+            if len(paths) == 1:
+                result = self.processor.load_file(paths[0], quarantine=True)
+            else:
+                result = self.processor.load_files(paths, quarantine=True)
+        except LogFormatError as e:
+            messagebox.showerror("Invalid File", str(e))
+            result = None
+        except EmptyLogError as e:
+            messagebox.showwarning("Invalid File", str(e))
+            result = None
         except Exception as e:
             messagebox.showerror("Error", f"Could not process file:\n{e}")
+            return
+
+        if result and result.rejected_lines:
+            messagebox.showwarning(
+                "Lines Quarantined",
+                f"{result.rejected_lines} malformed lines were skipped. Line numbers and reasons:\n"
+                + "\n".join(result.quarantine_files)
+            )
+        if result and result.loaded_from_db:
+            if result.new_punches:
+                messagebox.showinfo(
+                    "Data Appended",
+                    f"Added {result.new_punches} new punches to month {result.month}; "
+                    f"sessions rebuilt for {result.affected_days} employee-days."
+                )
+            else:
+                messagebox.showinfo(
+                    "Data Loaded",
+                    f"Sessions for month {result.month} already exist in the database. Loading existing data."
+                )
+            for warning in result.warnings:
+                messagebox.showerror("Database Error", warning)
+            messagebox.showinfo("Work Schedules Loaded", f"✅ Loaded {result.schedules} work schedule records from DB.")
+        self.sessions = self.processor.sessions
+        self._refresh_id_menu()
     def _refresh_id_menu(self):
         menu = self.id_menu['menu']
         menu.delete(0, 'end')
 
-        # ✅ Use sessions instead of records, works for DB and TXT
-        ids = sorted({s[0] for s in self.processor.sessions})
+        # ✅ Use sessions instead of records, works for DB and TXT (IDs come from the per-ID index)
+        ids = sorted(self.processor.sessions.pids())
 
         if ids:
             self.selected_id.set(ids[0])
@@ -98,16 +135,16 @@ class LogApp:
         if not pid:
             return
 
-        # ✅ Filter directly from sessions 
-        filtered = [s for s in self.processor.sessions if s[0] == pid]
+        # ✅ Only this ID's sessions, via the per-ID index
+        filtered = [s for _, s in self.processor.sessions.for_pid(pid)]
 
         if not filtered:
             self.text_output.insert(END, f"No sessions found for ID {pid}\n")
             return
         # 🔹 Sort by date, then entry, then exit
-        filtered_sorted = sorted(filtered, key=lambda s: (s[1], s[2], s[3]))
+        filtered_sorted = sorted(filtered, key=lambda s: (s.date, s.entry, s.exit))
         for idx, s in enumerate(filtered_sorted):
-            self.text_output.insert(END, f"[{idx}] Date: {s[1]} | Entry: {s[2]} | Exit: {s[3]} | Mode: {s[4]}\n")
+            self.text_output.insert(END, f"[{idx}] Date: {s.date} | Entry: {s.entry} | Exit: {s.exit} | Mode: {s.status}\n")
 
     def edit_fallback(self):
         pid = self.selected_id.get()
@@ -160,4 +197,21 @@ class LogApp:
         if not pid:
             messagebox.showinfo("Info", "Select an ID first.")
             return
-        self.reporter.open_late_early_report_window(self.root, pid, holidays=self.holidays)
+        open_late_early_report_window(self.root, self.reporter, pid)
+
+    def check_late_early_all(self):
+        if not self.processor.sessions:
+            messagebox.showinfo("Info", "Please process a file first.")
+            return
+        out_dir = filedialog.askdirectory(title="Select folder for late/early reports")
+        if not out_dir:
+            return
+        summary = generate_reports(
+            self.processor.db_path, out_dir, self.work_schedules,
+            self.processor.schedule_defaults(), pragmas=self.processor.pragmas,
+        )
+        messagebox.showinfo(
+            "Success",
+            f"{summary['records']} late/early records for {summary['employees']} IDs "
+            f"({summary['leave_filled']} missing days added as 'Leave') saved to:\n{out_dir}"
+        )
@@ -0,0 +1,115 @@
+import tkinter as tk
+from tkinter import messagebox, filedialog
+
+
+def open_late_early_report_window(root, reporter, pid: str):
+    """Fill missing days, then show the Tkinter window for late/early analysis with reason selection & export."""
+    try:
+        reporter.fill_missing_days(pid)
+        messagebox.showinfo("Completed", f"Missing days for ID {pid} have been added as 'Leave'.")
+    except Exception as e:
+        messagebox.showerror("Database Error", f"Error while updating missing days:\n{e}")
+
+    def warn_invalid(pid_s, date, entry_str, exit_str):
+        messagebox.showwarning("Invalid Time", f"Skipping session for {pid_s} on {date}: {entry_str}, {exit_str}")
+
+    late_sessions = reporter.processor.find_late_early(pid, on_invalid=warn_invalid)
+    if not late_sessions:
+        messagebox.showinfo("Result", "No late/early entries found.")
+        return
+
+    result_win = tk.Toplevel(root)
+    result_win.title("Late/Early Report")
+    result_win.geometry("600x500")
+
+    tk.Label(result_win, text=f"Late/Early records for ID: {pid}", font=("Segoe UI", 12, "bold")).pack(pady=10)
+
+    container = tk.Frame(result_win)
+    container.pack(fill='both', expand=True)
+
+    canvas = tk.Canvas(container)
+    scrollbar = tk.Scrollbar(container, orient="vertical", command=canvas.yview)
+    scrollable_frame = tk.Frame(canvas)
+
+    scrollable_frame.bind(
+        "<Configure>",
+        lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+    )
+
+    canvas.create_window((0, 0), window=scrollable_frame, anchor='nw')
+    canvas.configure(yscrollcommand=scrollbar.set)
+
+    canvas.pack(side="left", fill="both", expand=True)
+    scrollbar.pack(side="right", fill="y")
+
+    reason_vars = []
+    for r in late_sessions:
+        pid_r, date, entry, exit, status, minutes, mode = r
+        row_frame = tk.Frame(scrollable_frame)
+        row_frame.pack(anchor='w', pady=3, padx=5, fill='x')
+
+        tk.Label(
+            row_frame,
+            text=f"{pid_r} | {date} | {entry} → {exit} | {status} | {minutes} min | {mode}",
+            width=65,
+            anchor='w'
+        ).pack(side='left')
+
+        var = tk.StringVar()
+        var.set("Select Reason")
+
+        # Callback to save immediately
+        def on_reason_selected(*args, var=var):
+            # Just store selection in memory, no DB change
+            selected_reason = var.get()
+            if selected_reason == "Select Reason":
+                return
+        # Attach trace to trigger DB update on selection
+        var.trace_add("write", on_reason_selected)
+        dropdown = tk.OptionMenu(row_frame, var, "Impermissible", "Announced", "Other")
+        dropdown.pack(side='right')
+
+        # Now include mode too
+        reason_vars.append((var, minutes, pid_r, date, entry, exit, status, mode))
+
+    def calculate_times():
+        for var, *_ in reason_vars:
+            if var.get() == "Select Reason":
+                messagebox.showerror("Error", "Please select a reason for all records before calculating.")
+                return
+
+        total_impermissible = sum(minutes for var, minutes, *_ in reason_vars if var.get() == "Impermissible")
+        total_announced = sum(minutes for var, minutes, *_ in reason_vars if var.get() == "Announced")
+
+        messagebox.showinfo("Totals",
+                            f"Total Impermissible time: {total_impermissible} minutes\n"
+                            f"Total Announced time: {total_announced} minutes")
+
+    def save_report_ui():
+        for var, *_ in reason_vars:
+            if var.get() == "Select Reason":
+                messagebox.showerror("Error", "Please select a reason for all records before saving.")
+                return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            title="Save report as"
+        )
+        if not file_path:
+            return
+
+        records = [
+            (pid_r, date, entry, exit, status, minutes, mode, var.get())
+            for var, minutes, pid_r, date, entry, exit, status, mode in reason_vars
+        ]
+        reporter.save_report_with_reasons(file_path, pid, records)
+        messagebox.showinfo("Saved", f"Report saved successfully to {file_path}")
+
+    btn_frame = tk.Frame(result_win)
+    btn_frame.pack(pady=10)
+
+    # tk.Button(btn_frame, text="Calculate Times", command=calculate_times,
+    #           bg="darkblue", fg="white").pack(side='left', padx=5)
+    tk.Button(btn_frame, text="Save Report", command=save_report_ui,
+              bg="green", fg="white").pack(side='left', padx=5)
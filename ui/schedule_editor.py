@@ -0,0 +1,110 @@
+import sqlite3
+from tkinter import (
+    Toplevel, Label, Frame, Button, Canvas, Scrollbar, VERTICAL,
+    BooleanVar, Checkbutton, messagebox
+)
+from tkinter.ttk import Combobox
+from core.scheduler import ScheduleManager
+
+class WorkScheduleEditor:
+    def __init__(self, app):
+        self.app = app
+        self.manager = ScheduleManager(self.app.processor)
+        pid = self.app.selected_id.get()
+        if not pid:
+            messagebox.showinfo("Info", "Select an ID first.")
+            return
+
+        year, month, days_in_month = self.manager.current_month()
+
+        # --- Ensure defaults exist in DB ---
+        try:
+            self.manager.ensure_default_schedules(year, month, days_in_month)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to ensure default schedules:\n{e}")
+
+        # --- Load all schedules + exceptions (adapted for this ID) ---
+        try:
+            schedules = self.manager.schedules_for(pid)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to load schedules or exceptions:\n{e}")
+            return
+
+        # --- Build UI ---
+        self.win = Toplevel()
+        self.win.title("Work Schedule Editor")
+        self.win.geometry("700x550")
+
+        Label(self.win, text=f"Work schedules for ID: {pid}", font=("Segoe UI", 12, "bold")).pack(pady=10)
+
+        canvas = Canvas(self.win)
+        scrollbar = Scrollbar(self.win, orient=VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        content_frame = Frame(canvas)
+        canvas.create_window((0, 0), window=content_frame, anchor="nw")
+        content_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+
+        self.combos = {}
+        times_entry = [f"{h:02d}:{m:02d}" for h in range(7, 12) for m in (0, 30)]
+        times_exit = [f"{h:02d}:{m:02d}" for h in range(13, 20) for m in (0, 30)]
+        floating_opts = ["0.0", "0.5", "1.0"]
+
+        # --- Create rows for each day ---
+        for day in range(1, days_in_month + 1):
+            date_str = f"{year:04d}{month:02d}{day:02d}"
+            schedule = schedules.get(date_str) or self.app.processor.resolver.resolve(pid, date_str).as_schedule()
+
+            frame = Frame(content_frame)
+            frame.pack(pady=4, anchor='w')
+
+            Label(frame, text=date_str, width=12).grid(row=0, column=0, padx=5)
+
+            cb_entry = Combobox(frame, values=times_entry, width=7)
+            cb_entry.set(schedule["entry"])
+            cb_entry.grid(row=0, column=1, padx=5)
+
+            cb_exit = Combobox(frame, values=times_exit, width=7)
+            cb_exit.set(schedule["exit"])
+            cb_exit.grid(row=0, column=2, padx=5)
+
+            cb_floating = Combobox(frame, values=floating_opts, width=5)
+            cb_floating.set(str(schedule["floating"]))
+            cb_floating.grid(row=0, column=3, padx=5)
+
+            late_var = BooleanVar(value=schedule["late_allowed"])
+            Checkbutton(frame, text="10 min late OK", variable=late_var).grid(row=0, column=4, padx=5)
+
+            holiday_var = BooleanVar(value=schedule["is_holiday"])
+            Checkbutton(frame, text="Holiday", variable=holiday_var).grid(row=0, column=5, padx=5)
+
+            self.combos[date_str] = (cb_entry, cb_exit, cb_floating, late_var, holiday_var)
+
+        Button(content_frame, text="Save All", command=self.save_schedules).pack(pady=10)
+
+    # -------------------------------------------------------------------------
+    def save_schedules(self):
+        """Save all edited work schedules including holidays (see ScheduleManager.save_schedules)."""
+        pid = self.app.selected_id.get()
+        if not pid:
+            messagebox.showinfo("Info", "Select an ID first.")
+            return
+
+        values = {
+            d: (cb_e.get(), cb_x.get(), cb_f.get(), late_v.get(), hol_v.get())
+            for d, (cb_e, cb_x, cb_f, late_v, hol_v) in self.combos.items()
+        }
+        try:
+            is_exception_pid, self.app.holidays = self.manager.save_schedules(pid, values)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to save schedules:\n{e}")
+            return
+        # --- Different message depending on mode ---
+        if is_exception_pid:
+            msg = "✅ Exception ID detected — changes applied in memory only."
+        else:
+            msg = "✅ Work schedules updated successfully and saved to database."
+        messagebox.showinfo("Saved", msg)
+        self.win.destroy()